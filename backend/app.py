@@ -12,6 +12,7 @@ from errors import register_error_handlers
 from middleware.request_logger import log_request
 from middleware.rate_limiter import rate_limit
 from extensions import mongo, jwt, socketio, mail
+from services.registry import services, ServiceRegistry
 
 def create_app(config_object=None):
     # Load environment variables
@@ -39,7 +40,12 @@ def create_app(config_object=None):
     jwt.init_app(app)
 
     # Initialize SocketIO
-    socketio.init_app(app, cors_allowed_origins="*")
+    # A message queue lets Celery workers push execution results to clients
+    socketio.init_app(
+        app,
+        cors_allowed_origins="*",
+        message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE")
+    )
 
     # Initialize Mail
     mail.init_app(app)
@@ -70,6 +76,13 @@ def create_app(config_object=None):
     app.register_blueprint(search_bp, url_prefix='/api/search')
     app.register_blueprint(sync_bp, url_prefix='/api/sync')
 
+    # Optionally build heavy services before their first request
+    warmup_mode = app.config.get('SERVICE_WARMUP', 'lazy')
+    if warmup_mode == 'background':
+        services.warm_up(background=True)
+    elif warmup_mode == 'eager':
+        services.warm_up(background=False)
+
     @app.before_request
     def before_request():
         """Global middleware for all requests."""
@@ -100,10 +113,16 @@ def create_app(config_object=None):
     @app.route('/health')
     def health_check():
         """Health check endpoint."""
+        service_status = services.status()
+        failed = any(
+            info['state'] == ServiceRegistry.FAILED
+            for info in service_status.values()
+        )
         return jsonify({
-            'status': 'healthy',
+            'status': 'degraded' if failed else 'healthy',
             'timestamp': datetime.utcnow().isoformat(),
-            'version': '1.0.0'
+            'version': '1.0.0',
+            'services': service_status
         })
 
     return app
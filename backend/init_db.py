@@ -27,6 +27,15 @@ def init_collections():
             if "notes" not in mongo.db.list_collection_names():
                 mongo.db.create_collection("notes")
                 mongo.db.notes.create_index([("user_id", 1), ("title", 1)])
+                mongo.db.notes.create_index(
+                    [("user_id", 1), ("updated_at", -1), ("_id", -1)],
+                    name="notes_keyset"
+                )
+                mongo.db.notes.create_index(
+                    [("user_id", 1), ("title", "text"), ("content", "text")],
+                    name="notes_text",
+                    weights={"title": 10, "content": 1}
+                )
                 print("Created notes collection")
 
             # Folders collection
@@ -1,6 +1,30 @@
 from datetime import datetime
 from bson import ObjectId
 from models.note_version import NoteVersion
+from models.processing_state import PENDING, READY
+from utils.pagination import serialize_document
+
+# Fields of processed_content returned to clients; the per-block
+# renderings are only kept for the next render
+PROCESSED_CONTENT_FIELDS = ('html', 'code_blocks', 'latex_blocks')
+
+def public_processed_content(processed_content):
+    """Drop the stored block renderings from processed content."""
+    if not processed_content:
+        return processed_content
+    return {
+        key: value for key, value in processed_content.items()
+        if key in PROCESSED_CONTENT_FIELDS
+    }
+
+# Projection for listing notes without their block renderings
+LIST_PROJECTION = {'processed_content.blocks': 0}
+
+def serialize_note(doc):
+    """Convert a stored note to its JSON form."""
+    if doc.get('processed_content'):
+        doc = {**doc, 'processed_content': public_processed_content(doc['processed_content'])}
+    return serialize_document(doc)
 
 class Note:
     """Note model."""
@@ -14,6 +38,10 @@ class Note:
         tags=None,
         attachments=None,
         current_version=1,
+        processed_content=None,
+        processing_state=PENDING,
+        processed_version=None,
+        indexed_version=None,
         _id=None
     ):
         self._id = _id or ObjectId()
@@ -24,27 +52,58 @@ class Note:
         self.tags = tags or []
         self.attachments = attachments or []
         self.current_version = current_version
+        self.processed_content = processed_content
+        # Rendering happens in the background; processed_content belongs
+        # to processed_version, which may trail current_version
+        self.processing_state = processing_state
+        self.processed_version = processed_version
+        # Version whose search document has been written
+        self.indexed_version = indexed_version
         self.created_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
     
     @staticmethod
-    def create(mongo, user_id, title, content, folder_id=None, tags=None):
+    def create(mongo, user_id, title, content, processed_content=None, folder_id=None, tags=None):
         """Create a new note."""
         note = Note(
             user_id=user_id,
             title=title,
             content=content,
             folder_id=folder_id,
-            tags=tags
+            tags=tags,
+            processed_content=processed_content,
+            # Content rendered before the note is stored needs no background job
+            processing_state=READY if processed_content else PENDING,
+            processed_version=1 if processed_content else None
         )
-        mongo.db.notes.insert_one(note.to_dict())
+        mongo.db.notes.insert_one(note.to_document())
         
         # Create initial version
         NoteVersion.create_version(mongo, note, "Initial version")
         
         return note
     
-    def update(self, mongo, title=None, content=None, folder_id=None, tags=None, change_description=None):
+    @staticmethod
+    def get_by_id(mongo, note_id):
+        """Get note by ID."""
+        data = mongo.db.notes.find_one({'_id': ObjectId(note_id)})
+        return Note.from_dict(data) if data else None
+    
+    def delete(self, mongo):
+        """Delete the note and its versions."""
+        mongo.db.note_versions.delete_many({'note_id': self._id})
+        mongo.db.notes.delete_one({'_id': self._id})
+    
+    def update(
+        self,
+        mongo,
+        title=None,
+        content=None,
+        folder_id=None,
+        tags=None,
+        change_description=None,
+        processed_content=None
+    ):
         """Update note and create new version."""
         updates = {}
         content_changed = False
@@ -59,19 +118,38 @@ class Note:
             updates['content'] = content
             content_changed = True
         
+        search_changed = content_changed
+        
         if folder_id is not None:
-            self.folder_id = ObjectId(folder_id) if folder_id else None
-            updates['folder_id'] = folder_id
+            folder = ObjectId(folder_id) if folder_id else None
+            search_changed = search_changed or folder != self.folder_id
+            self.folder_id = folder
+            updates['folder_id'] = folder
         
         if tags is not None:
+            search_changed = search_changed or tags != self.tags
             self.tags = tags
             updates['tags'] = tags
         
+        if search_changed:
+            # The search document also carries the folder and tags
+            self.indexed_version = None
+            updates['indexed_version'] = None
+        
+        if processed_content is not None:
+            # Rendered HTML, stored per block so later saves can reuse it
+            self.processed_content = processed_content
+            updates['processed_content'] = processed_content
+        
         if content_changed:
             # Increment version number
             self.current_version += 1
             updates['current_version'] = self.current_version
             
+            # The new version still has to be rendered
+            self.processing_state = PENDING
+            updates['processing_state'] = PENDING
+            
             # Create new version
             NoteVersion.create_version(mongo, self, change_description)
         
@@ -116,6 +194,25 @@ class Note:
         
         return v1.get_diff(v2)
     
+    def to_document(self):
+        """Convert to the document stored in MongoDB."""
+        return {
+            '_id': self._id,
+            'user_id': self.user_id,
+            'title': self.title,
+            'content': self.content,
+            'folder_id': self.folder_id,
+            'tags': self.tags,
+            'attachments': self.attachments,
+            'current_version': self.current_version,
+            'processed_content': self.processed_content,
+            'processing_state': self.processing_state,
+            'processed_version': self.processed_version,
+            'indexed_version': self.indexed_version,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+    
     def to_dict(self):
         """Convert to dictionary."""
         return {
@@ -127,6 +224,10 @@ class Note:
             'tags': self.tags,
             'attachments': self.attachments,
             'current_version': self.current_version,
+            'processed_content': public_processed_content(self.processed_content),
+            'processing_state': self.processing_state,
+            'processed_version': self.processed_version,
+            'indexed_version': self.indexed_version,
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
@@ -145,5 +246,9 @@ class Note:
             tags=data.get('tags', []),
             attachments=data.get('attachments', []),
             current_version=data.get('current_version', 1),
+            processed_content=data.get('processed_content'),
+            processing_state=data.get('processing_state', PENDING),
+            processed_version=data.get('processed_version'),
+            indexed_version=data.get('indexed_version'),
             _id=data['_id']
         )
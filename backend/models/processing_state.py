@@ -0,0 +1,5 @@
+# Values of a note's processing_state
+PENDING = 'pending'
+PROCESSING = 'processing'
+READY = 'ready'
+FAILED = 'failed'
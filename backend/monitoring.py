@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Histogram, Info, start_http_server
+from prometheus_client import Counter, Gauge, Histogram, Info, start_http_server
 import time
 import threading
 import os
@@ -28,7 +28,74 @@ note_operations = Counter(
 ai_requests = Counter(
     'ai_requests_total',
     'Total AI service requests',
-    ['operation']
+    ['operation', 'cache']
+)
+
+ai_batch_size = Histogram(
+    'ai_batch_size',
+    'Number of inputs per batched model forward pass',
+    ['task'],
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+
+ai_batch_queue_wait_seconds = Histogram(
+    'ai_batch_queue_wait_seconds',
+    'Time AI inputs wait in the batching queue',
+    ['task'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+code_pool_size = Gauge(
+    'code_executor_pool_size',
+    'Warm code execution containers available',
+    ['language']
+)
+
+code_pool_requests = Counter(
+    'code_executor_pool_requests_total',
+    'Code executions served from the warm container pool',
+    ['language', 'result']
+)
+
+code_artifact_requests = Counter(
+    'code_executor_artifact_requests_total',
+    'Compiled artifact cache lookups for java and cpp snippets',
+    ['language', 'result']
+)
+
+render_cache_requests = Counter(
+    'content_render_cache_requests_total',
+    'Rendered code and LaTeX block lookups by the tier that served them',
+    ['kind', 'tier']
+)
+
+code_result_cache_requests = Counter(
+    'code_executor_result_cache_requests_total',
+    'Execution result cache lookups',
+    ['language', 'result']
+)
+
+search_index_queue_depth = Gauge(
+    'search_index_queue_depth',
+    'Notes waiting in the search indexing queue'
+)
+
+search_index_lag_seconds = Histogram(
+    'search_index_lag_seconds',
+    'Time from a note being queued for indexing until it is indexed',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+
+search_index_batch_size = Histogram(
+    'search_index_batch_size',
+    'Documents per bulk search index write',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500)
+)
+
+search_index_operations = Counter(
+    'search_index_operations_total',
+    'Search indexing queue operations',
+    ['result']
 )
 
 collaboration_sessions = Counter(
@@ -101,7 +168,7 @@ def track_operation(metric, label=None):
 def create_note():
     pass
 
-@track_operation(ai_requests, 'summarize')
-def summarize_note():
+@track_operation(export_operations, 'pdf')
+def export_note():
     pass
 """
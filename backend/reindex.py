@@ -0,0 +1,38 @@
+from pymongo import MongoClient
+from dotenv import load_dotenv
+import argparse
+import logging
+import os
+
+from services.render_pool import render_pool
+from services.search_backends import create_search_backend
+from services.search_reindex import ReindexService
+
+# Load environment variables
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the search index from MongoDB.")
+    parser.add_argument('--new', action='store_true', help="start a new version instead of resuming an unfinished one")
+    parser.add_argument('--batch-size', type=int, help="notes loaded per bulk write")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/skriptd'))
+    service = ReindexService(
+        client.get_default_database(),
+        create_search_backend(os.getenv('ELASTICSEARCH_URL')),
+        render_pool=render_pool,
+        batch_size=args.batch_size
+    )
+    try:
+        stats = service.run(resume=not args.new)
+        print(f"\nReindexed {stats['indexed']} notes into {stats['index']} "
+              f"in {stats['seconds']}s ({stats['notes_per_second']} notes/s)")
+    finally:
+        render_pool.shutdown()
+        client.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,163 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, current_app, request, jsonify, send_file, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from io import BytesIO
 import datetime
+import json
+import os
 
-from models.note import Note
+from models.note import LIST_PROJECTION, Note, serialize_note
 from errors import NotFoundError, AuthorizationError, ValidationError
 from services.content_processor import ContentProcessor
-from services.code_executor import CodeExecutor
-from services.advanced_search import AdvancedSearch
-from services.ai_service import AIService
-from services.version_control import VersionControlService
-from services.collaboration import CollaborationService
-from services.export import ExportService
+from services.registry import services
+from services.ai_cache import ai_cache
+from services.ai_jobs import AIJobService
+from services.execution_jobs import ExecutionJobService
+from models.processing_state import FAILED, PENDING
+from services.note_processing import NoteProcessingService
+from services.render_pool import render_pool
+from utils.pagination import (
+    KEYSET_SORT, ensure_keyset_index, keyset_page, parse_fields, parse_limit, stream_json_array
+)
 
 notes_bp = Blueprint('notes', __name__)
 
+NOTES_PAGE_SIZE = 50
+MAX_NOTES_PAGE_SIZE = 200
+
+# Fields that can be selected when listing notes
+NOTE_FIELDS = (
+    'title', 'content', 'folder_id', 'tags', 'attachments', 'current_version',
+    'processed_content', 'processing_state', 'processed_version', 'created_at', 'updated_at'
+)
+
 # Initialize services
-content_processor = ContentProcessor()
-code_executor = CodeExecutor()
-advanced_search = AdvancedSearch(elasticsearch_url='http://localhost:9200')
-ai_service = AIService()
-version_control = VersionControlService(base_path='./data/git_repos')
-collaboration = CollaborationService()
-export_service = ExportService(templates_path='./templates')
+content_processor = ContentProcessor(render_pool=render_pool)
+ai_jobs = AIJobService()
+execution_jobs = ExecutionJobService()
+
+# Heavy services are constructed on first use so workers boot quickly
+def _create_code_executor():
+    from services.code_executor import CodeExecutor
+    return CodeExecutor()
+
+def _create_batch_executor():
+    from services.batch_executor import BatchExecutor
+    return BatchExecutor(services.get('code_executor'))
+
+def _create_advanced_search():
+    from services.advanced_search import AdvancedSearch
+    return AdvancedSearch(elasticsearch_url=os.getenv('ELASTICSEARCH_URL'))
+
+def _create_ai_service():
+    from services.ai_service import AIService
+    return AIService()
+
+def _create_version_control():
+    from services.version_control import VersionControlService
+    return VersionControlService(base_path='./data/git_repos')
+
+def _create_collaboration():
+    from services.collaboration import CollaborationService
+    return CollaborationService()
+
+def _create_export_service():
+    from services.export import ExportService
+    return ExportService(templates_path='./templates', render_pool=render_pool)
+
+services.register('code_executor', _create_code_executor)
+services.register('batch_executor', _create_batch_executor)
+services.register('advanced_search', _create_advanced_search)
+services.register('ai_service', _create_ai_service)
+services.register('version_control', _create_version_control)
+services.register('collaboration', _create_collaboration)
+services.register('export_service', _create_export_service)
+
+def _cached_ai_response(operation, params, content, compute, note_id=None):
+    """Serve an AI result from the content-addressed cache when possible."""
+    from services.ai_service import OPERATION_MODELS
+    
+    result, hit = ai_cache.get_or_compute(
+        operation,
+        OPERATION_MODELS[operation],
+        params,
+        content,
+        compute,
+        note_id=note_id
+    )
+    return result, {'X-Cache': 'HIT' if hit else 'MISS'}
+
+def _wants_async(data):
+    """Check whether the client asked for the request to run as a job."""
+    return bool(data.get('async')) or request.args.get('async', '').lower() in ('1', 'true')
+
+def _enqueue_ai_job(operation, params, content, note_id=None):
+    """Queue an AI request and respond with its job id."""
+    job = ai_jobs.submit(
+        operation,
+        params,
+        content,
+        user_id=get_jwt_identity(),
+        note_id=note_id
+    )
+    return jsonify(job), 202
+
+def _queue_processing(note):
+    """Render and index a saved note in the background.
+    
+    Falls back to processing in the request when the task queue is down,
+    so notes never stay pending.
+    """
+    from tasks import process_note
+    
+    try:
+        process_note.delay(str(note._id))
+    except Exception:
+        current_app.logger.warning(f"Could not queue processing of note {note._id}; processing inline")
+        NoteProcessingService(
+            request.mongo.db,
+            content_processor=content_processor,
+            search=services.get('advanced_search')
+        ).process(str(note._id))
+
+def _format_sse(event, data):
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _streamed_ai_response(operation, params, content, open_stream, note_id=None, result_key=None):
+    """Stream an AI result as server-sent events.
+    
+    Emits ``token`` events as the model produces output and a final
+    ``result`` event with the same payload as the non-streaming endpoint.
+    Cached results are sent as a single ``result`` event.
+    """
+    from services.ai_service import OPERATION_MODELS
+    
+    model = OPERATION_MODELS[operation]
+    cached_result = ai_cache.lookup(operation, model, params, content)
+    
+    def wrap(result):
+        return {result_key: result} if result_key else result
+    
+    def generate():
+        if cached_result is not None:
+            yield _format_sse('result', wrap(cached_result))
+            return
+        
+        for event in open_stream():
+            if 'token' in event:
+                yield _format_sse('token', {'token': event['token']})
+            elif 'result' in event:
+                ai_cache.store(operation, model, params, content, event['result'], note_id=note_id)
+                yield _format_sse('result', wrap(event['result']))
+            else:
+                yield _format_sse('error', {'error': event['error']})
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering
+    response.headers['X-Cache'] = 'HIT' if cached_result is not None else 'MISS'
+    return response
 
 @notes_bp.route('', methods=['POST'])
 @jwt_required()
@@ -37,22 +171,16 @@ def create_note():
         if not data.get('title') or not data.get('content'):
             raise ValidationError('Title and content are required')
         
-        # Process content
-        processed_content = content_processor.process_content(data['content'])
-        
-        # Create note with processed content
+        # Store the note now; rendering and indexing happen in the background
         note = Note.create(
             request.mongo,
             user_id=user_id,
             title=data['title'],
             content=data['content'],
-            processed_content=processed_content,
             folder_id=data.get('folder_id'),
             tags=data.get('tags', [])
         )
-        
-        # Index note for search
-        advanced_search.index_note(note.to_dict())
+        _queue_processing(note)
         
         return jsonify(note.to_dict()), 201
         
@@ -61,24 +189,97 @@ def create_note():
             return jsonify({'error': str(e)}), 400
         return jsonify({'error': str(e)}), 500
 
+@notes_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_notes():
+    """Create many notes at once, rendering them across worker processes."""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        notes_data = data.get('notes') or []
+        
+        if not notes_data:
+            raise ValidationError('Notes are required')
+        max_notes = int(os.getenv('NOTES_IMPORT_MAX', 500))
+        if len(notes_data) > max_notes:
+            raise ValidationError(f'At most {max_notes} notes can be imported at once')
+        if any(not item.get('title') or not item.get('content') for item in notes_data):
+            raise ValidationError('Title and content are required for every note')
+        
+        contents = [item['content'] for item in notes_data]
+        if render_pool.should_use(len(contents)):
+            processed = render_pool.process_notes(contents)
+        else:
+            processed = [content_processor.process_content(content) for content in contents]
+        
+        processing = NoteProcessingService(
+            request.mongo.db,
+            search=services.get('advanced_search')
+        )
+        notes = []
+        for item, processed_content in zip(notes_data, processed):
+            note = Note.create(
+                request.mongo,
+                user_id=user_id,
+                title=item['title'],
+                content=item['content'],
+                processed_content=processed_content,
+                folder_id=item.get('folder_id'),
+                tags=item.get('tags', [])
+            )
+            processing.index(note.to_document(), processed_content)
+            notes.append(note)
+        
+        return jsonify({
+            'imported': len(notes),
+            'note_ids': [str(note._id) for note in notes]
+        }), 201
+        
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @notes_bp.route('', methods=['GET'])
 @jwt_required()
 def get_notes():
-    """Get all notes for the current user."""
+    """Get the current user's notes, newest first.
+    
+    Passing ``limit`` returns one page, with the cursor of the next page
+    in the X-Next-Cursor header; ``fields`` selects the returned fields.
+    """
     try:
         user_id = get_jwt_identity()
         folder_id = request.args.get('folder_id')
         tag = request.args.get('tag')
+        cursor = request.args.get('cursor')
+        projection = parse_fields(request.args, NOTE_FIELDS) or LIST_PROJECTION
         
-        # Get notes
-        notes = Note.get_by_user(request.mongo, user_id, folder_id)
-        
-        # Filter by tag if specified
+        query = {'user_id': ObjectId(user_id)}
+        if folder_id:
+            query['folder_id'] = ObjectId(folder_id)
         if tag:
-            notes = [note for note in notes if tag in note.tags]
+            query['tags'] = tag
+        
+        ensure_keyset_index(request.mongo.db.notes)
+        next_cursor = None
+        if 'limit' in request.args or cursor:
+            limit = parse_limit(request.args, NOTES_PAGE_SIZE, MAX_NOTES_PAGE_SIZE)
+            notes, next_cursor = keyset_page(request.mongo.db.notes, query, projection, limit, cursor)
+        else:
+            notes = request.mongo.db.notes.find(query, projection).sort(KEYSET_SORT)
         
-        return jsonify([note.to_dict() for note in notes])
+        # Stream the array so large lists are never held in memory
+        response = Response(
+            stream_with_context(stream_json_array(notes, serialize=serialize_note)),
+            mimetype='application/json'
+        )
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
         
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -120,6 +321,7 @@ def update_note(note_id):
             raise AuthorizationError('You do not have permission to modify this note')
         
         data = request.get_json()
+        previous_content = note.content
         note.update(
             request.mongo,
             title=data.get('title'),
@@ -129,12 +331,17 @@ def update_note(note_id):
             change_description=data.get('change_description')
         )
         
-        # Process content
-        processed_content = content_processor.process_content(note.content)
-        note.update(request.mongo, processed_content=processed_content)
+        if note.content != previous_content:
+            # Cached AI results describe the old content
+            ai_cache.invalidate_note(note_id, previous_content)
         
-        # Index note for search
-        advanced_search.index_note(note.to_dict())
+        # Readers keep the last rendered HTML until the new version lands;
+        # a folder or tag change only has to be indexed again
+        if (
+            note.processing_state in (PENDING, FAILED)
+            or note.indexed_version != note.current_version
+        ):
+            _queue_processing(note)
         
         return jsonify(note.to_dict())
         
@@ -178,10 +385,23 @@ def execute_code():
         if not data.get('code') or not data.get('language'):
             raise ValidationError('Code and language are required')
         
-        result = code_executor.execute_code(
+        if _wants_async(data):
+            job = execution_jobs.submit(
+                code=data['code'],
+                language=data['language'],
+                user_id=get_jwt_identity(),
+                timeout=data.get('timeout', 30),
+                stdin=data.get('stdin'),
+                use_cache=not data.get('no_cache', False)
+            )
+            return jsonify(job), 202
+        
+        result = services.get('code_executor').execute_code(
             code=data['code'],
             language=data['language'],
-            timeout=data.get('timeout', 30)
+            timeout=data.get('timeout', 30),
+            stdin=data.get('stdin'),
+            use_cache=not data.get('no_cache', False)
         )
         
         return jsonify(result)
@@ -189,6 +409,75 @@ def execute_code():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@notes_bp.route('/execute-code/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_execution_job(job_id):
+    """Get the state or result of an async code execution."""
+    try:
+        status = execution_jobs.get_status(job_id, get_jwt_identity())
+        if not status:
+            raise NotFoundError('Job not found')
+        
+        return jsonify(status)
+        
+    except NotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@notes_bp.route('/<note_id>/execute-code', methods=['POST'])
+@jwt_required()
+def execute_note_code(note_id):
+    """Run every code block in a note, streaming results as server-sent events.
+    
+    Emits one ``result`` event per block as it finishes, tagged with the
+    block's index, then a ``done`` event.
+    """
+    try:
+        note = Note.get_by_id(request.mongo, note_id)
+        if not note:
+            raise NotFoundError('Note not found')
+        
+        # Check access
+        user_id = get_jwt_identity()
+        if str(note.user_id) != user_id:
+            raise AuthorizationError('You do not have permission to run this note')
+        
+        data = request.get_json(silent=True) or {}
+        blocks = content_processor.extract_code_blocks(note.content)
+        if not blocks:
+            raise ValidationError('Note has no code blocks')
+        
+        batch_executor = services.get('batch_executor')
+        if len(blocks) > batch_executor.max_blocks:
+            raise ValidationError(f"A note can run at most {batch_executor.max_blocks} code blocks at once")
+        
+        results = batch_executor.run(
+            user_id,
+            blocks,
+            timeout=data.get('timeout', 30),
+            use_cache=not data.get('no_cache', False)
+        )
+        
+        def generate():
+            for result in results:
+                yield _format_sse('result', result)
+            yield _format_sse('done', {'total': len(blocks)})
+        
+        response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering
+        return response
+        
+    except NotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except AuthorizationError as e:
+        return jsonify({'error': str(e)}), 403
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @notes_bp.route('/validate-code', methods=['POST'])
 @jwt_required()
 def validate_code():
@@ -198,7 +487,7 @@ def validate_code():
         if not data.get('code') or not data.get('language'):
             raise ValidationError('Code and language are required')
         
-        result = code_executor.validate_code(
+        result = services.get('code_executor').validate_code(
             code=data['code'],
             language=data['language']
         )
@@ -266,8 +555,17 @@ def summarize_note():
         if str(note.user_id) != user_id:
             raise AuthorizationError('You do not have permission to access this note')
         
-        summary = ai_service.summarize_note(note.content, max_length)
-        return jsonify({'summary': summary})
+        if _wants_async(data):
+            return _enqueue_ai_job('summarize', {'max_length': max_length}, note.content, note_id)
+        
+        summary, headers = _cached_ai_response(
+            'summarize',
+            {'max_length': max_length},
+            note.content,
+            lambda: services.get('ai_service').summarize_note(note.content, max_length),
+            note_id=note_id
+        )
+        return jsonify({'summary': summary}), 200, headers
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -281,11 +579,41 @@ def explain_code():
         if not data.get('code') or not data.get('language'):
             raise ValidationError('Code and language are required')
         
-        explanation = ai_service.explain_code(
-            code=data['code'],
-            language=data['language']
+        if _wants_async(data):
+            return _enqueue_ai_job('explain_code', {'language': data['language']}, data['code'])
+        
+        explanation, headers = _cached_ai_response(
+            'explain_code',
+            {'language': data['language']},
+            data['code'],
+            lambda: services.get('ai_service').explain_code(
+                code=data['code'],
+                language=data['language']
+            )
+        )
+        return jsonify(explanation), 200, headers
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@notes_bp.route('/ai/explain-code/stream', methods=['POST'])
+@jwt_required()
+def stream_explain_code():
+    """Stream an AI explanation for a code snippet as server-sent events."""
+    try:
+        data = request.get_json()
+        if not data.get('code') or not data.get('language'):
+            raise ValidationError('Code and language are required')
+        
+        return _streamed_ai_response(
+            'explain_code',
+            {'language': data['language']},
+            data['code'],
+            lambda: services.get('ai_service').stream_explain_code(
+                code=data['code'],
+                language=data['language']
+            )
         )
-        return jsonify(explanation)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -299,11 +627,19 @@ def suggest_improvements():
         if not data.get('code') or not data.get('language'):
             raise ValidationError('Code and language are required')
         
-        suggestions = ai_service.suggest_improvements(
-            code=data['code'],
-            language=data['language']
+        if _wants_async(data):
+            return _enqueue_ai_job('suggest_improvements', {'language': data['language']}, data['code'])
+        
+        suggestions, headers = _cached_ai_response(
+            'suggest_improvements',
+            {'language': data['language']},
+            data['code'],
+            lambda: services.get('ai_service').suggest_improvements(
+                code=data['code'],
+                language=data['language']
+            )
         )
-        return jsonify(suggestions)
+        return jsonify(suggestions), 200, headers
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -325,19 +661,73 @@ def generate_study_questions():
         if str(note.user_id) != user_id:
             raise AuthorizationError('You do not have permission to access this note')
         
-        questions = ai_service.generate_study_questions(note.content)
-        return jsonify({'questions': questions})
+        if _wants_async(data):
+            return _enqueue_ai_job('study_questions', {}, note.content, note_id)
+        
+        questions, headers = _cached_ai_response(
+            'study_questions',
+            {},
+            note.content,
+            lambda: services.get('ai_service').generate_study_questions(note.content),
+            note_id=note_id
+        )
+        return jsonify({'questions': questions}), 200, headers
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@notes_bp.route('/ai/study-questions/stream', methods=['POST'])
+@jwt_required()
+def stream_study_questions():
+    """Stream generated study questions as server-sent events."""
+    try:
+        data = request.get_json()
+        note_id = data.get('note_id')
+        
+        note = Note.get_by_id(request.mongo, note_id)
+        if not note:
+            raise NotFoundError('Note not found')
+        
+        # Check access
+        user_id = get_jwt_identity()
+        if str(note.user_id) != user_id:
+            raise AuthorizationError('You do not have permission to access this note')
+        
+        return _streamed_ai_response(
+            'study_questions',
+            {},
+            note.content,
+            lambda: services.get('ai_service').stream_study_questions(note.content),
+            note_id=note_id,
+            result_key='questions'
+        )
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@notes_bp.route('/ai/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_ai_job(job_id):
+    """Get the progress or result of an async AI job."""
+    try:
+        status = ai_jobs.get_status(job_id, get_jwt_identity())
+        if not status:
+            raise NotFoundError('Job not found')
+        
+        return jsonify(status)
+        
+    except NotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @notes_bp.route('/version-control/init', methods=['POST'])
 @jwt_required()
 def init_version_control():
     """Initialize version control for user."""
     try:
         user_id = get_jwt_identity()
-        result = version_control.init_user_repo(user_id)
+        result = services.get('version_control').init_user_repo(user_id)
         return jsonify(result)
         
     except Exception as e:
@@ -360,7 +750,7 @@ def save_version():
         if str(note.user_id) != user_id:
             raise AuthorizationError('You do not have permission to modify this note')
         
-        result = version_control.save_note_version(
+        result = services.get('version_control').save_note_version(
             user_id=user_id,
             note_id=note_id,
             content=note.to_dict()
@@ -384,7 +774,7 @@ def get_version_history(note_id):
         if str(note.user_id) != user_id:
             raise AuthorizationError('You do not have permission to access this note')
         
-        history = version_control.get_note_history(user_id, note_id)
+        history = services.get('version_control').get_note_history(user_id, note_id)
         return jsonify({'history': history})
         
     except Exception as e:
@@ -411,7 +801,7 @@ def restore_version():
         if str(note.user_id) != user_id:
             raise AuthorizationError('You do not have permission to modify this note')
         
-        result = version_control.restore_note_version(user_id, note_id, commit_hash)
+        result = services.get('version_control').restore_note_version(user_id, note_id, commit_hash)
         return jsonify(result)
         
     except Exception as e:
@@ -448,7 +838,7 @@ def batch_export():
             raise NotFoundError('No accessible notes found')
         
         # Generate export
-        export_buffer = export_service.batch_export(notes, format, include_metadata)
+        export_buffer = services.get('export_service').batch_export(notes, format, include_metadata)
         
         return send_file(
             export_buffer,
@@ -1,11 +1,45 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from datetime import datetime
 from extensions import mongo
+from errors import ValidationError
+from models.note import LIST_PROJECTION
+from utils.pagination import (
+    ensure_keyset_index, keyset_page, parse_fields, parse_limit, stream_json_array
+)
+import re
+import threading
 
 search_bp = Blueprint('search', __name__)
 
+MAX_RESULTS = 100
+
+# Fields that can be selected for search results
+SEARCH_FIELDS = ('title', 'content', 'folder_id', 'tags', 'created_at', 'updated_at')
+
+_text_index_ready = False
+_text_index_lock = threading.Lock()
+
+def _ensure_text_index():
+    """Create the notes text index once per process.
+    
+    The index is prefixed by user_id, so a search only walks the
+    searching user's entries. Title matches rank above content matches.
+    """
+    global _text_index_ready
+    if _text_index_ready:
+        return
+    
+    with _text_index_lock:
+        if not _text_index_ready:
+            mongo.db.notes.create_index(
+                [('user_id', 1), ('title', 'text'), ('content', 'text')],
+                name='notes_text',
+                weights={'title': 10, 'content': 1}
+            )
+            _text_index_ready = True
+
 @search_bp.route('/', methods=['GET'])
 @jwt_required()
 def search():
@@ -14,18 +48,21 @@ def search():
         query = request.args.get('q', '').strip()
         tag = request.args.get('tag')
         folder_id = request.args.get('folder_id')
+        cursor = request.args.get('cursor')
         
         if not query and not tag and not folder_id:
             return jsonify({'error': 'No search criteria provided'}), 400
             
+        limit = parse_limit(request.args, 50, MAX_RESULTS)
+        projection = parse_fields(request.args, SEARCH_FIELDS) or LIST_PROJECTION
+            
         # Build search query
         search_query = {'user_id': ObjectId(current_user_id)}
         
         if query:
-            search_query['$or'] = [
-                {'title': {'$regex': query, '$options': 'i'}},
-                {'content': {'$regex': query, '$options': 'i'}}
-            ]
+            # Full-text match through the text index instead of a regex scan
+            _ensure_text_index()
+            search_query['$text'] = {'$search': query}
             
         if tag:
             search_query['tags'] = tag
@@ -33,18 +70,27 @@ def search():
         if folder_id:
             search_query['folder_id'] = ObjectId(folder_id)
             
-        # Execute search
-        notes = list(mongo.db.notes.find(search_query).sort('updated_at', -1))
-        
-        # Format results
-        for note in notes:
-            note['_id'] = str(note['_id'])
-            note['user_id'] = str(note['user_id'])
-            if note.get('folder_id'):
-                note['folder_id'] = str(note['folder_id'])
+        next_cursor = None
+        if query:
+            # Relevance can't be resumed from a key, so text matches
+            # return the best results only
+            if cursor:
+                raise ValidationError('Cursors are not supported for text queries')
+            projection = dict(projection, score={'$meta': 'textScore'})
+            notes = mongo.db.notes.find(search_query, projection).sort(
+                [('score', {'$meta': 'textScore'}), ('updated_at', -1)]
+            ).limit(limit)
+        else:
+            ensure_keyset_index(mongo.db.notes)
+            notes, next_cursor = keyset_page(mongo.db.notes, search_query, projection, limit, cursor)
                 
-        return jsonify(notes), 200
+        response = Response(stream_with_context(stream_json_array(notes)), mimetype='application/json')
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
         
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -62,7 +108,7 @@ def get_suggestions():
         tag_pipeline = [
             {'$match': {'user_id': ObjectId(current_user_id)}},
             {'$unwind': '$tags'},
-            {'$match': {'tags': {'$regex': f'^{prefix}', '$options': 'i'}}},
+            {'$match': {'tags': {'$regex': f'^{re.escape(prefix)}', '$options': 'i'}}},
             {'$group': {'_id': '$tags', 'count': {'$sum': 1}}},
             {'$sort': {'count': -1}},
             {'$limit': 5}
@@ -74,7 +120,7 @@ def get_suggestions():
         title_pipeline = [
             {'$match': {
                 'user_id': ObjectId(current_user_id),
-                'title': {'$regex': f'^{prefix}', '$options': 'i'}
+                'title': {'$regex': f'^{re.escape(prefix)}', '$options': 'i'}
             }},
             {'$group': {'_id': '$title', 'count': {'$sum': 1}}},
             {'$sort': {'count': -1}},
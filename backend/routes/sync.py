@@ -1,11 +1,15 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_socketio import emit, join_room, leave_room
 from bson import ObjectId
 from datetime import datetime
 from extensions import mongo, socketio
+from services.execution_jobs import ExecutionJobService, execution_room
 
 sync_bp = Blueprint('sync', __name__)
 
+execution_jobs = ExecutionJobService()
+
 @socketio.on('join')
 @jwt_required()
 def on_join(data):
@@ -121,3 +125,30 @@ def on_cursor_move(data):
         
     except Exception as e:
         emit('error', {'message': str(e)})
+
+@socketio.on('watch_execution')
+@jwt_required()
+def on_watch_execution(data):
+    """Receive the result of an async code execution when it finishes."""
+    try:
+        job_id = data.get('job_id')
+        if not job_id:
+            return emit('error', {'message': 'Job ID is required'})
+            
+        status = execution_jobs.get_status(job_id, get_jwt_identity())
+        if not status:
+            return emit('error', {'message': 'Job not found'})
+            
+        # Join before checking for a result, so one pushed in between
+        # still reaches the client
+        join_room(execution_room(job_id))
+        if 'result' not in status:
+            status = execution_jobs.get_status(job_id, get_jwt_identity()) or status
+            
+        # The job may have finished before the client started watching
+        if 'result' in status:
+            leave_room(execution_room(job_id))
+            emit('execution_result', {'job_id': job_id, 'result': status['result']})
+        
+    except Exception as e:
+        emit('error', {'message': str(e)})
@@ -4,6 +4,7 @@ from bson import ObjectId
 
 from models.note import Note
 from errors import NotFoundError, AuthorizationError
+from services.ai_cache import ai_cache
 
 versions_bp = Blueprint('versions', __name__)
 
@@ -67,8 +68,13 @@ def revert_to_version(note_id, version_number):
         raise AuthorizationError('You do not have permission to modify this note')
     
     change_description = request.json.get('change_description')
+    previous_content = note.content
     note.revert_to_version(request.mongo, version_number, change_description)
     
+    if note.content != previous_content:
+        # Cached AI results describe the old content
+        ai_cache.invalidate_note(note_id, previous_content)
+    
     return jsonify({
         'message': f'Note reverted to version {version_number}',
         'current_version': note.current_version
@@ -1,64 +1,27 @@
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 import re
-from pygments.lexers import guess_lexer
-from pygments.util import ClassNotFound
 import latex2mathml
-from elasticsearch import Elasticsearch
 from datetime import datetime
 
-class AdvancedSearch:
-    """Advanced search service with support for code and mathematical expressions."""
-    
-    def __init__(self, elasticsearch_url: str):
-        self.es = Elasticsearch(elasticsearch_url)
-        self._setup_indices()
-    
-    def _setup_indices(self):
-        """Setup Elasticsearch indices with appropriate mappings."""
-        # Note index mapping
-        note_mapping = {
-            "mappings": {
-                "properties": {
-                    "title": {"type": "text"},
-                    "content": {"type": "text"},
-                    "code_blocks": {
-                        "type": "nested",
-                        "properties": {
-                            "code": {"type": "text"},
-                            "language": {"type": "keyword"},
-                            "tokens": {"type": "text"}
-                        }
-                    },
-                    "latex_blocks": {
-                        "type": "nested",
-                        "properties": {
-                            "latex": {"type": "text"},
-                            "rendered": {"type": "text"}
-                        }
-                    },
-                    "tags": {"type": "keyword"},
-                    "folder_id": {"type": "keyword"},
-                    "user_id": {"type": "keyword"},
-                    "created_at": {"type": "date"},
-                    "updated_at": {"type": "date"}
-                }
-            }
-        }
-        
-        # Create indices if they don't exist
-        if not self.es.indices.exists(index="notes"):
-            self.es.indices.create(index="notes", body=note_mapping)
+from services.index_queue import IndexQueue
+from services.language_detection import language_detector
+from services.search_backends import SearchBackend, create_search_backend
+
+class SearchDocumentBuilder:
+    """Builds search documents from notes, with processed code and LaTeX blocks."""
     
-    def index_note(self, note: Dict):
-        """Index a note with its code and latex content."""
+    def build(self, note: Dict) -> Dict:
+        """Build the search document of a note."""
         # Process code blocks
-        code_blocks = self._process_code_blocks(note.get('content', ''))
+        code_blocks = self._process_code_blocks(
+            note.get('content', ''),
+            note.get('processed_content')
+        )
         
         # Process LaTeX blocks
         latex_blocks = self._process_latex_blocks(note.get('content', ''))
         
-        # Prepare document
-        doc = {
+        return {
             'title': note.get('title', ''),
             'content': note.get('content', ''),
             'code_blocks': code_blocks,
@@ -69,20 +32,27 @@ class AdvancedSearch:
             'created_at': note.get('created_at', datetime.utcnow()),
             'updated_at': note.get('updated_at', datetime.utcnow())
         }
-        
-        # Index document
-        self.es.index(index="notes", id=str(note.get('_id')), body=doc)
     
-    def _process_code_blocks(self, content: str) -> List[Dict]:
-        """Extract and process code blocks from content."""
-        code_blocks = []
-        pattern = r'```(\w+)?\n(.*?)```'
-        matches = re.finditer(pattern, content, re.DOTALL)
+    def _process_code_blocks(self, content: str, processed_content: Optional[Dict] = None) -> List[Dict]:
+        """Extract and process code blocks from content.
         
-        for match in matches:
-            code = match.group(2).strip()
-            lang = match.group(1) or self._detect_language(code)
-            
+        Blocks already extracted by content processing are reused so their
+        languages are not detected a second time.
+        """
+        if processed_content and 'code_blocks' in processed_content:
+            blocks = [
+                (block['code'], block['language'])
+                for block in processed_content['code_blocks']
+            ]
+        else:
+            blocks = [
+                (match.group(2).strip(), match.group(1))
+                for match in re.finditer(r'```(\w+)?\n(.*?)```', content, re.DOTALL)
+            ]
+        
+        code_blocks = []
+        for code, lang in blocks:
+            lang = self._detect_language(code, lang)
             code_blocks.append({
                 'code': code,
                 'language': lang,
@@ -91,13 +61,9 @@ class AdvancedSearch:
         
         return code_blocks
     
-    def _detect_language(self, code: str) -> str:
+    def _detect_language(self, code: str, hint: Optional[str] = None) -> str:
         """Detect programming language of code snippet."""
-        try:
-            lexer = guess_lexer(code)
-            return lexer.name.lower()
-        except ClassNotFound:
-            return 'text'
+        return language_detector.detect(code, hint=hint)
     
     def _tokenize_code(self, code: str, language: str) -> str:
         """Tokenize code for better searchability."""
@@ -124,6 +90,39 @@ class AdvancedSearch:
             })
         
         return latex_blocks
+
+class AdvancedSearch(SearchDocumentBuilder):
+    """Advanced search service with support for code and mathematical expressions.
+    
+    Documents are stored by a pluggable backend: an Elasticsearch cluster,
+    or the embedded on-disk engine when none is configured.
+    Notes are written to it in bulk by a background indexing queue.
+    """
+    
+    def __init__(
+        self,
+        elasticsearch_url: Optional[str] = None,
+        backend: Optional[SearchBackend] = None,
+        index_queue: Optional[IndexQueue] = None
+    ):
+        self.backend = backend or create_search_backend(elasticsearch_url)
+        self.index_queue = index_queue or IndexQueue(self.backend)
+    
+    def index_note(self, note: Dict, on_indexed: Optional[Callable[[], None]] = None):
+        """Queue a note with its code and latex content for indexing.
+
+        ``on_indexed`` is called once the note has been written to the index.
+        """
+        self.index_queue.enqueue(str(note.get('_id')), self.build(note), on_indexed)
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until queued notes have been indexed."""
+        return self.index_queue.flush(timeout)
+    
+    def optimize_index(self):
+        """Compact the live search index."""
+        self.flush()
+        self.backend.optimize()
     
     def search(
         self,
@@ -137,85 +136,10 @@ class AdvancedSearch:
         Perform advanced search across notes.
         Supports code-aware search and mathematical expressions.
         """
-        # Base query
-        must = [{"term": {"user_id": user_id}}]
-        
-        # Add filters
-        if language:
-            must.append({
-                "nested": {
-                    "path": "code_blocks",
-                    "query": {
-                        "term": {"code_blocks.language": language}
-                    }
-                }
-            })
-        
-        if tags:
-            must.append({"terms": {"tags": tags}})
-            
-        if folder_id:
-            must.append({"term": {"folder_id": folder_id}})
-        
-        # Build search query
-        search_query = {
-            "bool": {
-                "must": must,
-                "should": [
-                    # Full text search
-                    {"match": {"title": {"query": query, "boost": 2.0}}},
-                    {"match": {"content": query}},
-                    # Code search
-                    {
-                        "nested": {
-                            "path": "code_blocks",
-                            "query": {
-                                "bool": {
-                                    "should": [
-                                        {"match": {"code_blocks.code": query}},
-                                        {"match": {"code_blocks.tokens": query}}
-                                    ]
-                                }
-                            },
-                            "score_mode": "max"
-                        }
-                    },
-                    # LaTeX search
-                    {
-                        "nested": {
-                            "path": "latex_blocks",
-                            "query": {
-                                "match": {"latex_blocks.latex": query}
-                            }
-                        }
-                    }
-                ]
-            }
-        }
-        
-        # Execute search
-        results = self.es.search(
-            index="notes",
-            body={
-                "query": search_query,
-                "highlight": {
-                    "fields": {
-                        "title": {},
-                        "content": {},
-                        "code_blocks.code": {},
-                        "latex_blocks.latex": {}
-                    }
-                }
-            }
+        return self.backend.search(
+            query,
+            user_id,
+            language=language,
+            tags=tags,
+            folder_id=folder_id
         )
-        
-        # Process results
-        processed_results = []
-        for hit in results['hits']['hits']:
-            result = hit['_source']
-            result['score'] = hit['_score']
-            if 'highlight' in hit:
-                result['highlights'] = hit['highlight']
-            processed_results.append(result)
-        
-        return processed_results
@@ -0,0 +1,177 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import time
+
+from monitoring import ai_requests
+from services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+
+def _is_error_result(result: Any) -> bool:
+    """AIService reports failures in its return value; never cache those.
+
+    Degraded results are skipped too so the full result is cached once
+    both halves succeed.
+    """
+    if isinstance(result, dict):
+        return 'error' in result or bool(result.get('degraded'))
+    if isinstance(result, list):
+        return bool(result) and isinstance(result[0], dict) and 'error' in result[0]
+    if isinstance(result, str):
+        return result.startswith('Error ')
+    return result is None
+
+
+class AIResultCache:
+    """Content-addressed cache for AI results.
+
+    Results are keyed by a hash of (operation, model, parameters, content)
+    and stored in Redis, falling back to files on disk when Redis is
+    unavailable. Keys derived from a note are tracked per note and
+    content, so the results for a note's old content can be dropped once
+    it changes without touching those for its new content.
+    """
+
+    def __init__(
+        self,
+        cache_service: Optional[CacheService] = None,
+        cache_dir: Optional[str] = None,
+        timeout: Optional[int] = None
+    ):
+        self.cache = cache_service or CacheService()
+        self.cache_dir = cache_dir or os.getenv('AI_CACHE_DIR', './data/ai_cache')
+        self.timeout = timeout or int(os.getenv('AI_CACHE_TIMEOUT', 7 * 24 * 3600))
+
+    @staticmethod
+    def make_key(operation: str, model: str, params: Dict, content: str) -> str:
+        """Build the cache key for an AI request."""
+        payload = json.dumps(
+            {
+                'operation': operation,
+                'model': model,
+                'params': params,
+                'content': content
+            },
+            sort_keys=True
+        )
+        digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        return f"ai:{operation}:{digest}"
+
+    def get_or_compute(
+        self,
+        operation: str,
+        model: str,
+        params: Dict,
+        content: str,
+        compute: Callable[[], Any],
+        note_id: Optional[str] = None
+    ) -> Tuple[Any, bool]:
+        """Return the cached result or compute and store it.
+
+        Returns a ``(result, hit)`` tuple.
+        """
+        cached_result = self.lookup(operation, model, params, content)
+        if cached_result is not None:
+            return cached_result, True
+
+        result = compute()
+        self.store(operation, model, params, content, result, note_id=note_id)
+        return result, False
+
+    def lookup(self, operation: str, model: str, params: Dict, content: str) -> Optional[Any]:
+        """Get a cached result, recording the hit or miss."""
+        cached_value = self._load(self.make_key(operation, model, params, content))
+        if cached_value is not None:
+            ai_requests.labels(operation, 'hit').inc()
+            return cached_value['result']
+
+        ai_requests.labels(operation, 'miss').inc()
+        return None
+
+    def store(
+        self,
+        operation: str,
+        model: str,
+        params: Dict,
+        content: str,
+        result: Any,
+        note_id: Optional[str] = None
+    ):
+        """Cache a computed result unless it reports an error."""
+        if _is_error_result(result):
+            return
+
+        key = self.make_key(operation, model, params, content)
+        self._store(key, {'result': result})
+        if note_id:
+            self._track_note_key(note_id, content, key)
+
+    def invalidate_note(self, note_id: str, content: str):
+        """Drop the cached results derived from a note's earlier content."""
+        index_key = self._note_index_key(note_id, content)
+        for key in self._load(index_key) or []:
+            self._remove(key)
+        self._remove(index_key)
+
+    def _note_index_key(self, note_id: str, content: str) -> str:
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        return f"ai:note:{note_id}:{digest}"
+
+    def _track_note_key(self, note_id: str, content: str, key: str):
+        index_key = self._note_index_key(note_id, content)
+        keys: List[str] = self._load(index_key) or []
+        if key not in keys:
+            keys.append(key)
+            self._store(index_key, keys)
+
+    def _load(self, key: str) -> Optional[Any]:
+        try:
+            return self.cache.get(key)
+        except Exception:
+            return self._disk_get(key)
+
+    def _store(self, key: str, value: Any):
+        if not self.cache.set(key, value, self.timeout):
+            self._disk_set(key, value)
+
+    def _remove(self, key: str):
+        try:
+            self.cache.delete(key)
+        except Exception:
+            pass
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key.replace(':', '_') + '.json')
+
+    def _disk_get(self, key: str) -> Optional[Any]:
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.timeout:
+                os.remove(path)
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_set(self, key: str, value: Any):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(value, f)
+            os.replace(temp_path, path)
+        except OSError:
+            logger.warning(f"Failed to write AI cache entry: {key}")
+
+
+# Shared cache used by the AI routes and note updates
+ai_cache = AIResultCache()
@@ -0,0 +1,140 @@
+from typing import Dict, Optional, Tuple
+import logging
+import uuid
+
+from services.ai_cache import AIResultCache
+from services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+# Key wrapping each operation's result, matching the synchronous endpoints
+RESULT_KEYS = {
+    'summarize': 'summary',
+    'study_questions': 'questions'
+}
+
+# Jobs cannot outlive the Celery hard time limit
+JOB_TTL = 3600
+
+
+class AIJobService:
+    """Queues AI requests on Celery and tracks their progress.
+
+    Identical requests (same operation, model, parameters and content)
+    that are still in flight share one job instead of queueing another.
+    """
+
+    def __init__(self, cache_service: Optional[CacheService] = None):
+        self.cache = cache_service or CacheService()
+
+    def submit(
+        self,
+        operation: str,
+        params: Dict,
+        content: str,
+        user_id: str,
+        note_id: Optional[str] = None
+    ) -> Dict:
+        """Enqueue an AI job, reusing an identical in-flight job if any."""
+        from services.ai_service import OPERATION_MODELS
+        from tasks import process_ai_requests
+
+        dedupe_key = AIResultCache.make_key(
+            operation, OPERATION_MODELS[operation], params, content
+        )
+        inflight_key = f"ai_job_inflight:{dedupe_key}"
+
+        job_id = str(uuid.uuid4())
+        slot, holder = self._claim(inflight_key, job_id)
+        if holder:
+            # A set add, so concurrent joins of the same job cannot drop an owner
+            self.cache.add_to_set(self._owners_key(holder), user_id, JOB_TTL)
+            return {'job_id': holder, 'state': self._state(holder), 'deduplicated': True}
+
+        self.cache.set(self._job_key(job_id), {'operation': operation}, JOB_TTL)
+        self.cache.add_to_set(self._owners_key(job_id), user_id, JOB_TTL)
+        try:
+            process_ai_requests.apply_async(
+                args=[operation, content],
+                kwargs={'note_id': note_id, **params},
+                task_id=job_id
+            )
+        except Exception:
+            # Let the next identical request queue its own job
+            self.cache.delete(slot)
+            raise
+        if slot != inflight_key:
+            self.cache.set(inflight_key, job_id, JOB_TTL)
+
+        return {'job_id': job_id, 'state': 'PENDING', 'deduplicated': False}
+
+    def _claim(self, inflight_key: str, job_id: str) -> Tuple[str, Optional[str]]:
+        """Atomically claim the in-flight slot of a request for a new job.
+
+        Returns the claimed slot, or the id of the in-flight job holding
+        it. A finished job's slot is taken over through a successor key
+        that is itself claimed with SET NX, so two requests never both
+        replace the same finished job.
+        """
+        slot = inflight_key
+        while True:
+            if self.cache.add(slot, job_id, JOB_TTL):
+                return slot, None
+            holder = self.cache.get(slot)
+            if holder is None:
+                # Expired between the two calls
+                continue
+            if self._is_in_flight(holder):
+                return slot, holder
+            slot = f"ai_job_next:{holder}"
+
+    def get_status(self, job_id: str, user_id: str) -> Optional[Dict]:
+        """Get the progress or result of a job owned by the user."""
+        job = self.cache.get(self._job_key(job_id))
+        if not job or not self.cache.is_member(self._owners_key(job_id), user_id):
+            return None
+
+        task = self._async_result(job_id)
+        status = {
+            'job_id': job_id,
+            'operation': job['operation'],
+            'state': task.state
+        }
+
+        if task.state == 'PENDING':
+            status.update({'stage': 'queued', 'progress': 0.0})
+        elif task.state in ('STARTED', 'PROGRESS'):
+            meta = task.info if isinstance(task.info, dict) else {}
+            status.update({
+                'stage': meta.get('stage', 'running'),
+                'progress': meta.get('progress', 0.0)
+            })
+        elif task.state == 'SUCCESS':
+            result_key = RESULT_KEYS.get(job['operation'])
+            status.update({
+                'stage': 'completed',
+                'progress': 1.0,
+                'result': {result_key: task.result} if result_key else task.result
+            })
+        elif task.state == 'RETRY':
+            status.update({'stage': 'retrying', 'progress': 0.0})
+        else:
+            status.update({'stage': 'failed', 'error': str(task.info)})
+
+        return status
+
+    def _job_key(self, job_id: str) -> str:
+        return f"ai_job:{job_id}"
+
+    def _owners_key(self, job_id: str) -> str:
+        return f"ai_job_owners:{job_id}"
+
+    def _async_result(self, job_id: str):
+        from tasks import celery
+        return celery.AsyncResult(job_id)
+
+    def _state(self, job_id: str) -> str:
+        return self._async_result(job_id).state
+
+    def _is_in_flight(self, job_id: str) -> bool:
+        return self._state(job_id) not in ('SUCCESS', 'FAILURE', 'REVOKED')
@@ -1,54 +1,94 @@
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import openai
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqText
-import torch
 import nltk
 from nltk.tokenize import sent_tokenize
 import os
+import re
+import time
+
+from services.ai_cache import AIResultCache, ai_cache
+from services.batching import batch_pipelines
+from services.inference_server import (
+    CODE_EXPLANATION,
+    SUMMARIZATION,
+    InferenceClient,
+    MODELS,
+    load_pipelines
+)
+
+OPENAI_MODEL = 'gpt-4'
+
+# Length bounds of each chunk's summary in a long note. They don't depend
+# on the number of chunks, so cached summaries survive notes growing.
+CHUNK_SUMMARY_MIN_LENGTH = 20
+CHUNK_SUMMARY_MAX_LENGTH = max(
+    int(os.getenv('AI_CHUNK_SUMMARY_MAX_LENGTH', 60)),
+    CHUNK_SUMMARY_MIN_LENGTH
+)
+
+# Models behind each AI operation, part of the result cache key
+OPERATION_MODELS = {
+    'summarize': MODELS[SUMMARIZATION],
+    'explain_code': f"{OPENAI_MODEL}+{MODELS[CODE_EXPLANATION]}",
+    'suggest_improvements': OPENAI_MODEL,
+    'study_questions': OPENAI_MODEL
+}
 
 class AIService:
     """Service for AI-powered features like note summarization and code explanation."""
     
-    def __init__(self):
+    def __init__(
+        self,
+        inference_client: Optional[InferenceClient] = None,
+        chunk_cache: Optional[AIResultCache] = None
+    ):
         # Initialize OpenAI
         self.openai_client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
         
         # Download required NLTK data
         nltk.download('punkt')
         
-        # Initialize local models
-        self.summarizer = pipeline(
-            "summarization",
-            model="facebook/bart-large-cnn",
-            device=0 if torch.cuda.is_available() else -1
-        )
+        # Per-chunk summaries survive edits to other parts of a note
+        self.chunk_cache = chunk_cache or ai_cache
         
-        # Initialize code explanation model
-        self.code_explainer = pipeline(
-            "text2text-generation",
-            model="Salesforce/codet5-base",
-            device=0 if torch.cuda.is_available() else -1
+        # Independent deadlines for the remote and local halves of a request
+        self.openai_timeout = float(os.getenv('AI_OPENAI_TIMEOUT', 30))
+        self.local_model_timeout = float(os.getenv('AI_LOCAL_MODEL_TIMEOUT', 20))
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('AI_EXECUTOR_WORKERS', 8)),
+            thread_name_prefix='ai-service'
         )
+        
+        # Use the shared inference server when one is configured so the
+        # models are loaded once per host rather than once per process
+        inference_address = os.getenv('AI_INFERENCE_ADDRESS')
+        if inference_client is None and inference_address:
+            inference_client = InferenceClient(inference_address)
+        
+        if inference_client is not None:
+            self.summarizer = inference_client.pipeline(SUMMARIZATION)
+            self.code_explainer = inference_client.pipeline(CODE_EXPLANATION)
+        else:
+            # Initialize local models
+            pipelines = batch_pipelines(load_pipelines())
+            self.summarizer = pipelines[SUMMARIZATION]
+            self.code_explainer = pipelines[CODE_EXPLANATION]
     
     def summarize_note(self, content: str, max_length: Optional[int] = 150) -> str:
-        """Generate a concise summary of the note content."""
+        """Generate a concise summary of the note content.
+        
+        Long notes are summarized chunk by chunk, each summary bounded by
+        ``CHUNK_SUMMARY_MAX_LENGTH`` rather than a share of ``max_length``.
+        The joined chunk summaries are then summarized once more so the
+        result still respects ``max_length``.
+        """
         try:
             # For long content, split into chunks and summarize each
             if len(content) > 1000:
-                sentences = sent_tokenize(content)
-                chunks = self._create_chunks(sentences)
-                summaries = []
-                
-                for chunk in chunks:
-                    summary = self.summarizer(
-                        chunk,
-                        max_length=max_length // len(chunks),
-                        min_length=20,
-                        do_sample=False
-                    )[0]['summary_text']
-                    summaries.append(summary)
-                
-                return ' '.join(summaries)
+                chunks = self._create_paragraph_chunks(content)
+                summaries = self._summarize_chunks(chunks)
+                return self._summarize_joined(' '.join(summaries), max_length)
             else:
                 return self.summarizer(
                     content,
@@ -61,34 +101,50 @@ class AIService:
             return f"Error generating summary: {str(e)}"
     
     def explain_code(self, code: str, language: str) -> Dict:
-        """Generate natural language explanation of code."""
+        """Generate natural language explanation of code.
+        
+        The OpenAI and local model explanations run concurrently with their
+        own timeouts. If only one of them succeeds, it is returned with
+        ``degraded`` set and the other side's error in ``errors``.
+        """
         try:
-            # Prepare prompt for code explanation
-            prompt = f"Explain this {language} code:\n{code}"
+            started_at = time.monotonic()
             
             # Use OpenAI for detailed explanation
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a coding expert explaining code to CS students."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=500
+            detailed_future = self._executor.submit(
+                self._detailed_explanation, code, language
             )
             
             # Get local model's simpler explanation
-            local_explanation = self.code_explainer(
-                f"explain: {code}",
-                max_length=150,
-                num_return_sequences=1
-            )[0]['generated_text']
+            simple_future = self._executor.submit(self._simple_explanation, code)
             
-            return {
-                'detailed_explanation': response.choices[0].message.content,
-                'simple_explanation': local_explanation,
+            explanations = {}
+            errors = {}
+            for key, future, timeout in (
+                ('detailed_explanation', detailed_future, self.openai_timeout),
+                ('simple_explanation', simple_future, self.local_model_timeout)
+            ):
+                try:
+                    remaining = max(0, started_at + timeout - time.monotonic())
+                    explanations[key] = future.result(timeout=remaining)
+                except FutureTimeoutError:
+                    future.cancel()
+                    errors[key] = f"Timed out after {timeout}s"
+                except Exception as e:
+                    errors[key] = str(e)
+            
+            if not explanations:
+                raise RuntimeError('; '.join(errors.values()))
+            
+            result = {
+                'detailed_explanation': explanations.get('detailed_explanation'),
+                'simple_explanation': explanations.get('simple_explanation'),
                 'language': language
             }
+            if errors:
+                result['degraded'] = True
+                result['errors'] = errors
+            return result
             
         except Exception as e:
             return {
@@ -96,6 +152,55 @@ class AIService:
                 'language': language
             }
     
+    def stream_explain_code(self, code: str, language: str) -> Iterator[Dict]:
+        """Stream the detailed explanation as tokens arrive.
+        
+        Yields ``{'token': ...}`` events followed by a final
+        ``{'result': ...}`` event with the same shape as ``explain_code``.
+        """
+        try:
+            started_at = time.monotonic()
+            
+            # The local explanation is produced while tokens are streamed
+            simple_future = self._executor.submit(self._simple_explanation, code)
+            
+            stream = self.openai_client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=self._explain_code_messages(code, language),
+                temperature=0.7,
+                max_tokens=500,
+                stream=True,
+                timeout=self.openai_timeout
+            )
+            
+            tokens = []
+            for token in self._stream_tokens(stream):
+                tokens.append(token)
+                yield {'token': token}
+            
+            result = {
+                'detailed_explanation': ''.join(tokens),
+                'simple_explanation': None,
+                'language': language
+            }
+            try:
+                remaining = max(0, started_at + self.local_model_timeout - time.monotonic())
+                result['simple_explanation'] = simple_future.result(timeout=remaining)
+            except FutureTimeoutError:
+                simple_future.cancel()
+                result['degraded'] = True
+                result['errors'] = {
+                    'simple_explanation': f"Timed out after {self.local_model_timeout}s"
+                }
+            except Exception as e:
+                result['degraded'] = True
+                result['errors'] = {'simple_explanation': str(e)}
+            
+            yield {'result': result}
+            
+        except Exception as e:
+            yield {'error': f"Error explaining code: {str(e)}"}
+    
     def suggest_improvements(self, code: str, language: str) -> Dict:
         """Suggest improvements for the code."""
         try:
@@ -109,7 +214,7 @@ class AIService:
             4. Readability and maintainability"""
             
             response = self.openai_client.chat.completions.create(
-                model="gpt-4",
+                model=OPENAI_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a senior developer reviewing code."},
                     {"role": "user", "content": prompt}
@@ -132,42 +237,184 @@ class AIService:
     def generate_study_questions(self, content: str) -> List[Dict]:
         """Generate study questions based on note content."""
         try:
-            prompt = f"""Generate 5 study questions based on this content:
+            response = self.openai_client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=self._study_questions_messages(content),
+                temperature=0.8,
+                max_tokens=1000
+            )
+            
+            return self._parse_study_questions(response.choices[0].message.content)
+            
+        except Exception as e:
+            return [{'error': f"Error generating questions: {str(e)}"}]
+    
+    def stream_study_questions(self, content: str) -> Iterator[Dict]:
+        """Stream generated study questions as tokens arrive.
+        
+        Yields ``{'token': ...}`` events followed by a final
+        ``{'result': ...}`` event with the parsed questions.
+        """
+        try:
+            stream = self.openai_client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=self._study_questions_messages(content),
+                temperature=0.8,
+                max_tokens=1000,
+                stream=True
+            )
+            
+            tokens = []
+            for token in self._stream_tokens(stream):
+                tokens.append(token)
+                yield {'token': token}
+            
+            yield {'result': self._parse_study_questions(''.join(tokens))}
+            
+        except Exception as e:
+            yield {'error': f"Error generating questions: {str(e)}"}
+    
+    def _explain_code_messages(self, code: str, language: str) -> List[Dict]:
+        """Build the chat messages for a code explanation."""
+        prompt = f"Explain this {language} code:\n{code}"
+        return [
+            {"role": "system", "content": "You are a coding expert explaining code to CS students."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _detailed_explanation(self, code: str, language: str) -> str:
+        """Get OpenAI's detailed explanation of code."""
+        response = self.openai_client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=self._explain_code_messages(code, language),
+            temperature=0.7,
+            max_tokens=500,
+            timeout=self.openai_timeout
+        )
+        return response.choices[0].message.content
+    
+    def _simple_explanation(self, code: str) -> str:
+        """Get the local model's simpler explanation of code."""
+        return self.code_explainer(
+            f"explain: {code}",
+            max_length=150,
+            num_return_sequences=1
+        )[0]['generated_text']
+    
+    def _study_questions_messages(self, content: str) -> List[Dict]:
+        """Build the chat messages for study question generation."""
+        prompt = f"""Generate 5 study questions based on this content:
             {content}
             
             Format each question with:
             1. The question
             2. The correct answer
             3. An explanation of why it's correct"""
-            
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a CS professor creating study materials."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.8,
-                max_tokens=1000
+        return [
+            {"role": "system", "content": "You are a CS professor creating study materials."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _parse_study_questions(self, text: str) -> List[Dict]:
+        """Parse the model's response into structured questions."""
+        raw_questions = text.split('\n\n')
+        questions = []
+        
+        for q in raw_questions:
+            if q.strip():
+                parts = q.split('\n')
+                if len(parts) >= 3:
+                    questions.append({
+                        'question': parts[0].replace('Q: ', '').strip(),
+                        'answer': parts[1].replace('A: ', '').strip(),
+                        'explanation': parts[2].replace('Explanation: ', '').strip()
+                    })
+        
+        return questions
+    
+    def _stream_tokens(self, stream) -> Iterator[str]:
+        """Yield text deltas from a streaming chat completion."""
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    
+    def _summarize_chunks(self, chunks: List[str]) -> List[str]:
+        """Summarize chunks, reusing cached summaries of unchanged chunks."""
+        model = MODELS[SUMMARIZATION]
+        params = {'max_length': CHUNK_SUMMARY_MAX_LENGTH, 'min_length': CHUNK_SUMMARY_MIN_LENGTH}
+        
+        summaries = [
+            self.chunk_cache.lookup('summarize_chunk', model, params, chunk)
+            for chunk in chunks
+        ]
+        missing = [idx for idx, summary in enumerate(summaries) if summary is None]
+        
+        if missing:
+            # Summarize all changed chunks in one call so they share a batch
+            results = self.summarizer(
+                [chunks[idx] for idx in missing],
+                do_sample=False,
+                **params
             )
+            for idx, result in zip(missing, results):
+                summaries[idx] = result['summary_text']
+                self.chunk_cache.store('summarize_chunk', model, params, chunks[idx], summaries[idx])
+        
+        return summaries
+    
+    def _summarize_joined(self, joined: str, max_length: Optional[int]) -> str:
+        """Summarize joined chunk summaries down to ``max_length``."""
+        model = MODELS[SUMMARIZATION]
+        params = {'max_length': max_length, 'min_length': CHUNK_SUMMARY_MIN_LENGTH}
+        
+        summary = self.chunk_cache.lookup('summarize_joined', model, params, joined)
+        if summary is None:
+            summary = self.summarizer(joined, do_sample=False, **params)[0]['summary_text']
+            self.chunk_cache.store('summarize_joined', model, params, joined, summary)
+        
+        return summary
+    
+    def _create_paragraph_chunks(self, content: str, max_chunk_size: int = 1000) -> List[str]:
+        """Create chunks of text aligned to paragraph boundaries.
+        
+        A chunk is closed once it holds at least half of ``max_chunk_size``,
+        so editing one paragraph rarely moves the boundaries of the chunks
+        after it and their cached summaries stay valid.
+        """
+        chunks = []
+        current_chunk = []
+        current_size = 0
+        
+        for paragraph in re.split(r'\n\s*\n', content):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
             
-            # Parse the response into structured format
-            raw_questions = response.choices[0].message.content.split('\n\n')
-            questions = []
-            
-            for q in raw_questions:
-                if q.strip():
-                    parts = q.split('\n')
-                    if len(parts) >= 3:
-                        questions.append({
-                            'question': parts[0].replace('Q: ', '').strip(),
-                            'answer': parts[1].replace('A: ', '').strip(),
-                            'explanation': parts[2].replace('Explanation: ', '').strip()
-                        })
+            paragraph_size = len(paragraph)
+            if current_chunk and current_size + paragraph_size > max_chunk_size:
+                chunks.append('\n\n'.join(current_chunk))
+                current_chunk = []
+                current_size = 0
             
-            return questions
+            if paragraph_size > max_chunk_size:
+                # Long paragraphs are split on sentences
+                chunks.extend(self._create_chunks(sent_tokenize(paragraph), max_chunk_size))
+                continue
             
-        except Exception as e:
-            return [{'error': f"Error generating questions: {str(e)}"}]
+            current_chunk.append(paragraph)
+            current_size += paragraph_size
+            if current_size >= max_chunk_size // 2:
+                chunks.append('\n\n'.join(current_chunk))
+                current_chunk = []
+                current_size = 0
+        
+        if current_chunk:
+            chunks.append('\n\n'.join(current_chunk))
+        
+        return chunks
     
     def _create_chunks(self, sentences: List[str], max_chunk_size: int = 1000) -> List[str]:
         """Create chunks of text from sentences."""
@@ -177,7 +424,7 @@ class AIService:
         
         for sentence in sentences:
             sentence_size = len(sentence)
-            if current_size + sentence_size > max_chunk_size:
+            if current_chunk and current_size + sentence_size > max_chunk_size:
                 chunks.append(' '.join(current_chunk))
                 current_chunk = [sentence]
                 current_size = sentence_size
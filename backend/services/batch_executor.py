@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Fence labels commonly used in notes for the supported languages
+LANGUAGE_ALIASES = {
+    'py': 'python',
+    'python3': 'python',
+    'js': 'javascript',
+    'node': 'javascript',
+    'c++': 'cpp',
+    'rb': 'ruby'
+}
+
+
+class BatchExecutor:
+    """Runs every code block of a note in parallel.
+
+    Blocks are scheduled on a bounded worker pool shared by all users,
+    and each user can have at most ``per_user_limit`` blocks running at
+    once so one large note cannot occupy every worker. Results are
+    yielded in completion order.
+    """
+
+    def __init__(
+        self,
+        code_executor,
+        max_workers: Optional[int] = None,
+        per_user_limit: Optional[int] = None,
+        max_blocks: Optional[int] = None
+    ):
+        self.code_executor = code_executor
+        self.max_workers = max_workers or int(os.getenv('CODE_BATCH_WORKERS', 4))
+        self.per_user_limit = per_user_limit or int(os.getenv('CODE_BATCH_USER_CONCURRENCY', 2))
+        self.max_blocks = max_blocks or int(os.getenv('CODE_BATCH_MAX_BLOCKS', 20))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='code-batch')
+        # Blocks running per user; users with none running have no entry
+        self._running = {}
+        self._slot_freed = threading.Condition()
+
+    def normalize_language(self, language: str) -> str:
+        """Map a code fence label to an executor language."""
+        language = (language or '').lower()
+        return LANGUAGE_ALIASES.get(language, language)
+
+    def run(
+        self,
+        user_id: str,
+        blocks: List[Dict],
+        timeout: int = 30,
+        use_cache: bool = True
+    ) -> Iterator[Dict]:
+        """Execute code blocks, yielding each result as soon as it is ready.
+
+        Every result carries the ``index`` of its block. Closing the
+        iterator early stops scheduling the remaining blocks.
+        """
+        if len(blocks) > self.max_blocks:
+            raise ValueError(f"A batch can run at most {self.max_blocks} code blocks")
+
+        results = queue.Queue()
+        cancelled = threading.Event()
+
+        def schedule():
+            for index, block in enumerate(blocks):
+                language = self.normalize_language(block.get('language'))
+                if language not in self.code_executor.SUPPORTED_LANGUAGES:
+                    results.put(self._result(index, language, {
+                        'success': False,
+                        'output': None,
+                        'error': f"Unsupported language: {block.get('language')}"
+                    }))
+                    continue
+
+                self._acquire_slot(user_id)
+                if cancelled.is_set():
+                    self._release_slot(user_id)
+                    return
+                try:
+                    self._executor.submit(
+                        self._run_block, index, language, block['code'], timeout, use_cache, user_id, results
+                    )
+                except RuntimeError as e:
+                    self._release_slot(user_id)
+                    results.put(self._result(index, language, {
+                        'success': False,
+                        'output': None,
+                        'error': f"Execution error: {str(e)}"
+                    }))
+
+        threading.Thread(target=schedule, name='code-batch-scheduler', daemon=True).start()
+
+        try:
+            for _ in blocks:
+                yield results.get()
+        finally:
+            cancelled.set()
+
+    def shutdown(self):
+        """Stop the worker pool."""
+        self._executor.shutdown(wait=False)
+
+    def _acquire_slot(self, user_id: str):
+        """Wait until the user has fewer than per_user_limit blocks running."""
+        with self._slot_freed:
+            self._slot_freed.wait_for(lambda: self._running.get(user_id, 0) < self.per_user_limit)
+            self._running[user_id] = self._running.get(user_id, 0) + 1
+
+    def _release_slot(self, user_id: str):
+        with self._slot_freed:
+            self._running[user_id] -= 1
+            if not self._running[user_id]:
+                del self._running[user_id]
+            self._slot_freed.notify_all()
+
+    def _run_block(
+        self,
+        index: int,
+        language: str,
+        code: str,
+        timeout: int,
+        use_cache: bool,
+        user_id: str,
+        results: queue.Queue
+    ):
+        try:
+            result = self.code_executor.execute_code(
+                code=code,
+                language=language,
+                timeout=timeout,
+                use_cache=use_cache
+            )
+        except Exception as e:
+            logger.exception(f"Batch execution of block {index} failed")
+            result = {
+                'success': False,
+                'output': None,
+                'error': f"Execution error: {str(e)}"
+            }
+        finally:
+            self._release_slot(user_id)
+        results.put(self._result(index, language, result))
+
+    def _result(self, index: int, language: str, result: Dict) -> Dict:
+        return {'index': index, 'language': language, **result}
@@ -0,0 +1,161 @@
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import os
+import queue
+import threading
+import time
+
+from monitoring import ai_batch_queue_wait_seconds, ai_batch_size
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingInput:
+    """An input waiting to be included in a batch."""
+
+    __slots__ = ('input', 'kwargs', 'key', 'future', 'enqueued_at')
+
+    def __init__(self, input: Any, kwargs: Dict):
+        self.input = input
+        self.kwargs = kwargs
+        # Only inputs with identical generation parameters share a forward pass
+        self.key = repr(sorted(kwargs.items()))
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """Collects concurrent pipeline inputs and runs them as one batch.
+
+    Inputs are gathered until ``max_batch_size`` is reached or the oldest
+    pending input has waited ``max_wait_ms``, then passed to the pipeline
+    in a single call and the results are fanned back out to the callers.
+    """
+
+    def __init__(
+        self,
+        pipeline: Callable,
+        name: str,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None
+    ):
+        self.pipeline = pipeline
+        self.name = name
+        self.max_batch_size = max_batch_size or int(os.getenv('AI_BATCH_MAX_SIZE', 8))
+        self.max_wait = (
+            max_wait_ms if max_wait_ms is not None
+            else float(os.getenv('AI_BATCH_MAX_WAIT_MS', 10))
+        ) / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def submit(self, input: Any, **kwargs) -> Future:
+        """Queue an input and get a future for its result."""
+        self._ensure_worker()
+        pending = _PendingInput(input, kwargs)
+        self._queue.put(pending)
+        return pending.future
+
+    def _ensure_worker(self):
+        # Started on first use so forked workers get their own thread
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run_forever,
+                    name=f'batcher-{self.name}',
+                    daemon=True
+                )
+                self._worker.start()
+
+    def _run_forever(self):
+        while True:
+            batch = self._collect_batch()
+
+            groups: Dict[str, List[_PendingInput]] = {}
+            for pending in batch:
+                groups.setdefault(pending.key, []).append(pending)
+
+            for items in groups.values():
+                self._run_batch(items)
+
+    def _collect_batch(self) -> List[_PendingInput]:
+        """Block for the first input, then gather more until size or time limit."""
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run_batch(self, items: List[_PendingInput]):
+        started_at = time.monotonic()
+        for pending in items:
+            ai_batch_queue_wait_seconds.labels(self.name).observe(started_at - pending.enqueued_at)
+        ai_batch_size.labels(self.name).observe(len(items))
+
+        try:
+            outputs = list(self.pipeline(
+                [pending.input for pending in items],
+                batch_size=len(items),
+                **items[0].kwargs
+            ))
+        except Exception as e:
+            logger.exception(f"Batched {self.name} run failed")
+            for pending in items:
+                pending.future.set_exception(e)
+            return
+
+        if len(outputs) != len(items):
+            # Results can't be matched to callers, so none of them get one
+            e = RuntimeError(
+                f"Batched {self.name} run returned {len(outputs)} outputs for {len(items)} inputs"
+            )
+            logger.error(str(e))
+            for pending in items:
+                pending.future.set_exception(e)
+            return
+
+        for pending, output in zip(items, outputs):
+            pending.future.set_result(output)
+
+
+class BatchedPipeline:
+    """Pipeline-compatible callable that routes inputs through a MicroBatcher.
+
+    Waiting for a result raises ``concurrent.futures.TimeoutError`` after
+    ``timeout`` seconds, so a stuck model can't hang its callers.
+    """
+
+    def __init__(self, batcher: MicroBatcher, timeout: Optional[float] = None):
+        self.batcher = batcher
+        self.timeout = timeout or float(os.getenv('AI_BATCH_TIMEOUT', 300))
+
+    def __call__(self, inputs: Any, **kwargs) -> List:
+        if isinstance(inputs, list):
+            futures = [self.batcher.submit(item, **kwargs) for item in inputs]
+            deadline = time.monotonic() + self.timeout
+            return [future.result(max(deadline - time.monotonic(), 0)) for future in futures]
+
+        output = self.batcher.submit(inputs, **kwargs).result(self.timeout)
+        # A single input returns a list of generations, like the pipeline does
+        return output if isinstance(output, list) else [output]
+
+
+def batch_pipelines(pipelines: Dict[str, Callable]) -> Dict[str, BatchedPipeline]:
+    """Wrap each pipeline with its own micro-batcher."""
+    return {
+        task: BatchedPipeline(MicroBatcher(pipeline, name=task))
+        for task, pipeline in pipelines.items()
+    }
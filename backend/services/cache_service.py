@@ -37,6 +37,29 @@ class CacheService:
         except Exception:
             return False
 
+    def add(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        """Set a value only if the key does not exist yet, atomically."""
+        timeout = timeout or self.default_timeout
+        return bool(self.redis.set(
+            self._make_key(key),
+            json.dumps(value),
+            ex=timeout,
+            nx=True
+        ))
+
+    def add_to_set(self, key: str, member: str, timeout: Optional[int] = None) -> bool:
+        """Add a member to a set, atomically, and refresh its timeout."""
+        timeout = timeout or self.default_timeout
+        pipe = self.redis.pipeline()
+        pipe.sadd(self._make_key(key), member)
+        pipe.expire(self._make_key(key), timeout)
+        added, _ = pipe.execute()
+        return bool(added)
+
+    def is_member(self, key: str, member: str) -> bool:
+        """Check whether a set holds a member."""
+        return bool(self.redis.sismember(self._make_key(key), member))
+
     def delete(self, key: str) -> bool:
         """Delete a value from cache."""
         return bool(self.redis.delete(self._make_key(key)))
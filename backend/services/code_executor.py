@@ -2,9 +2,17 @@ import docker
 import tempfile
 import os
 import json
-from typing import Dict, Optional
+import re
+from typing import Dict, Optional, Tuple
 import subprocess
 import shutil
+import time
+
+from monitoring import code_artifact_requests
+from services.artifact_cache import ArtifactCache
+from services.container_pool import ContainerPool
+from services.execution_cache import ExecutionResultCache
+from services.syntax_validators import NodeSyntaxValidator, TreeSitterValidator, ValidatorUnavailable
 
 class CodeExecutor:
     """Service for safely executing code snippets in isolated environments."""
@@ -18,109 +26,226 @@ class CodeExecutor:
         'ruby': 'ruby:3.0-slim'
     }
     
+    # How each language is compiled and run; code is mounted read-only at
+    # /code and build output goes to the container's /sandbox tmpfs
+    LANGUAGE_CONFIGS = {
+        'python': {'file': 'code.py', 'run': 'python /code/{file}'},
+        'javascript': {'file': 'code.js', 'run': 'node /code/{file}'},
+        'java': {
+            'file': '{class_name}.java',
+            'compile': 'javac -d /sandbox/build /code/{file}',
+            'run': 'java -cp /sandbox/build {class_name}'
+        },
+        'cpp': {
+            'file': 'code.cpp',
+            'compile': 'g++ -O2 -o /sandbox/build/program /code/{file}',
+            'run': '/sandbox/build/program'
+        },
+        'ruby': {'file': 'code.rb', 'run': 'ruby /code/{file}'}
+    }
+    
     def __init__(self):
         self.client = docker.from_env()
+        self.image_ids = {}
         self._ensure_images()
+        
+        # Compiled java/cpp output, reused while the source is unchanged
+        self.artifact_cache = ArtifactCache()
+        
+        # Output of previously run snippets (opt-in)
+        self.result_cache = ExecutionResultCache()
+        
+        # Long-lived parsers so validation does not fork per snippet
+        self.node_validator = NodeSyntaxValidator()
+        self.tree_sitter_validator = TreeSitterValidator()
+        
+        # Pre-started containers so executions skip container startup
+        self.pool = ContainerPool(self.client, self.SUPPORTED_LANGUAGES)
+        self.pool.start()
     
     def _ensure_images(self):
         """Ensure required Docker images are available."""
-        for image in self.SUPPORTED_LANGUAGES.values():
+        for language, image in self.SUPPORTED_LANGUAGES.items():
             try:
-                self.client.images.pull(image)
+                self.image_ids[language] = self.client.images.pull(image).id
             except docker.errors.ImageNotFound:
                 raise RuntimeError(f"Failed to pull Docker image: {image}")
     
-    def execute_code(self, code: str, language: str, timeout: int = 30) -> Dict:
-        """Execute code in a sandboxed environment."""
+    def execute_code(
+        self,
+        code: str,
+        language: str,
+        timeout: int = 30,
+        stdin: Optional[str] = None,
+        use_cache: bool = True
+    ) -> Dict:
+        """Execute code in a sandboxed environment.
+        
+        When the result cache is enabled, a snippet that already ran with
+        the same image and stdin is answered from the cache unless
+        ``use_cache`` is False.
+        """
         if language not in self.SUPPORTED_LANGUAGES:
             raise ValueError(f"Unsupported language: {language}")
         
-        # Create temporary directory for code execution
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Prepare code file
-            file_info = self._prepare_code_file(code, language, temp_dir)
-            
-            # Run code in container
-            return self._run_in_container(
-                code_file=file_info['file'],
-                language=language,
-                command=file_info['command'],
-                work_dir=temp_dir,
-                timeout=timeout
-            )
+        image_id = self.image_ids.get(language, self.SUPPORTED_LANGUAGES[language])
+        if use_cache:
+            cached_result = self.result_cache.get(language, image_id, code, stdin)
+            if cached_result is not None:
+                return {**cached_result, 'cached': True}
+        
+        result = self._execute(code, language, timeout, stdin)
+        self.result_cache.set(language, image_id, code, result, stdin)
+        return result
+    
+    def _execute(self, code: str, language: str, timeout: int, stdin: Optional[str]) -> Dict:
+        """Run code in a warm container, or a freshly started one."""
+        pooled = self.pool.acquire(language)
+        if pooled is None:
+            try:
+                pooled = self.pool.create(language)
+            except Exception as e:
+                return {
+                    'success': False,
+                    'output': None,
+                    'error': f"Execution error: {str(e)}"
+                }
+        
+        reusable = False
+        try:
+            result, reusable = self._run_in_container(pooled, code, language, timeout, stdin)
+            return result
+        finally:
+            self.pool.release(language, pooled, reusable=reusable)
     
     def _prepare_code_file(self, code: str, language: str, work_dir: str) -> Dict:
         """Prepare code file for execution."""
-        file_configs = {
-            'python': {'ext': '.py', 'command': ['python']},
-            'javascript': {'ext': '.js', 'command': ['node']},
-            'java': {'ext': '.java', 'command': ['javac', 'java']},
-            'cpp': {'ext': '.cpp', 'command': ['g++', './']},
-            'ruby': {'ext': '.rb', 'command': ['ruby']}
-        }
-        
-        config = file_configs[language]
-        filename = f'code{config["ext"]}'
+        config = self.LANGUAGE_CONFIGS[language]
+        params = {'class_name': self._java_class_name(code)} if language == 'java' else {}
+        filename = config['file'].format(**params)
         filepath = os.path.join(work_dir, filename)
         
         # Write code to file
         with open(filepath, 'w') as f:
             f.write(code)
         
+        params['file'] = filename
         return {
             'file': filename,
-            'command': config['command']
+            'compile': config['compile'].format(**params) if 'compile' in config else None,
+            'command': config['run'].format(**params)
         }
     
+    def _java_class_name(self, code: str) -> str:
+        """Find the class javac expects the source file to be named after."""
+        match = (
+            re.search(r'public\s+(?:final\s+|abstract\s+)*class\s+(\w+)', code)
+            or re.search(r'class\s+(\w+)', code)
+        )
+        return match.group(1) if match else 'Main'
+    
     def _run_in_container(
         self,
-        code_file: str,
+        pooled,
+        code: str,
         language: str,
-        command: list,
-        work_dir: str,
-        timeout: int
-    ) -> Dict:
-        """Run code in Docker container."""
+        timeout: int,
+        stdin: Optional[str] = None
+    ) -> Tuple[Dict, bool]:
+        """Run code in a container.
+        
+        Returns the result and whether the container is clean enough to be
+        reused by the pool.
+        """
         try:
-            container = self.client.containers.run(
-                image=self.SUPPORTED_LANGUAGES[language],
-                command=command + [code_file],
-                volumes={
-                    work_dir: {
-                        'bind': '/code',
-                        'mode': 'ro'
-                    }
-                },
-                working_dir='/code',
-                detach=True,
-                mem_limit='100m',
-                nano_cpus=1000000000,  # 1 CPU
-                network_mode='none'  # Disable network access
+            file_info = self._prepare_code_file(code, language, pooled.work_dir)
+            started_at = time.monotonic()
+            
+            if file_info['compile']:
+                compile_error = self._load_or_compile(pooled, code, language, file_info, timeout)
+                if compile_error:
+                    return compile_error, False
+            
+            command = file_info['command']
+            if stdin is not None:
+                with open(os.path.join(pooled.work_dir, 'stdin.txt'), 'w') as f:
+                    f.write(stdin)
+                command += ' < /code/stdin.txt'
+            
+            remaining = max(1, int(timeout - (time.monotonic() - started_at)))
+            exit_code, output = self._exec(
+                pooled,
+                f"exec timeout -s KILL {remaining} {command}"
             )
             
-            try:
-                container.wait(timeout=timeout)
-                logs = container.logs()
-                return {
-                    'success': True,
-                    'output': logs.decode('utf-8'),
-                    'error': None
-                }
-            except Exception as e:
+            if exit_code in (124, 137) and time.monotonic() - started_at >= timeout:
                 return {
                     'success': False,
                     'output': None,
-                    'error': str(e)
-                }
-            finally:
-                container.remove(force=True)
-                
+                    'error': f"Execution timed out after {timeout}s"
+                }, False
+            
+            # Only containers whose snippet exited cleanly are reused
+            return {
+                'success': True,
+                'output': output.decode('utf-8', errors='replace'),
+                'error': None
+            }, exit_code == 0
+            
         except Exception as e:
             return {
                 'success': False,
                 'output': None,
                 'error': f"Execution error: {str(e)}"
+            }, False
+    
+    def _load_or_compile(self, pooled, code: str, language: str, file_info: Dict, timeout: int) -> Optional[Dict]:
+        """Put compiled output in /sandbox/build, compiling only on a cache miss.
+        
+        Returns an error result if compilation fails.
+        """
+        key = self.artifact_cache.make_key(
+            language,
+            self.image_ids.get(language, self.SUPPORTED_LANGUAGES[language]),
+            file_info['compile'],
+            code
+        )
+        
+        artifact = self.artifact_cache.get(key)
+        if artifact is not None:
+            with open(os.path.join(pooled.work_dir, 'artifact.tar'), 'wb') as f:
+                f.write(artifact)
+            exit_code, _ = self._exec(
+                pooled,
+                'mkdir -p /sandbox/build && tar -xf /code/artifact.tar -C /sandbox/build'
+            )
+            if exit_code == 0:
+                code_artifact_requests.labels(language, 'hit').inc()
+                return None
+        
+        code_artifact_requests.labels(language, 'miss').inc()
+        exit_code, output = self._exec(
+            pooled,
+            f"mkdir -p /sandbox/build && timeout -s KILL {int(timeout)} {file_info['compile']}"
+        )
+        if exit_code != 0:
+            return {
+                'success': False,
+                'output': output.decode('utf-8', errors='replace'),
+                'error': 'Compilation failed'
             }
+        
+        exit_code, (archive, _) = pooled.container.exec_run(
+            ['tar', '-cf', '-', '-C', '/sandbox/build', '.'],
+            demux=True
+        )
+        if exit_code == 0 and archive:
+            self.artifact_cache.put(key, archive)
+        return None
+    
+    def _exec(self, pooled, script: str) -> Tuple[int, bytes]:
+        """Run a shell command in the container's sandbox."""
+        return pooled.container.exec_run(['sh', '-c', script], workdir='/sandbox')
     
     def validate_code(self, code: str, language: str) -> Dict:
         """Validate code syntax without execution."""
@@ -131,6 +256,8 @@ class CodeExecutor:
         }
         
         validator = validators.get(language)
+        if not validator and self.tree_sitter_validator.supports(language):
+            return self.tree_sitter_validator.validate(code, language)
         if not validator:
             return {'valid': True, 'errors': None}  # Skip validation for unsupported languages
             
@@ -153,6 +280,13 @@ class CodeExecutor:
     
     def _validate_javascript(self, code: str) -> Dict:
         """Validate JavaScript code syntax using Node.js."""
+        try:
+            return self.node_validator.validate(code)
+        except ValidatorUnavailable:
+            return self._check_javascript_file(code)
+    
+    def _check_javascript_file(self, code: str) -> Dict:
+        """Validate JavaScript code syntax with a one-off ``node --check``."""
         with tempfile.NamedTemporaryFile(suffix='.js') as temp:
             temp.write(code.encode())
             temp.flush()
@@ -0,0 +1,192 @@
+from typing import Dict, Optional
+import atexit
+import logging
+import os
+import queue
+import shutil
+import socket
+import tempfile
+import threading
+
+from monitoring import code_pool_requests, code_pool_size
+
+logger = logging.getLogger(__name__)
+
+
+class PooledContainer:
+    """A warm container, its input directory and the number of snippets it has run.
+
+    ``work_dir`` is a host directory mounted read-only at ``/code``; the
+    container can only write to its ``/sandbox`` and ``/tmp`` tmpfs mounts.
+    """
+
+    def __init__(self, container, work_dir: str):
+        self.container = container
+        self.work_dir = work_dir
+        self.runs = 0
+
+
+class ContainerPool:
+    """Pool of pre-started, locked-down containers per language.
+
+    Containers idle on ``tail -f /dev/null`` until a snippet is executed
+    in them with ``exec``. After ``max_runs`` executions (one by default)
+    a container is discarded, and the pool is refilled by a background
+    thread so callers never wait for container startup.
+    """
+
+    def __init__(
+        self,
+        client,
+        images: Dict[str, str],
+        size: Optional[int] = None,
+        max_runs: Optional[int] = None
+    ):
+        self.client = client
+        self.images = images
+        self.size = size if size is not None else int(os.getenv('CODE_POOL_SIZE', 2))
+        self.max_runs = max_runs or int(os.getenv('CODE_POOL_MAX_RUNS', 1))
+        self.owner = f"{socket.gethostname()}-{os.getpid()}"
+        self._idle = {language: queue.Queue() for language in images}
+        self._refill = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def start(self):
+        """Start filling the pool in the background."""
+        if not self.enabled or self._thread:
+            return
+        self._thread = threading.Thread(target=self._replenish_forever, name='container-pool', daemon=True)
+        self._thread.start()
+        self._refill.set()
+        atexit.register(self.shutdown)
+
+    def create(self, language: str) -> PooledContainer:
+        """Start a container outside the pool, for when the pool is empty."""
+        return self._start_container(language)
+
+    def acquire(self, language: str) -> Optional[PooledContainer]:
+        """Take a warm container, or None if the pool for the language is empty."""
+        if not self.enabled:
+            return None
+
+        try:
+            pooled = self._idle[language].get_nowait()
+        except queue.Empty:
+            code_pool_requests.labels(language, 'miss').inc()
+            self._refill.set()
+            return None
+
+        code_pool_requests.labels(language, 'hit').inc()
+        code_pool_size.labels(language).set(self._idle[language].qsize())
+        self._refill.set()
+        return pooled
+
+    def release(self, language: str, pooled: PooledContainer, reusable: bool = True):
+        """Return a container after a run, discarding it once it is used up."""
+        pooled.runs += 1
+        if (
+            self._closed
+            or not reusable
+            or pooled.runs >= self.max_runs
+            or self._idle[language].qsize() >= self.size
+        ):
+            self._discard(pooled)
+            return
+
+        try:
+            # Clear anything the previous snippet left behind
+            exit_code, _ = pooled.container.exec_run(['sh', '-c', 'rm -rf /sandbox/* /tmp/*'])
+            if exit_code != 0:
+                raise RuntimeError('cleanup failed')
+            for entry in os.listdir(pooled.work_dir):
+                path = os.path.join(pooled.work_dir, entry)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+        except Exception:
+            self._discard(pooled)
+            return
+
+        self._idle[language].put(pooled)
+        code_pool_size.labels(language).set(self._idle[language].qsize())
+
+    def shutdown(self):
+        """Remove every idle container owned by this process."""
+        self._closed = True
+        self._refill.set()
+        for language, idle in self._idle.items():
+            while True:
+                try:
+                    self._remove_container(idle.get_nowait())
+                except queue.Empty:
+                    break
+            code_pool_size.labels(language).set(0)
+
+    def _replenish_forever(self):
+        while not self._closed:
+            self._refill.wait()
+            self._refill.clear()
+            if self._closed:
+                break
+
+            for language in self.images:
+                while self._idle[language].qsize() < self.size and not self._closed:
+                    try:
+                        self._idle[language].put(self._start_container(language))
+                    except Exception:
+                        logger.exception(f"Failed to start pooled container for {language}")
+                        break
+                    code_pool_size.labels(language).set(self._idle[language].qsize())
+
+    def _start_container(self, language: str) -> PooledContainer:
+        work_dir = tempfile.mkdtemp(prefix='skriptd-code-')
+        try:
+            container = self.client.containers.run(
+                image=self.images[language],
+                command=['tail', '-f', '/dev/null'],
+                detach=True,
+                labels={'skriptd.pool.owner': self.owner},
+                volumes={
+                    work_dir: {
+                        'bind': '/code',
+                        'mode': 'ro'
+                    }
+                },
+                working_dir='/sandbox',
+                tmpfs={
+                    '/sandbox': 'rw,exec,size=64m',
+                    '/tmp': 'rw,exec,size=64m'
+                },
+                read_only=True,
+                mem_limit='100m',
+                nano_cpus=1000000000,  # 1 CPU
+                pids_limit=64,
+                cap_drop=['ALL'],
+                security_opt=['no-new-privileges'],
+                network_mode='none'  # Disable network access
+            )
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        return PooledContainer(container, work_dir)
+
+    def _discard(self, pooled: PooledContainer):
+        # Removal is slow and not on the caller's critical path
+        threading.Thread(
+            target=self._remove_container,
+            args=(pooled,),
+            daemon=True
+        ).start()
+
+    def _remove_container(self, pooled: PooledContainer):
+        try:
+            pooled.container.remove(force=True)
+        except Exception:
+            logger.warning(f"Failed to remove pooled container {pooled.container.id}")
+        shutil.rmtree(pooled.work_dir, ignore_errors=True)
@@ -2,15 +2,48 @@ import mistune
 import bleach
 import latex2mathml
 import pygments
-from pygments.lexers import get_lexer_by_name, guess_lexer
-from pygments.formatters import HtmlFormatter
+import hashlib
+import json
 import re
+import secrets
 from typing import Dict, List, Optional, Tuple
 
+from services.language_detection import language_detector
+from services.render_cache import RenderCache
+
+# Formatter settings for highlighted code; part of the render cache key
+HIGHLIGHT_STYLE = 'monokai'
+HIGHLIGHT_LINENOS = True
+
+CODE_BLOCK_PATTERN = r'(?P<fence>```|~~~)(?P<language>\w+)?\n(?P<code>.*?)(?P=fence)'
+# Inline math stays on one line, so a stray dollar sign in prose cannot
+# pair with one further down the note
+LATEX_PATTERN = r'\$\$(?P<display>.*?)\$\$|\$(?P<inline>[^$\n]+?)\$'
+
+# Fences are found first and math only between them, so dollar signs
+# inside code are never treated as LaTeX
+FENCE_REGEX = re.compile(CODE_BLOCK_PATTERN, re.DOTALL)
+LATEX_REGEX = re.compile(LATEX_PATTERN, re.DOTALL)
+
+# Link reference and footnote definitions apply to the whole document, so
+# content using them cannot be rendered one top-level block at a time
+REFERENCE_DEFINITION_PATTERN = re.compile(r'^ {0,3}\[[^\]]+\]:', re.MULTILINE)
+LIST_ITEM_PATTERN = re.compile(r'^ {0,3}(?:[*+-]|\d+[.)])\s')
+FENCE_MARKER_PATTERN = re.compile(r'^\s*(`{3,}|~{3,})')
+
+# Bump when rendering changes so stored block HTML is not reused
+BLOCK_FORMAT_VERSION = 3
+
 class ContentProcessor:
     """Service for processing rich text content including markdown, code, and LaTeX."""
     
-    def __init__(self):
+    def __init__(self, render_cache: Optional[RenderCache] = None, render_pool=None):
+        # Rendered code and LaTeX blocks, reused while a block is unchanged
+        self.render_cache = render_cache or RenderCache()
+        
+        # Optional RenderPool for notes with many changed blocks
+        self.render_pool = render_pool
+        
         # Initialize Markdown renderer with syntax highlighting
         self.markdown = mistune.create_markdown(
             plugins=['strikethrough', 'footnotes', 'table'],
@@ -31,33 +64,152 @@ class ContentProcessor:
             'code': ['class', 'data-language']
         }
     
-    def process_content(self, content: str) -> Dict:
-        """Process mixed content containing markdown, code blocks, and LaTeX."""
-        # Extract and process components
-        code_blocks = self._extract_code_blocks(content)
-        latex_blocks = self._extract_latex(content)
+    def process_content(self, content: str, previous: Optional[Dict] = None) -> Dict:
+        """Process mixed content containing markdown, code blocks, and LaTeX.
         
-        # Replace blocks with placeholders
-        processed_content = content
-        for idx, block in enumerate(code_blocks):
-            processed_content = processed_content.replace(block['original'], f'CODE_BLOCK_{idx}')
-        for idx, block in enumerate(latex_blocks):
-            processed_content = processed_content.replace(block['original'], f'LATEX_BLOCK_{idx}')
+        Content is rendered one top-level block at a time. Given the
+        previous result for the same note, only blocks whose fingerprint
+        changed are rendered again.
+        """
+        if REFERENCE_DEFINITION_PATTERN.search(content):
+            return {**self._render(content), 'blocks': []}
         
-        # Convert markdown to HTML
-        html_content = self.markdown(processed_content)
+        previous = previous or {}
+        rendered = {block['hash']: block['html'] for block in previous.get('blocks', [])}
+        # Language detection of unchanged code blocks is reused too
+        known_code = {block['original']: block for block in previous.get('code_blocks', [])}
+        texts = self._split_blocks(content)
+        fingerprints = [self._fingerprint(text) for text in texts]
         
-        # Restore code and latex blocks
-        for idx, block in enumerate(code_blocks):
-            html_content = html_content.replace(
-                f'CODE_BLOCK_{idx}',
-                self._highlight_code(block['code'], block['language'])
-            )
-        for idx, block in enumerate(latex_blocks):
-            html_content = html_content.replace(
-                f'LATEX_BLOCK_{idx}',
-                self._render_latex(block['latex'])
+        changed = {}
+        for fingerprint, text in zip(fingerprints, texts):
+            if fingerprint not in rendered:
+                changed[fingerprint] = text
+        
+        # Large edits are rendered across worker processes
+        if self.render_pool is not None and self.render_pool.should_use(len(changed)):
+            results = self.render_pool.render_blocks(list(changed.values()))
+        else:
+            results = [self._render(text) for text in changed.values()]
+        found = {}
+        for fingerprint, result in zip(changed, results):
+            rendered[fingerprint] = result['html']
+            found[fingerprint] = (result['code_blocks'], result['latex_blocks'])
+        
+        code_blocks = []
+        latex_blocks = []
+        for fingerprint, text in zip(fingerprints, texts):
+            # Stored blocks hold only their HTML; code and math are found again
+            block_code, block_latex = found.get(fingerprint) or self._extract_blocks(text, known_code)
+            code_blocks.extend(block_code)
+            latex_blocks.extend(block_latex)
+        
+        return {
+            'html': '\n'.join(rendered[fingerprint] for fingerprint in fingerprints),
+            'code_blocks': code_blocks,
+            'latex_blocks': latex_blocks,
+            'blocks': [{'hash': fingerprint, 'html': rendered[fingerprint]} for fingerprint in fingerprints]
+        }
+    
+    def _split_blocks(self, content: str) -> List[str]:
+        """Split content into top-level blocks at blank lines.
+        
+        Blank lines inside code fences and display math do not split, and
+        indented or list continuations stay with the block they continue.
+        """
+        blocks = []
+        current = []
+        in_fence = False
+        in_math = False
+        
+        def flush():
+            if not current:
+                return
+            text = '\n'.join(current)
+            continues_previous = blocks and (
+                current[0][:1] in (' ', '\t')
+                or (LIST_ITEM_PATTERN.match(current[0]) and LIST_ITEM_PATTERN.match(blocks[-1]))
             )
+            if continues_previous:
+                blocks[-1] += '\n\n' + text
+            else:
+                blocks.append(text)
+            current.clear()
+        
+        for line in content.split('\n'):
+            if not line.strip() and not in_fence and not in_math:
+                flush()
+                continue
+            
+            current.append(line)
+            marker = FENCE_MARKER_PATTERN.match(line)
+            if marker and not in_fence:
+                in_fence = marker.group(1)
+            elif marker and marker.group(1).startswith(in_fence[0]) and len(marker.group(1)) >= len(in_fence):
+                # Only a fence of the same character, at least as long, closes it
+                in_fence = False
+            elif not in_fence and line.count('$$') % 2:
+                in_math = not in_math
+        flush()
+        
+        return blocks
+    
+    def _fingerprint(self, text: str) -> str:
+        """Hash a block together with the settings that affect its rendering."""
+        payload = json.dumps([
+            BLOCK_FORMAT_VERSION,
+            pygments.__version__,
+            HIGHLIGHT_STYLE,
+            HIGHLIGHT_LINENOS,
+            text
+        ])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _render(self, content: str) -> Dict:
+        """Render markdown with highlighted code and MathML, then sanitize it."""
+        # Swap fences, then the math between them, for placeholders.
+        # Placeholders carry a per-call nonce so they cannot clash with the
+        # note's text.
+        nonce = secrets.token_hex(4)
+        segments = []
+        embedded = []
+        code_blocks = []
+        latex_blocks = []
+        position = 0
+        
+        def embed(block):
+            segments.append(f'SKRIPTD{nonce}BLOCK{len(embedded)}END')
+            embedded.append(block)
+        
+        def embed_latex(text):
+            offset = 0
+            for match in LATEX_REGEX.finditer(text):
+                segments.append(text[offset:match.start()])
+                block = self._latex_block(match)
+                latex_blocks.append(block)
+                embed(block)
+                offset = match.end()
+            segments.append(text[offset:])
+        
+        for match in FENCE_REGEX.finditer(content):
+            embed_latex(content[position:match.start()])
+            block = self._code_block(match)
+            code_blocks.append(block)
+            embed(block)
+            position = match.end()
+        embed_latex(content[position:])
+        
+        # Convert markdown to HTML
+        html_content = self.markdown(''.join(segments))
+        
+        # Restore code and latex blocks in one pass
+        def render(match):
+            block = embedded[int(match.group(1))]
+            if 'latex' in block:
+                return self._render_latex(block['latex'])
+            return self._highlight_code(block['code'], block['language'])
+        
+        html_content = re.sub(f'SKRIPTD{nonce}BLOCK(\\d+)END', render, html_content)
         
         # Sanitize final HTML
         sanitized_html = bleach.clean(
@@ -73,65 +225,76 @@ class ContentProcessor:
             'latex_blocks': latex_blocks
         }
     
-    def _extract_code_blocks(self, content: str) -> List[Dict]:
-        """Extract code blocks and detect their languages."""
+    def _extract_blocks(self, content: str, known_code: Optional[Dict[str, Dict]] = None) -> Tuple[List[Dict], List[Dict]]:
+        """Find the code and LaTeX blocks of content without rendering it."""
+        known_code = known_code or {}
         code_blocks = []
-        pattern = r'```(\w+)?\n(.*?)```'
-        matches = re.finditer(pattern, content, re.DOTALL)
-        
-        for match in matches:
-            original = match.group(0)
-            lang = match.group(1) or ''
-            code = match.group(2).strip()
-            
-            if not lang:
-                try:
-                    lexer = guess_lexer(code)
-                    lang = lexer.name.lower()
-                except:
-                    lang = 'text'
-            
-            code_blocks.append({
-                'original': original,
-                'language': lang,
-                'code': code
-            })
-        
-        return code_blocks
+        latex_blocks = []
+        position = 0
+        for match in FENCE_REGEX.finditer(content):
+            latex_blocks.extend(self._extract_latex(content[position:match.start()]))
+            code_blocks.append(known_code.get(match.group(0)) or self._code_block(match))
+            position = match.end()
+        latex_blocks.extend(self._extract_latex(content[position:]))
+        return code_blocks, latex_blocks
+    
+    def extract_code_blocks(self, content: str) -> List[Dict]:
+        """Extract code blocks and detect their languages."""
+        return [
+            self._code_block(match)
+            for match in FENCE_REGEX.finditer(content)
+        ]
+    
+    def _code_block(self, match: re.Match) -> Dict:
+        """Build a code block from a fenced code match."""
+        code = match.group('code').strip()
+        return {
+            'original': match.group(0),
+            'language': language_detector.detect(code, hint=match.group('language')),
+            'code': code
+        }
     
     def _highlight_code(self, code: str, language: str) -> str:
-        """Apply syntax highlighting to code."""
-        try:
-            lexer = get_lexer_by_name(language, stripall=True)
-        except:
-            lexer = get_lexer_by_name('text', stripall=True)
-        
-        formatter = HtmlFormatter(
-            style='monokai',
-            linenos=True,
-            cssclass=f'highlight language-{language}'
+        """Apply syntax highlighting to code, reusing earlier renderings."""
+        return self.render_cache.get_or_render(
+            'code',
+            (pygments.__version__, HIGHLIGHT_STYLE, HIGHLIGHT_LINENOS, language, code),
+            lambda: self._render_code(code, language)
+        )
+    
+    def _render_code(self, code: str, language: str) -> str:
+        """Highlight code with pygments."""
+        return pygments.highlight(
+            code,
+            language_detector.lexer(language),
+            language_detector.formatter(language, HIGHLIGHT_STYLE, HIGHLIGHT_LINENOS)
         )
-        
-        return pygments.highlight(code, lexer, formatter)
     
     def _extract_latex(self, content: str) -> List[Dict]:
         """Extract LaTeX expressions."""
-        latex_blocks = []
-        pattern = r'\$\$(.*?)\$\$|\$(.*?)\$'
-        matches = re.finditer(pattern, content, re.DOTALL)
-        
-        for match in matches:
-            original = match.group(0)
-            latex = match.group(1) or match.group(2)
-            latex_blocks.append({
-                'original': original,
-                'latex': latex
-            })
-        
-        return latex_blocks
+        return [
+            self._latex_block(match)
+            for match in LATEX_REGEX.finditer(content)
+        ]
+    
+    def _latex_block(self, match: re.Match) -> Dict:
+        """Build a LaTeX block from a LaTeX match."""
+        latex = match.group('display')
+        return {
+            'original': match.group(0),
+            'latex': latex if latex is not None else match.group('inline')
+        }
     
     def _render_latex(self, latex: str) -> str:
-        """Convert LaTeX to MathML for web rendering."""
+        """Convert LaTeX to MathML for web rendering, reusing earlier renderings."""
+        return self.render_cache.get_or_render(
+            'latex',
+            (latex,),
+            lambda: self._convert_latex(latex)
+        )
+    
+    def _convert_latex(self, latex: str) -> str:
+        """Convert LaTeX to MathML."""
         try:
             return latex2mathml.converter.convert(latex)
         except:
@@ -0,0 +1,498 @@
+from array import array
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+import fcntl
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import threading
+import uuid
+
+from services.search_backends import SearchBackend
+
+# Searched fields and their boosts, as in the Elasticsearch query
+FIELD_BOOSTS = {
+    'title': 2.0,
+    'content': 1.0,
+    'code_blocks.code': 1.0,
+    'code_blocks.tokens': 1.0,
+    'latex_blocks.latex': 1.0
+}
+HIGHLIGHT_FIELDS = ('title', 'content', 'code_blocks.code', 'latex_blocks.latex')
+HIGHLIGHT_CONTEXT = 50
+
+# Link naming the live version directory
+CURRENT_LINK = 'current'
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word terms."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def field_text(doc: Dict, field: str) -> str:
+    """Get the text of a field; nested fields join every block's value."""
+    if '.' in field:
+        path, name = field.split('.', 1)
+        return '\n'.join(str(block.get(name) or '') for block in doc.get(path) or [])
+    return str(doc.get(field) or '')
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+class Segment:
+    """An immutable batch of indexed documents on disk.
+
+    ``<name>.json`` holds the stored documents, field lengths and the
+    term dictionary. ``<name>.postings`` holds the (document, term
+    frequency) pairs of every posting list and is read through a memory
+    map, so postings are paged in by the OS instead of loaded.
+    """
+
+    def __init__(self, path: str, name: str):
+        with open(os.path.join(path, f'{name}.json')) as f:
+            data = json.load(f)
+        self.name = name
+        self.ids = data['ids']
+        self.sources = data['sources']
+        self.lengths = data['lengths']
+        self.totals = data['totals']
+        self.terms = data['terms']
+        self.ordinals = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self.by_user = defaultdict(set)
+        for i, source in enumerate(self.sources):
+            self.by_user[source.get('user_id')].add(i)
+
+        self._file = open(os.path.join(path, f'{name}.postings'), 'rb')
+        self._map = None
+        self._postings = None
+        if os.fstat(self._file.fileno()).st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._postings = memoryview(self._map).cast('I')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def doc_freq(self, field: str, term: str) -> int:
+        entry = self.terms.get(field, {}).get(term)
+        return entry[1] if entry else 0
+
+    def postings(self, field: str, term: str) -> Iterable[Tuple[int, int]]:
+        """Iterate the (ordinal, frequency) pairs of a term."""
+        entry = self.terms.get(field, {}).get(term)
+        if not entry:
+            return ()
+        offset, count = entry
+        pairs = self._postings[offset * 2:(offset + count) * 2]
+        return zip(pairs[0::2], pairs[1::2])
+
+    def close(self):
+        if self._postings is not None:
+            self._postings.release()
+            self._map.close()
+        self._file.close()
+
+    @staticmethod
+    def write(path: str, name: str, documents: List[Tuple[str, Dict]]):
+        """Analyze documents and write them as a new segment."""
+        postings = defaultdict(lambda: defaultdict(list))
+        lengths = {field: [] for field in FIELD_BOOSTS}
+        for ordinal, (_, doc) in enumerate(documents):
+            for field in FIELD_BOOSTS:
+                tokens = tokenize(field_text(doc, field))
+                lengths[field].append(len(tokens))
+                for term, freq in Counter(tokens).items():
+                    postings[field][term].append((ordinal, freq))
+
+        data = array('I')
+        terms = {}
+        for field, field_terms in postings.items():
+            terms[field] = {}
+            for term, entries in field_terms.items():
+                terms[field][term] = [len(data) // 2, len(entries)]
+                for ordinal, freq in entries:
+                    data.extend((ordinal, freq))
+
+        with open(os.path.join(path, f'{name}.postings'), 'wb') as f:
+            data.tofile(f)
+        with open(os.path.join(path, f'{name}.json'), 'w') as f:
+            json.dump({
+                'ids': [doc_id for doc_id, _ in documents],
+                'sources': [doc for _, doc in documents],
+                'lengths': lengths,
+                'totals': {field: sum(values) for field, values in lengths.items()},
+                'terms': terms
+            }, f, default=_json_default)
+
+
+class IndexDirectory:
+    """One version of the index: a manifest and its segments.
+
+    Every write adds an immutable segment and replaces older copies of
+    its documents by marking them deleted; segments of similar size are
+    merged once ``merge_factor`` of them pile up. The manifest listing
+    the live segments is replaced atomically, and readers reload it
+    when it changes. Callers hold the backend's write lock.
+    """
+
+    def __init__(self, path: str, merge_factor: int):
+        self.path = path
+        self.merge_factor = merge_factor
+        self.live = []
+        self._segments = {}
+        self._stamp = None
+
+    def write(self, documents: Dict[str, Dict]):
+        manifest = self._read_manifest()
+        self._mark_deleted(manifest, documents.keys())
+        name = self._new_segment(manifest, list(documents.items()))
+        manifest['segments'].append({'name': name, 'deleted': []})
+        self._commit(manifest)
+
+    def delete(self, doc_ids: Iterable[str]):
+        manifest = self._read_manifest()
+        self._mark_deleted(manifest, doc_ids)
+        self._commit(manifest)
+
+    def optimize(self):
+        """Merge every segment into one, dropping deleted documents."""
+        manifest = self._read_manifest()
+        if len(manifest['segments']) > 1 or any(entry['deleted'] for entry in manifest['segments']):
+            name = self._new_segment(manifest, self._live_documents(manifest['segments']))
+            manifest['segments'] = [{'name': name, 'deleted': []}]
+            self._commit(manifest)
+
+    def refresh(self):
+        """Load the segments of the current manifest if it changed."""
+        for _ in range(3):
+            try:
+                stat = os.stat(self._manifest_path())
+                stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                stamp = None
+            if stamp == self._stamp:
+                return
+
+            manifest = self._read_manifest()
+            try:
+                live = [
+                    (self._segment(entry['name']), set(entry['deleted']))
+                    for entry in manifest['segments']
+                ]
+            except FileNotFoundError:
+                # A merge in another process removed a segment; reread the manifest
+                continue
+
+            names = {entry['name'] for entry in manifest['segments']}
+            for name in list(self._segments):
+                if name not in names:
+                    self._segments.pop(name).close()
+            self.live = live
+            self._stamp = stamp
+            return
+        raise RuntimeError(f"Search index at {self.path} keeps changing while loading")
+
+    def close(self):
+        """Release the memory maps of every open segment."""
+        for segment in self._segments.values():
+            segment.close()
+        self._segments = {}
+        self.live = []
+        self._stamp = None
+
+    def _segment(self, name: str) -> Segment:
+        if name not in self._segments:
+            self._segments[name] = Segment(self.path, name)
+        return self._segments[name]
+
+    def _mark_deleted(self, manifest: Dict, doc_ids: Iterable[str]):
+        doc_ids = set(doc_ids)
+        for entry in manifest['segments']:
+            segment = self._segment(entry['name'])
+            deleted = set(entry['deleted'])
+            for doc_id in doc_ids:
+                ordinal = segment.ordinals.get(doc_id)
+                if ordinal is not None:
+                    deleted.add(ordinal)
+            entry['deleted'] = sorted(deleted)
+
+    def _live_documents(self, entries: List[Dict]) -> List[Tuple[str, Dict]]:
+        documents = []
+        for entry in entries:
+            segment = self._segment(entry['name'])
+            deleted = set(entry['deleted'])
+            documents.extend(
+                (doc_id, segment.sources[i])
+                for i, doc_id in enumerate(segment.ids)
+                if i not in deleted
+            )
+        return documents
+
+    def _new_segment(self, manifest: Dict, documents: List[Tuple[str, Dict]]) -> str:
+        manifest['generation'] += 1
+        name = f"seg_{manifest['generation']}_{uuid.uuid4().hex[:8]}"
+        Segment.write(self.path, name, documents)
+        return name
+
+    def _merge(self, manifest: Dict):
+        """Merge segments of a similar size, keeping writes logarithmic."""
+        while True:
+            levels = defaultdict(list)
+            for entry in manifest['segments']:
+                live = len(self._segment(entry['name'])) - len(entry['deleted'])
+                levels[int(math.log(max(live, 1), self.merge_factor))].append(entry)
+
+            group = next((entries for entries in levels.values() if len(entries) >= self.merge_factor), None)
+            if group is None:
+                return
+
+            name = self._new_segment(manifest, self._live_documents(group))
+            position = manifest['segments'].index(group[0])
+            merged = {entry['name'] for entry in group}
+            manifest['segments'] = [
+                entry for entry in manifest['segments'] if entry['name'] not in merged
+            ]
+            manifest['segments'].insert(position, {'name': name, 'deleted': []})
+
+    def _commit(self, manifest: Dict):
+        previous = {entry['name'] for entry in self._read_manifest()['segments']}
+
+        # Segments whose documents were all replaced are dropped, not merged
+        manifest['segments'] = [
+            entry for entry in manifest['segments']
+            if len(entry['deleted']) < len(self._segment(entry['name']))
+        ]
+        self._merge(manifest)
+
+        path = self._manifest_path()
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f'{path}.tmp', path)
+
+        current = {entry['name'] for entry in manifest['segments']}
+        for name in (previous | set(self._segments)) - current:
+            for suffix in ('json', 'postings'):
+                try:
+                    os.remove(os.path.join(self.path, f'{name}.{suffix}'))
+                except FileNotFoundError:
+                    pass
+        self.refresh()
+
+    def _read_manifest(self) -> Dict:
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'generation': 0, 'segments': []}
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, 'manifest.json')
+
+
+class EmbeddedSearchBackend(SearchBackend):
+    """On-disk inverted index with BM25 scoring.
+
+    The live index is the version directory that the ``current`` link
+    points to. Writes happen under a file lock, so web and worker
+    processes on one host can share the index. Nested code and LaTeX
+    blocks are searched as one field per note.
+    """
+
+    def __init__(self, path: Optional[str] = None, merge_factor: Optional[int] = None):
+        self.path = path or os.getenv('SEARCH_INDEX_DIR', 'data/search_index')
+        self.merge_factor = max(2, merge_factor or int(os.getenv('SEARCH_MERGE_FACTOR', 10)))
+        os.makedirs(self.path, exist_ok=True)
+        self._directories = {}
+        self._live_path = None
+        self._lock = threading.RLock()
+
+    def index_documents(self, documents: Dict[str, Dict], index: Optional[str] = None) -> List[str]:
+        if documents:
+            with self._lock, self._write_lock():
+                self._directory(index).write(documents)
+        return []
+
+    def delete_documents(self, doc_ids: Iterable[str]):
+        with self._lock, self._write_lock():
+            self._directory().delete(doc_ids)
+
+    def create_version(self, version: int) -> str:
+        name = f'v{version}'
+        os.makedirs(os.path.join(self.path, name), exist_ok=True)
+        return name
+
+    def activate_version(self, index: str):
+        with self._lock, self._write_lock():
+            link = os.path.join(self.path, CURRENT_LINK)
+            versioned = os.path.islink(link)
+
+            # Replacing a symlink is atomic, so readers see one version or the other
+            staged = f'{link}.tmp'
+            if os.path.lexists(staged):
+                os.remove(staged)
+            os.symlink(index, staged)
+            os.replace(staged, link)
+
+            for name in os.listdir(self.path):
+                entry = os.path.join(self.path, name)
+                if name != index and re.fullmatch(r'v\d+', name) and os.path.isdir(entry):
+                    shutil.rmtree(entry, ignore_errors=True)
+                elif not versioned and (name == 'manifest.json' or name.startswith('seg_')):
+                    # Files of an index created before versioning
+                    os.remove(entry)
+
+    def optimize(self):
+        with self._lock, self._write_lock():
+            self._directory().optimize()
+
+    def search(
+        self,
+        query: str,
+        user_id: str,
+        language: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        folder_id: Optional[str] = None,
+        size: int = 10
+    ) -> List[Dict]:
+        with self._lock:
+            directory = self._directory()
+            directory.refresh()
+            live = directory.live
+            terms = set(tokenize(query))
+
+            def allowed(source):
+                if language and not any(
+                    block.get('language') == language for block in source.get('code_blocks') or []
+                ):
+                    return False
+                if tags and not set(tags) & set(source.get('tags') or []):
+                    return False
+                return not folder_id or source.get('folder_id') == folder_id
+
+            def eligible(position, ordinal):
+                segment, deleted = live[position]
+                return (
+                    ordinal in segment.by_user.get(user_id, ())
+                    and ordinal not in deleted
+                    and allowed(segment.sources[ordinal])
+                )
+
+            if terms:
+                scores = self._score(live, terms, eligible)
+            else:
+                # Without query terms every filtered note matches, newest segments first
+                scores = {
+                    (position, ordinal): 0.0
+                    for position, (segment, _) in enumerate(live)
+                    for ordinal in segment.by_user.get(user_id, ())
+                    if eligible(position, ordinal)
+                }
+
+            best = heapq.nlargest(size, scores.items(), key=lambda item: (item[1], item[0]))
+
+            results = []
+            for (position, ordinal), score in best:
+                result = dict(live[position][0].sources[ordinal])
+                result['score'] = score
+                highlights = self._highlights(result, terms)
+                if highlights:
+                    result['highlights'] = highlights
+                results.append(result)
+            return results
+
+    def close(self):
+        """Release the memory maps of every open segment."""
+        with self._lock:
+            for directory in self._directories.values():
+                directory.close()
+            self._directories = {}
+            self._live_path = None
+
+    def _directory(self, index: Optional[str] = None) -> IndexDirectory:
+        """Get a version directory, or the live one."""
+        if index:
+            path = os.path.realpath(os.path.join(self.path, index))
+        else:
+            link = os.path.join(self.path, CURRENT_LINK)
+            path = os.path.realpath(link if os.path.islink(link) else self.path)
+            if self._live_path and self._live_path != path:
+                # The index was rebuilt; drop the version it replaced
+                previous = self._directories.pop(self._live_path, None)
+                if previous is not None:
+                    previous.close()
+            self._live_path = path
+
+        if path not in self._directories:
+            self._directories[path] = IndexDirectory(path, self.merge_factor)
+        return self._directories[path]
+
+    def _score(self, live, terms, eligible) -> Dict[Tuple[int, int], float]:
+        doc_count = sum(len(segment) for segment, _ in live)
+        checked = {}
+        scores = defaultdict(float)
+        for field, boost in FIELD_BOOSTS.items():
+            total = sum(segment.totals.get(field, 0) for segment, _ in live)
+            average = total / doc_count if doc_count else 0
+            if not average:
+                continue
+
+            for term in terms:
+                doc_freq = sum(segment.doc_freq(field, term) for segment, _ in live)
+                if not doc_freq:
+                    continue
+                idf = math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+
+                for position, (segment, _) in enumerate(live):
+                    lengths = segment.lengths[field]
+                    for ordinal, freq in segment.postings(field, term):
+                        key = (position, ordinal)
+                        if key not in checked:
+                            checked[key] = eligible(position, ordinal)
+                        if not checked[key]:
+                            continue
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ordinal] / average)
+                        scores[key] += boost * idf * freq * (BM25_K1 + 1) / (freq + norm)
+        return scores
+
+    def _highlights(self, source: Dict, terms) -> Dict[str, List[str]]:
+        if not terms:
+            return {}
+        pattern = re.compile(
+            r'\b(' + '|'.join(re.escape(term) for term in sorted(terms)) + r')\b',
+            re.IGNORECASE
+        )
+        highlights = {}
+        for field in HIGHLIGHT_FIELDS:
+            text = field_text(source, field)
+            match = pattern.search(text)
+            if match:
+                start = max(0, match.start() - HIGHLIGHT_CONTEXT)
+                end = min(len(text), match.end() + HIGHLIGHT_CONTEXT)
+                highlights[field] = [pattern.sub(r'<em>\1</em>', text[start:end])]
+        return highlights
+
+    @contextmanager
+    def _write_lock(self):
+        with open(os.path.join(self.path, 'write.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,67 @@
+from typing import Dict, Optional
+import hashlib
+import json
+import logging
+import os
+
+from monitoring import code_result_cache_requests
+from services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionResultCache:
+    """Redis cache of code execution results.
+
+    Results are keyed by a hash of (language, image digest, code, stdin),
+    so a new image version never serves output produced by the old one.
+    Only successful runs whose output fits ``max_output_bytes`` are kept,
+    and entries expire after ``ttl`` seconds. Disabled unless
+    ``CODE_RESULT_CACHE_ENABLED`` is set, since snippets reading the
+    clock, randomness or the filesystem are not repeatable.
+    """
+
+    def __init__(
+        self,
+        cache_service: Optional[CacheService] = None,
+        enabled: Optional[bool] = None,
+        ttl: Optional[int] = None,
+        max_output_bytes: Optional[int] = None
+    ):
+        self.enabled = (
+            enabled if enabled is not None
+            else os.getenv('CODE_RESULT_CACHE_ENABLED', 'False').lower() in ('1', 'true')
+        )
+        self.cache = cache_service or (CacheService() if self.enabled else None)
+        self.ttl = ttl or int(os.getenv('CODE_RESULT_CACHE_TTL', 3600))
+        self.max_output_bytes = max_output_bytes or int(os.getenv('CODE_RESULT_CACHE_MAX_OUTPUT_BYTES', 64 * 1024))
+
+    @staticmethod
+    def make_key(language: str, image_id: str, code: str, stdin: Optional[str] = None) -> str:
+        """Build the cache key for an execution."""
+        payload = json.dumps([language, image_id, code, stdin])
+        digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        return f"code_result:{language}:{digest}"
+
+    def get(self, language: str, image_id: str, code: str, stdin: Optional[str] = None) -> Optional[Dict]:
+        """Get a cached result, recording the hit or miss."""
+        if not self.enabled:
+            return None
+
+        try:
+            result = self.cache.get(self.make_key(language, image_id, code, stdin))
+        except Exception:
+            logger.warning("Code result cache unavailable")
+            return None
+
+        code_result_cache_requests.labels(language, 'hit' if result is not None else 'miss').inc()
+        return result
+
+    def set(self, language: str, image_id: str, code: str, result: Dict, stdin: Optional[str] = None):
+        """Cache a successful result unless its output is too large."""
+        if not self.enabled or not result.get('success'):
+            return
+        if len((result.get('output') or '').encode('utf-8')) > self.max_output_bytes:
+            return
+
+        self.cache.set(self.make_key(language, image_id, code, stdin), result, self.ttl)
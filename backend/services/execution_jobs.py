@@ -0,0 +1,83 @@
+from typing import Dict, Optional
+import logging
+
+from services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+# Jobs cannot outlive the Celery result expiry
+JOB_TTL = 3600
+
+
+def execution_room(job_id: str) -> str:
+    """Socket.IO room that receives the result of an execution job."""
+    return f"execution_{job_id}"
+
+
+class ExecutionJobService:
+    """Queues code executions on the Celery code execution queue.
+
+    Web workers return as soon as a job is queued, so pending executions
+    only cost a queue entry instead of a blocked worker. Results are
+    fetched by polling or pushed to the job's Socket.IO room.
+    """
+
+    def __init__(self, cache_service: Optional[CacheService] = None):
+        self.cache = cache_service or CacheService()
+
+    def submit(
+        self,
+        code: str,
+        language: str,
+        user_id: str,
+        timeout: int = 30,
+        stdin: Optional[str] = None,
+        use_cache: bool = True
+    ) -> Dict:
+        """Enqueue a code execution."""
+        from tasks import execute_code
+
+        task = execute_code.delay(
+            code,
+            language,
+            timeout=timeout,
+            stdin=stdin,
+            use_cache=use_cache
+        )
+        self.cache.set(self._job_key(task.id), {
+            'language': language,
+            'user_id': user_id
+        }, JOB_TTL)
+
+        return {'job_id': task.id, 'state': 'PENDING'}
+
+    def get_status(self, job_id: str, user_id: str) -> Optional[Dict]:
+        """Get the state or result of a job owned by the user."""
+        job = self.cache.get(self._job_key(job_id))
+        if not job or job.get('user_id') != user_id:
+            return None
+
+        task = self._async_result(job_id)
+        status = {
+            'job_id': job_id,
+            'language': job['language'],
+            'state': task.state
+        }
+
+        if task.state == 'SUCCESS':
+            status['result'] = task.result
+        elif task.state in ('FAILURE', 'REVOKED'):
+            status['result'] = {
+                'success': False,
+                'output': None,
+                'error': f"Execution error: {str(task.info)}"
+            }
+
+        return status
+
+    def _job_key(self, job_id: str) -> str:
+        return f"code_job:{job_id}"
+
+    def _async_result(self, job_id: str):
+        from tasks import celery
+        return celery.AsyncResult(job_id)
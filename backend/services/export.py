@@ -11,8 +11,9 @@ import io
 class ExportService:
     """Service for exporting notes in various formats."""
     
-    def __init__(self, templates_path: str):
+    def __init__(self, templates_path: str, render_pool=None):
         self.templates_path = templates_path
+        self.render_pool = render_pool
         self.jinja_env = Environment(loader=FileSystemLoader(templates_path))
         self.html2text = html2text.HTML2Text()
         self.html2text.body_width = 0  # Disable wrapping
@@ -98,6 +99,8 @@ tags: {', '.join(note['tags'])}
     ) -> BinaryIO:
         """Export multiple notes as a zip archive."""
         try:
+            notes = self._ensure_rendered(notes)
+            
             # Create in-memory zip file
             zip_buffer = io.BytesIO()
             
@@ -130,6 +133,29 @@ tags: {', '.join(note['tags'])}
         except Exception as e:
             raise ExportError(f"Error in batch export: {str(e)}")
     
+    def _ensure_rendered(self, notes: List[Dict]) -> List[Dict]:
+        """Render notes whose stored HTML is missing or behind their content."""
+        stale = [
+            idx for idx, note in enumerate(notes)
+            if not note.get('processed_content')
+            or note.get('processed_version', note.get('current_version')) != note.get('current_version')
+        ]
+        if not stale:
+            return notes
+        
+        contents = [notes[idx]['content'] for idx in stale]
+        if self.render_pool is not None and self.render_pool.should_use(len(contents)):
+            results = self.render_pool.process_notes(contents)
+        else:
+            from services.content_processor import ContentProcessor
+            processor = ContentProcessor()
+            results = [processor.process_content(content) for content in contents]
+        
+        notes = list(notes)
+        for idx, processed_content in zip(stale, results):
+            notes[idx] = {**notes[idx], 'processed_content': processed_content}
+        return notes
+    
     def _get_safe_filename(self, filename: str) -> str:
         """Convert a string to a safe filename."""
         # Remove invalid characters
@@ -0,0 +1,204 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import atexit
+import logging
+import os
+import threading
+import time
+
+from monitoring import (
+    search_index_batch_size, search_index_lag_seconds,
+    search_index_operations, search_index_queue_depth
+)
+
+logger = logging.getLogger(__name__)
+
+# Longest wait between retries of a failed write, in seconds
+MAX_RETRY_BACKOFF = 60
+
+
+class _QueuedDocument:
+    """A search document waiting to be written."""
+
+    __slots__ = ('document', 'on_indexed', 'enqueued_at', 'attempts', 'retry_at')
+
+    def __init__(self, document: Dict, on_indexed: Optional[Callable[[], None]] = None):
+        self.document = document
+        self.on_indexed = on_indexed
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+        self.retry_at = 0.0
+
+
+class IndexQueue:
+    """Coalescing queue that writes search documents in bulk.
+
+    Notes are indexed by a background thread rather than the caller.
+    Queuing a note that is still waiting replaces its document, so a
+    burst of edits becomes a single write. Documents are sent to the
+    backend together once ``max_batch_size`` are due or the oldest has
+    waited ``max_wait_ms``. Failed writes, or the documents a bulk write
+    rejected, are retried with exponential backoff and dropped after
+    ``max_retries`` attempts; a document's
+    ``on_indexed`` callback runs only once it has been written.
+    """
+
+    def __init__(
+        self,
+        backend,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        retry_backoff: Optional[float] = None
+    ):
+        self.backend = backend
+        self.max_batch_size = max_batch_size or int(os.getenv('SEARCH_INDEX_BATCH_SIZE', 100))
+        self.max_wait = (
+            max_wait_ms if max_wait_ms is not None
+            else float(os.getenv('SEARCH_INDEX_MAX_WAIT_MS', 1000))
+        ) / 1000
+        self.max_retries = (
+            max_retries if max_retries is not None
+            else int(os.getenv('SEARCH_INDEX_MAX_RETRIES', 5))
+        )
+        self.retry_backoff = (
+            retry_backoff if retry_backoff is not None
+            else float(os.getenv('SEARCH_INDEX_RETRY_BACKOFF', 1))
+        )
+        self._pending = OrderedDict()
+        self._in_flight = 0
+        self._flushing = 0
+        self._condition = threading.Condition()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def enqueue(self, doc_id: str, document: Dict, on_indexed: Optional[Callable[[], None]] = None):
+        """Queue a document, replacing a queued older version of it."""
+        self._ensure_worker()
+        with self._condition:
+            queued = self._pending.get(doc_id)
+            if queued is not None:
+                # Keep the original queue time so lag covers the whole burst
+                queued.document = document
+                queued.on_indexed = on_indexed
+                search_index_operations.labels('coalesced').inc()
+            else:
+                self._pending[doc_id] = _QueuedDocument(document, on_indexed)
+            self._update_depth()
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write queued documents now and wait until none are left.
+
+        Returns False if documents were still queued after ``timeout``.
+        """
+        with self._condition:
+            if not self._pending and not self._in_flight:
+                return True
+            self._ensure_worker()
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                return self._condition.wait_for(
+                    lambda: not self._pending and not self._in_flight,
+                    timeout
+                )
+            finally:
+                self._flushing -= 1
+
+    def _ensure_worker(self):
+        # Started on first use so forked workers get their own thread
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                if self._worker is None:
+                    atexit.register(self.flush, float(os.getenv('SEARCH_INDEX_SHUTDOWN_TIMEOUT', 5)))
+                self._worker = threading.Thread(
+                    target=self._run_forever,
+                    name='search-index-queue',
+                    daemon=True
+                )
+                self._worker.start()
+
+    def _run_forever(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception("Search indexing queue failed to handle a batch")
+            finally:
+                with self._condition:
+                    self._in_flight -= len(batch)
+                    self._update_depth()
+                    self._condition.notify_all()
+
+    def _collect_batch(self) -> List[Tuple[str, _QueuedDocument]]:
+        """Block until a batch is due, then take it off the queue."""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                due = [doc_id for doc_id, queued in self._pending.items() if queued.retry_at <= now]
+
+                if due:
+                    oldest = min(self._pending[doc_id].enqueued_at for doc_id in due)
+                    if len(due) >= self.max_batch_size or self._flushing or now >= oldest + self.max_wait:
+                        batch = [(doc_id, self._pending.pop(doc_id)) for doc_id in due[:self.max_batch_size]]
+                        self._in_flight += len(batch)
+                        return batch
+                    timeout = oldest + self.max_wait - now
+                elif self._pending:
+                    # Only retries are waiting
+                    timeout = min(queued.retry_at for queued in self._pending.values()) - now
+                else:
+                    timeout = None
+
+                self._condition.wait(timeout)
+
+    def _write(self, batch: List[Tuple[str, _QueuedDocument]]):
+        try:
+            failed = set(self.backend.index_documents({doc_id: queued.document for doc_id, queued in batch}))
+        except Exception:
+            logger.exception(f"Bulk indexing of {len(batch)} notes failed")
+            self._retry(batch)
+            return
+
+        if failed:
+            logger.error(f"Search backend rejected {len(failed)} of {len(batch)} notes")
+            self._retry([(doc_id, queued) for doc_id, queued in batch if doc_id in failed])
+            batch = [(doc_id, queued) for doc_id, queued in batch if doc_id not in failed]
+            if not batch:
+                return
+
+        written_at = time.monotonic()
+        search_index_batch_size.observe(len(batch))
+        search_index_operations.labels('indexed').inc(len(batch))
+        for doc_id, queued in batch:
+            search_index_lag_seconds.observe(written_at - queued.enqueued_at)
+            if queued.on_indexed is not None:
+                try:
+                    queued.on_indexed()
+                except Exception:
+                    logger.exception(f"Callback for indexed note {doc_id} failed")
+
+    def _retry(self, batch: List[Tuple[str, _QueuedDocument]]):
+        with self._condition:
+            for doc_id, queued in batch:
+                if doc_id in self._pending:
+                    # A newer version was queued meanwhile and replaces this one
+                    continue
+
+                queued.attempts += 1
+                if queued.attempts > self.max_retries:
+                    logger.error(f"Dropping note {doc_id} from the search index queue after {queued.attempts} attempts")
+                    search_index_operations.labels('failed').inc()
+                    continue
+
+                backoff = min(self.retry_backoff * 2 ** (queued.attempts - 1), MAX_RETRY_BACKOFF)
+                queued.retry_at = time.monotonic() + backoff
+                self._pending[doc_id] = queued
+                search_index_operations.labels('retried').inc()
+
+    def _update_depth(self):
+        search_index_queue_depth.set(len(self._pending) + self._in_flight)
@@ -0,0 +1,214 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from multiprocessing.connection import Client, Listener
+import logging
+import os
+import threading
+
+from services.batching import batch_pipelines
+
+logger = logging.getLogger(__name__)
+
+# Pipeline tasks served by the inference server and the models behind them
+SUMMARIZATION = 'summarization'
+CODE_EXPLANATION = 'text2text-generation'
+
+MODELS = {
+    SUMMARIZATION: 'facebook/bart-large-cnn',
+    CODE_EXPLANATION: 'Salesforce/codet5-base'
+}
+
+
+class InferenceError(Exception):
+    """Raised when the inference server cannot serve a request."""
+    pass
+
+
+def load_pipelines() -> Dict[str, Callable]:
+    """Load the local transformer pipelines used by the AI features."""
+    # Imported here so processes that only talk to the server never load torch
+    from transformers import pipeline
+    import torch
+
+    device = 0 if torch.cuda.is_available() else -1
+    return {
+        task: pipeline(task, model=model, device=device)
+        for task, model in MODELS.items()
+    }
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """Parse 'host:port' into a TCP address, anything else is a socket path."""
+    if ':' in address and not address.startswith('/'):
+        host, port = address.rsplit(':', 1)
+        return (host, int(port))
+    return address
+
+
+def _authkey() -> bytes:
+    # Connections unpickle what they receive, so there is no default key
+    authkey = os.getenv('AI_INFERENCE_AUTHKEY')
+    if not authkey:
+        raise InferenceError("AI_INFERENCE_AUTHKEY must be set to use the inference server")
+    return authkey.encode()
+
+
+class InferenceServer:
+    """Local server owning the transformer models for every process on a host.
+
+    Web workers and Celery tasks connect over a local socket instead of
+    each building their own pipelines, so model memory is paid once.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        authkey: Optional[bytes] = None,
+        pipelines: Optional[Dict[str, Callable]] = None
+    ):
+        self.address = parse_address(address)
+        self.authkey = authkey or _authkey()
+        # Requests from every connected worker are batched together
+        self.pipelines = batch_pipelines(
+            pipelines if pipelines is not None else load_pipelines()
+        )
+        self._listener = None
+        self._running = False
+
+    def serve_forever(self):
+        """Accept client connections until stopped."""
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+        self._listener = Listener(self.address, authkey=self.authkey)
+        if isinstance(self.address, str):
+            # Only the server's user may connect to a socket path
+            os.chmod(self.address, 0o600)
+        self._running = True
+        logger.info(f"Inference server listening on {self.address}")
+
+        while self._running:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                if not self._running:
+                    break
+                logger.exception("Error accepting inference connection")
+                continue
+
+            threading.Thread(
+                target=self._handle_connection,
+                args=(conn,),
+                daemon=True
+            ).start()
+
+    def stop(self):
+        """Stop accepting new connections."""
+        self._running = False
+        if self._listener:
+            self._listener.close()
+
+    def _handle_connection(self, conn):
+        """Serve requests from one client connection."""
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except EOFError:
+                    break
+
+                try:
+                    result = self.run(
+                        request['task'],
+                        request['inputs'],
+                        request.get('kwargs', {})
+                    )
+                    conn.send({'result': result})
+                except Exception as e:
+                    conn.send({'error': str(e)})
+        finally:
+            conn.close()
+
+    def run(self, task: str, inputs: Any, kwargs: Dict) -> Any:
+        """Run a pipeline for a request."""
+        if task not in self.pipelines:
+            raise InferenceError(f"Unsupported task: {task}")
+
+        return self.pipelines[task](inputs, **kwargs)
+
+
+class InferenceClient:
+    """Client for the shared inference server.
+
+    Each thread keeps its own connection, which is re-established once if
+    the server restarted between requests.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        authkey: Optional[bytes] = None,
+        timeout: Optional[float] = None
+    ):
+        self.address = parse_address(address)
+        self.authkey = authkey or _authkey()
+        self.timeout = timeout or float(os.getenv('AI_INFERENCE_TIMEOUT', 120))
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _reset_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+        self._local.conn = None
+
+    def request(self, task: str, inputs: Any, kwargs: Optional[Dict] = None) -> Any:
+        """Send a request to the server and wait for its result."""
+        message = {'task': task, 'inputs': inputs, 'kwargs': kwargs or {}}
+
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(message)
+                if not conn.poll(self.timeout):
+                    self._reset_connection()
+                    raise InferenceError(f"Inference request timed out after {self.timeout}s")
+                response = conn.recv()
+                break
+            except (OSError, EOFError) as e:
+                self._reset_connection()
+                if attempt:
+                    raise InferenceError(f"Inference server unavailable: {str(e)}")
+
+        if 'error' in response:
+            raise InferenceError(response['error'])
+        return response['result']
+
+    def pipeline(self, task: str) -> 'RemotePipeline':
+        """Get a callable with the same interface as a local pipeline."""
+        return RemotePipeline(self, task)
+
+
+class RemotePipeline:
+    """Drop-in replacement for a transformers pipeline backed by the server."""
+
+    def __init__(self, client: InferenceClient, task: str):
+        self.client = client
+        self.task = task
+
+    def __call__(self, inputs: Any, **kwargs) -> List[Dict]:
+        return self.client.request(self.task, inputs, kwargs)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    server = InferenceServer(os.getenv('AI_INFERENCE_ADDRESS', 'localhost:6010'))
+    server.serve_forever()
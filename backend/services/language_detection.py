@@ -0,0 +1,147 @@
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+import hashlib
+import os
+import re
+import threading
+
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name, guess_lexer
+from pygments.util import ClassNotFound
+
+# Interpreters named on a shebang line
+SHEBANG_LANGUAGES = {
+    'python': 'python',
+    'python3': 'python',
+    'node': 'javascript',
+    'ruby': 'ruby',
+    'bash': 'bash',
+    'sh': 'bash',
+    'zsh': 'bash',
+    'perl': 'perl'
+}
+
+# File names in a leading comment, e.g. "# app.py" or "// Main.java"
+EXTENSION_LANGUAGES = {
+    'py': 'python',
+    'js': 'javascript',
+    'mjs': 'javascript',
+    'ts': 'typescript',
+    'java': 'java',
+    'cpp': 'cpp',
+    'cc': 'cpp',
+    'hpp': 'cpp',
+    'c': 'c',
+    'h': 'c',
+    'rb': 'ruby',
+    'go': 'go',
+    'rs': 'rust',
+    'sh': 'bash',
+    'sql': 'sql',
+    'html': 'html',
+    'css': 'css'
+}
+
+SHEBANG_PATTERN = re.compile(r'^#!\s*\S*?(?:/env\s+)?/?(\w+?)[\d.]*(?:\s|$)')
+FILENAME_PATTERN = re.compile(r'^\s*(?:#|//|--|/\*)\s*[\w./-]+\.(\w+)\b')
+
+# Distinctive constructs, checked in order; the first match wins
+KEYWORD_PATTERNS = [
+    ('java', re.compile(r'\bpublic\s+(?:static\s+)?(?:final\s+)?class\s+\w+|\bSystem\.out\.print')),
+    ('cpp', re.compile(r'^\s*#include\s*[<"]|\bstd::|\bcout\s*<<', re.MULTILINE)),
+    ('python', re.compile(r'^\s*def\s+\w+\(.*\)\s*(?:->.*)?:\s*$|^\s*from\s+[\w.]+\s+import\s|^\s*import\s+[\w.]+\s*$', re.MULTILINE)),
+    ('javascript', re.compile(r'\b(?:const|let)\s+\w+\s*=|\bfunction\s*\w*\s*\(|\bconsole\.log\(|=>\s*[{(]|\brequire\(\s*[\'"]')),
+    ('ruby', re.compile(r'^\s*(?:puts|require)\s+[\'"\w]|^\s*(?:def\s+\w+[^:\n]*|end)\s*$', re.MULTILINE)),
+    ('sql', re.compile(r'^\s*(?:SELECT\s.+\sFROM|INSERT\s+INTO|CREATE\s+TABLE|UPDATE\s+\w+\s+SET)\b', re.MULTILINE | re.IGNORECASE)),
+    ('html', re.compile(r'^\s*<(?:!DOCTYPE|html|head|body|div)\b', re.IGNORECASE)),
+    ('bash', re.compile(r'^\s*(?:\$\s+)?(?:echo|cd|sudo|apt-get|export|pip|npm)\s', re.MULTILINE))
+]
+
+
+class LanguageDetector:
+    """Shared language detection for code blocks.
+
+    Cheap heuristics (shebangs, file names in a leading comment and
+    distinctive keywords) run before pygments' ``guess_lexer``, which
+    tries every lexer. Results are remembered by content hash so content
+    processing and search indexing detect each block only once.
+    Detected names are pygments aliases, usable with ``lexer``.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv('LANGUAGE_DETECTION_CACHE_SIZE', 4096))
+        self._detections = OrderedDict()
+        self._lock = threading.Lock()
+
+    def detect(self, code: str, hint: Optional[str] = None) -> str:
+        """Detect the language of a snippet, preferring an explicit hint."""
+        if hint:
+            return hint.lower()
+
+        key = hashlib.sha256(code.encode('utf-8')).hexdigest()
+        with self._lock:
+            if key in self._detections:
+                self._detections.move_to_end(key)
+                return self._detections[key]
+
+        language = self.classify(code) or self._guess(code)
+
+        with self._lock:
+            self._detections[key] = language
+            while len(self._detections) > self.max_entries:
+                self._detections.popitem(last=False)
+        return language
+
+    def classify(self, code: str) -> Optional[str]:
+        """Recognize a language from cheap hints, or None if unsure."""
+        first_line = code.lstrip().split('\n', 1)[0]
+
+        match = SHEBANG_PATTERN.match(first_line)
+        if match and match.group(1) in SHEBANG_LANGUAGES:
+            return SHEBANG_LANGUAGES[match.group(1)]
+
+        match = FILENAME_PATTERN.match(first_line)
+        if match and match.group(1).lower() in EXTENSION_LANGUAGES:
+            return EXTENSION_LANGUAGES[match.group(1).lower()]
+
+        for language, pattern in KEYWORD_PATTERNS:
+            if pattern.search(code):
+                return language
+        return None
+
+    def lexer(self, language: str):
+        """Get a shared lexer instance for a language."""
+        return _lexer(language)
+
+    def formatter(self, language: str, style: str, linenos: bool) -> HtmlFormatter:
+        """Get a shared HTML formatter for highlighted code."""
+        return _formatter(language, style, linenos)
+
+    def _guess(self, code: str) -> str:
+        try:
+            lexer = guess_lexer(code)
+        except ClassNotFound:
+            return 'text'
+        return lexer.aliases[0] if lexer.aliases else lexer.name.lower()
+
+
+@lru_cache(maxsize=256)
+def _lexer(language: str):
+    try:
+        return get_lexer_by_name(language, stripall=True)
+    except ClassNotFound:
+        return get_lexer_by_name('text', stripall=True)
+
+
+@lru_cache(maxsize=256)
+def _formatter(language: str, style: str, linenos: bool) -> HtmlFormatter:
+    return HtmlFormatter(
+        style=style,
+        linenos=linenos,
+        cssclass=f'highlight language-{language}'
+    )
+
+
+# Shared by content processing and search indexing
+language_detector = LanguageDetector()
@@ -0,0 +1,93 @@
+from typing import Dict
+import logging
+
+from bson import ObjectId
+
+from models.processing_state import FAILED, PENDING, PROCESSING, READY
+
+logger = logging.getLogger(__name__)
+
+
+class NoteProcessingService:
+    """Renders and indexes notes after they are saved.
+
+    Saving a note only writes its content and marks it pending; this
+    service then renders the content and indexes it. The rendered
+    output is written only if the note is still at the version that was
+    rendered, so a slow job never overwrites the output of a newer edit.
+    Until then readers keep getting the last rendered HTML.
+
+    ``indexed_version`` is set only once the search document has been
+    written, so a note whose index write was dropped, or whose folder or
+    tags changed, is indexed again the next time it is processed.
+    """
+
+    def __init__(self, db, content_processor=None, search=None):
+        self.db = db
+        self.content_processor = content_processor
+        self.search = search
+
+    def process(self, note_id: str) -> str:
+        """Render and index the current content of a note.
+
+        Returns the note's resulting processing state, or ``superseded``
+        if the note changed while it was being rendered.
+        """
+        note = self.db.notes.find_one({'_id': ObjectId(note_id)})
+        if not note:
+            logger.info(f"Skipping processing of deleted note {note_id}")
+            return 'missing'
+
+        version = note.get('current_version', 1)
+        if note.get('processed_version') == version and note.get('processing_state') == READY:
+            if self.search is not None and note.get('indexed_version') != version:
+                self.index(note, note['processed_content'])
+            return READY
+
+        current = {'_id': note['_id'], 'current_version': version}
+        self.db.notes.update_one(current, {'$set': {'processing_state': PROCESSING}})
+
+        try:
+            processed_content = self.content_processor.process_content(
+                note['content'],
+                previous=note.get('processed_content')
+            )
+        except Exception:
+            self.db.notes.update_one(current, {'$set': {'processing_state': FAILED}})
+            raise
+
+        result = self.db.notes.update_one(current, {
+            '$set': {
+                'processed_content': processed_content,
+                'processed_version': version,
+                'processing_state': READY
+            }
+        })
+        if result.matched_count == 0:
+            # A newer edit queued its own job
+            return 'superseded'
+
+        if self.search is not None:
+            self.index(note, processed_content)
+        return READY
+
+    def index(self, note: Dict, processed_content: Dict):
+        """Queue a stored note for indexing and record it once written."""
+        note_id, version = note['_id'], note.get('current_version', 1)
+        self.search.index_note(
+            self._search_document(note, processed_content),
+            on_indexed=lambda: self._mark_indexed(note_id, version)
+        )
+
+    def _mark_indexed(self, note_id, version: int):
+        self.db.notes.update_one(
+            {'_id': note_id, 'current_version': version},
+            {'$set': {'indexed_version': version}}
+        )
+
+    def _search_document(self, note: Dict, processed_content: Dict) -> Dict:
+        return {
+            **note,
+            '_id': str(note['_id']),
+            'processed_content': processed_content
+        }
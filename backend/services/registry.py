@@ -0,0 +1,114 @@
+from typing import Any, Callable, Dict, Iterable, Optional
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceRegistry:
+    """Registry of lazily constructed services.
+
+    Services are registered with a factory and only built the first time
+    they are requested, so importing a blueprint does not pull Docker
+    images, load ML models or contact Elasticsearch.
+    """
+
+    PENDING = 'pending'
+    INITIALIZING = 'initializing'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._status: Dict[str, Dict] = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Register a factory for a service without constructing it."""
+        with self._registry_lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+            self._instances.pop(name, None)
+            self._status[name] = {'state': self.PENDING}
+
+    def get(self, name: str) -> Any:
+        """Return the service instance, building it on first use."""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        if name not in self._factories:
+            raise KeyError(f"Unknown service: {name}")
+
+        with self._locks[name]:
+            # Another thread may have finished initialization while we waited
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+
+            self._status[name] = {'state': self.INITIALIZING}
+            start_time = time.time()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                self._status[name] = {
+                    'state': self.FAILED,
+                    'error': str(e),
+                    'init_seconds': round(time.time() - start_time, 3)
+                }
+                logger.exception(f"Failed to initialize service: {name}")
+                raise
+
+            self._instances[name] = instance
+            self._status[name] = {
+                'state': self.READY,
+                'init_seconds': round(time.time() - start_time, 3)
+            }
+            return instance
+
+    def is_ready(self, name: str) -> bool:
+        """Check whether a service has been constructed."""
+        return name in self._instances
+
+    def status(self) -> Dict[str, Dict]:
+        """Get readiness information for every registered service."""
+        return {name: dict(info) for name, info in self._status.items()}
+
+    def warm_up(self, names: Optional[Iterable[str]] = None, background: bool = True):
+        """Construct services ahead of their first request.
+
+        With ``background`` set, initialization runs in a daemon thread so
+        the worker can start serving requests immediately.
+        """
+        names = list(names) if names is not None else list(self._factories)
+
+        def _warm():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    # Failure is recorded in the status; requests will retry
+                    continue
+
+        if background:
+            thread = threading.Thread(target=_warm, name='service-warmup', daemon=True)
+            thread.start()
+            return thread
+
+        _warm()
+        return None
+
+    def reset(self, name: Optional[str] = None):
+        """Drop constructed instances so they are rebuilt on next use."""
+        names = [name] if name else list(self._factories)
+        for service_name in names:
+            with self._locks[service_name]:
+                self._instances.pop(service_name, None)
+                self._status[service_name] = {'state': self.PENDING}
+
+
+# Shared registry used by the blueprints
+services = ServiceRegistry()
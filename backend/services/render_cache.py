@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from typing import Callable, Optional
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from monitoring import render_cache_requests
+from services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+
+class RenderCache:
+    """Two-tier cache for rendered note blocks.
+
+    Highlighted code and MathML are kept in a bounded in-process LRU,
+    backed by Redis when ``RENDER_CACHE_REDIS`` is enabled so workers
+    share blocks rendered by each other. Keys are hashes of everything
+    that affects the output, so entries never need invalidating.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        cache_service: Optional[CacheService] = None,
+        use_redis: Optional[bool] = None,
+        timeout: Optional[int] = None
+    ):
+        self.max_entries = max_entries or int(os.getenv('RENDER_CACHE_MAX_ENTRIES', 4096))
+        if use_redis is None:
+            use_redis = os.getenv('RENDER_CACHE_REDIS', 'False').lower() in ('1', 'true')
+        self.redis = (cache_service or CacheService()) if use_redis else None
+        self.timeout = timeout or int(os.getenv('RENDER_CACHE_TIMEOUT', 7 * 24 * 3600))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(kind: str, *parts) -> str:
+        """Build the cache key for a rendered block."""
+        digest = hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+        return f"render:{kind}:{digest}"
+
+    def get_or_render(self, kind: str, parts: tuple, render: Callable[[], str]) -> str:
+        """Return the cached rendering of a block, rendering it on a miss."""
+        key = self.make_key(kind, *parts)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                render_cache_requests.labels(kind, 'memory').inc()
+                return self._entries[key]
+
+        html = self._redis_get(key)
+        if html is not None:
+            render_cache_requests.labels(kind, 'redis').inc()
+        else:
+            render_cache_requests.labels(kind, 'miss').inc()
+            html = render()
+            self._redis_set(key, html)
+
+        self._remember(key, html)
+        return html
+
+    def clear(self):
+        """Drop the in-process entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key: str, html: str):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _redis_get(self, key: str) -> Optional[str]:
+        if self.redis is None:
+            return None
+        try:
+            return self.redis.get(key)
+        except Exception:
+            logger.warning("Render cache Redis tier unavailable")
+            return None
+
+    def _redis_set(self, key: str, html: str):
+        if self.redis is not None:
+            self.redis.set(key, html, self.timeout)
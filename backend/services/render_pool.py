@@ -0,0 +1,110 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+import logging
+import multiprocessing
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Content processor and search document builder of a pool worker process
+_worker_processor = None
+_worker_documents = None
+
+
+def _init_worker():
+    global _worker_processor, _worker_documents
+    from services.advanced_search import SearchDocumentBuilder
+    from services.content_processor import ContentProcessor
+    _worker_processor = ContentProcessor()
+    _worker_documents = SearchDocumentBuilder()
+
+
+def _render_block(text: str) -> Dict:
+    return _worker_processor._render(text)
+
+
+def _process_note(content: str) -> Dict:
+    return _worker_processor.process_content(content)
+
+
+def _search_document(note: Dict) -> Dict:
+    return _worker_documents.build(note)
+
+
+class RenderPool:
+    """Process pool for CPU-bound content rendering.
+
+    Markdown rendering, highlighting and sanitizing hold the GIL, so
+    large notes and bulk operations are spread across worker processes,
+    each with its own ContentProcessor and SearchDocumentBuilder.
+    Results come back in input order. Work is rendered in the calling
+    process when the pool is disabled or the batch is too small to be
+    worth the round trip.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, min_batch: Optional[int] = None):
+        self.max_workers = (
+            max_workers if max_workers is not None
+            else int(os.getenv('RENDER_POOL_WORKERS', os.cpu_count() or 1))
+        )
+        self.min_batch = min_batch or int(os.getenv('RENDER_POOL_MIN_BATCH', 8))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 1
+
+    def should_use(self, batch_size: int) -> bool:
+        """Check whether a batch is large enough to send to the pool."""
+        return self.enabled and batch_size >= self.min_batch
+
+    def render_blocks(self, texts: List[str]) -> List[Dict]:
+        """Render top-level blocks in parallel, in order."""
+        return self._map(_render_block, texts)
+
+    def process_notes(self, contents: List[str]) -> List[Dict]:
+        """Process whole notes in parallel, in order."""
+        return self._map(_process_note, contents)
+
+    def search_documents(self, notes: List[Dict]) -> List[Dict]:
+        """Build search documents for notes in parallel, in order."""
+        return self._map(_search_document, notes)
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _map(self, func, items: List) -> List[Dict]:
+        if not items:
+            return []
+
+        chunksize = max(1, len(items) // (self.max_workers * 4))
+        try:
+            return list(self._pool().map(func, items, chunksize=chunksize))
+        except BrokenProcessPool:
+            # A crashed worker poisons the pool; start a fresh one next time
+            logger.exception("Render pool broke; rendering in process")
+            self.shutdown()
+            _init_worker()
+            return [func(item) for item in items]
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Forking a threaded web worker is unsafe, so start clean processes
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+
+# Shared by note saving, batch export, bulk import and reindexing
+render_pool = RenderPool()
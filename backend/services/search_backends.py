@@ -0,0 +1,265 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional
+import os
+
+# Alias of the live index version
+NOTES_INDEX = 'notes'
+
+# Note index mapping
+NOTE_MAPPING = {
+    "mappings": {
+        "properties": {
+            "title": {"type": "text"},
+            "content": {"type": "text"},
+            "code_blocks": {
+                "type": "nested",
+                "properties": {
+                    "code": {"type": "text"},
+                    "language": {"type": "keyword"},
+                    "tokens": {"type": "text"}
+                }
+            },
+            "latex_blocks": {
+                "type": "nested",
+                "properties": {
+                    "latex": {"type": "text"},
+                    "rendered": {"type": "text"}
+                }
+            },
+            "tags": {"type": "keyword"},
+            "folder_id": {"type": "keyword"},
+            "user_id": {"type": "keyword"},
+            "created_at": {"type": "date"},
+            "updated_at": {"type": "date"}
+        }
+    }
+}
+
+
+class SearchBackend(ABC):
+    """Storage and retrieval of note search documents.
+
+    Documents are built by AdvancedSearch and hold the note's text
+    fields plus nested ``code_blocks`` and ``latex_blocks``.
+    """
+
+    @abstractmethod
+    def index_documents(self, documents: Dict[str, Dict], index: Optional[str] = None) -> List[str]:
+        """Add or replace documents, keyed by note id.
+
+        Documents go to the live index unless a version created with
+        ``create_version`` is named. Returns the ids of documents that
+        were rejected; the others are written.
+        """
+        pass
+
+    @abstractmethod
+    def delete_documents(self, doc_ids: Iterable[str]):
+        """Remove documents from the index."""
+        pass
+
+    @abstractmethod
+    def create_version(self, version: int) -> str:
+        """Create an empty index version, or reopen it, and return its name."""
+        pass
+
+    @abstractmethod
+    def activate_version(self, index: str):
+        """Atomically make a version the live index and drop the others."""
+        pass
+
+    @abstractmethod
+    def optimize(self):
+        """Compact the live index."""
+        pass
+
+    @abstractmethod
+    def search(
+        self,
+        query: str,
+        user_id: str,
+        language: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        folder_id: Optional[str] = None,
+        size: int = 10
+    ) -> List[Dict]:
+        """Find a user's documents, best matches first.
+
+        Each result is the stored document with its ``score`` and, when
+        query terms were found, ``highlights`` by field.
+        """
+        pass
+
+
+class ElasticsearchBackend(SearchBackend):
+    """Search documents stored in an Elasticsearch cluster."""
+
+    def __init__(self, elasticsearch_url: str):
+        from elasticsearch import Elasticsearch
+        self.es = Elasticsearch(elasticsearch_url)
+        self._setup_indices()
+
+    def _setup_indices(self):
+        """Setup Elasticsearch indices with appropriate mappings."""
+        # Create indices if they don't exist; NOTES_INDEX may be an alias
+        if not self.es.indices.exists(index=NOTES_INDEX):
+            self.es.indices.create(index=NOTES_INDEX, body=NOTE_MAPPING)
+
+    def index_documents(self, documents: Dict[str, Dict], index: Optional[str] = None) -> List[str]:
+        from elasticsearch.helpers import bulk
+        _, errors = bulk(self.es, [
+            {'_index': index or NOTES_INDEX, '_id': doc_id, '_source': doc}
+            for doc_id, doc in documents.items()
+        ], raise_on_error=False)
+        # Each error is keyed by its action, e.g. {'index': {'_id': ..., 'error': ...}}
+        return [next(iter(error.values()))['_id'] for error in errors]
+
+    def delete_documents(self, doc_ids: Iterable[str]):
+        from elasticsearch.helpers import bulk
+        bulk(self.es, [
+            {'_op_type': 'delete', '_index': NOTES_INDEX, '_id': doc_id}
+            for doc_id in doc_ids
+        ], raise_on_error=False)
+
+    def create_version(self, version: int) -> str:
+        index = f"{NOTES_INDEX}_v{version}"
+        if not self.es.indices.exists(index=index):
+            # Refreshing during a bulk load only slows it down
+            self.es.indices.create(index=index, body={
+                **NOTE_MAPPING,
+                "settings": {"index": {"refresh_interval": "-1"}}
+            })
+        return index
+
+    def activate_version(self, index: str):
+        self.es.indices.put_settings(index=index, body={"index": {"refresh_interval": None}})
+        self.es.indices.refresh(index=index)
+
+        actions = [{"add": {"index": index, "alias": NOTES_INDEX}}]
+        if self.es.indices.exists_alias(name=NOTES_INDEX):
+            previous = self.es.indices.get_alias(name=NOTES_INDEX)
+            actions.extend(
+                {"remove_index": {"index": name}} for name in previous if name != index
+            )
+        elif self.es.indices.exists(index=NOTES_INDEX):
+            # The index created before versioning gives its name to the alias
+            actions.append({"remove_index": {"index": NOTES_INDEX}})
+        self.es.indices.update_aliases(actions=actions)
+
+    def optimize(self):
+        self.es.indices.forcemerge(index=NOTES_INDEX, max_num_segments=1)
+
+    def search(
+        self,
+        query: str,
+        user_id: str,
+        language: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        folder_id: Optional[str] = None,
+        size: int = 10
+    ) -> List[Dict]:
+        # Base query
+        must = [{"term": {"user_id": user_id}}]
+
+        # Add filters
+        if language:
+            must.append({
+                "nested": {
+                    "path": "code_blocks",
+                    "query": {
+                        "term": {"code_blocks.language": language}
+                    }
+                }
+            })
+
+        if tags:
+            must.append({"terms": {"tags": tags}})
+
+        if folder_id:
+            must.append({"term": {"folder_id": folder_id}})
+
+        # Build search query
+        search_query = {
+            "bool": {
+                "must": must,
+                "should": [
+                    # Full text search
+                    {"match": {"title": {"query": query, "boost": 2.0}}},
+                    {"match": {"content": query}},
+                    # Code search
+                    {
+                        "nested": {
+                            "path": "code_blocks",
+                            "query": {
+                                "bool": {
+                                    "should": [
+                                        {"match": {"code_blocks.code": query}},
+                                        {"match": {"code_blocks.tokens": query}}
+                                    ]
+                                }
+                            },
+                            "score_mode": "max"
+                        }
+                    },
+                    # LaTeX search
+                    {
+                        "nested": {
+                            "path": "latex_blocks",
+                            "query": {
+                                "match": {"latex_blocks.latex": query}
+                            }
+                        }
+                    }
+                ]
+            }
+        }
+
+        # Execute search
+        results = self.es.search(
+            index=NOTES_INDEX,
+            body={
+                "query": search_query,
+                "size": size,
+                "highlight": {
+                    "fields": {
+                        "title": {},
+                        "content": {},
+                        "code_blocks.code": {},
+                        "latex_blocks.latex": {}
+                    }
+                }
+            }
+        )
+
+        # Process results
+        processed_results = []
+        for hit in results['hits']['hits']:
+            result = hit['_source']
+            result['score'] = hit['_score']
+            if 'highlight' in hit:
+                result['highlights'] = hit['highlight']
+            processed_results.append(result)
+
+        return processed_results
+
+
+def create_search_backend(elasticsearch_url: Optional[str] = None) -> SearchBackend:
+    """Create the backend selected by ``SEARCH_BACKEND``.
+
+    ``auto`` uses Elasticsearch when a URL is configured and the embedded
+    on-disk engine otherwise. A configured cluster that can't be reached
+    is an error rather than a silent switch to a different index.
+    """
+    kind = os.getenv('SEARCH_BACKEND', 'auto').lower()
+    if kind not in ('auto', 'elasticsearch', 'embedded'):
+        raise ValueError(f"Unknown search backend: {kind}")
+    elasticsearch_url = elasticsearch_url or os.getenv('ELASTICSEARCH_URL')
+
+    if kind == 'elasticsearch':
+        return ElasticsearchBackend(elasticsearch_url or 'http://localhost:9200')
+
+    if kind == 'auto' and elasticsearch_url:
+        return ElasticsearchBackend(elasticsearch_url)
+
+    from services.embedded_search import EmbeddedSearchBackend
+    return EmbeddedSearchBackend()
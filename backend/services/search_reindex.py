@@ -0,0 +1,138 @@
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+import logging
+import os
+import time
+
+from services.advanced_search import SearchDocumentBuilder
+
+logger = logging.getLogger(__name__)
+
+# Values of a reindex job's state
+RUNNING = 'running'
+DONE = 'done'
+
+# Note fields used by search documents
+NOTE_FIELDS = {
+    'title': 1,
+    'content': 1,
+    'processed_content.code_blocks': 1,
+    'tags': 1,
+    'folder_id': 1,
+    'user_id': 1,
+    'created_at': 1,
+    'updated_at': 1
+}
+
+
+def _batches(cursor: Iterable[Dict], size: int) -> Iterable[List[Dict]]:
+    batch = []
+    for note in cursor:
+        batch.append(note)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ReindexService:
+    """Rebuilds the search index from MongoDB.
+
+    Notes are streamed in ``_id`` order into a new index version, with
+    their search documents built in the render pool and written in bulk.
+    Progress is saved in the ``search_reindex`` collection after every
+    batch, so an interrupted run resumes where it stopped. Once all
+    notes are loaded, notes edited during the run are loaded again and
+    the new version replaces the live index in one step.
+    """
+
+    def __init__(self, db, backend, render_pool=None, batch_size: Optional[int] = None):
+        self.db = db
+        self.backend = backend
+        self.render_pool = render_pool
+        self.batch_size = batch_size or int(os.getenv('SEARCH_REINDEX_BATCH_SIZE', 500))
+        self.builder = SearchDocumentBuilder()
+
+    def run(self, resume: bool = True, progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Reindex every note, resuming an unfinished run if there is one."""
+        job = self._start(resume)
+        index = self.backend.create_version(job['version'])
+        started_at = time.monotonic()
+        indexed = job['indexed']
+
+        query = {'_id': {'$gt': job['last_id']}} if job.get('last_id') else {}
+        notes = self.db.notes.find(query, NOTE_FIELDS).sort('_id', 1).batch_size(self.batch_size)
+        for batch in _batches(notes, self.batch_size):
+            self._load(batch, index)
+            indexed += len(batch)
+            self.db.search_reindex.update_one({'_id': job['_id']}, {'$set': {
+                'last_id': batch[-1]['_id'],
+                'indexed': indexed,
+                'updated_at': datetime.utcnow()
+            }})
+
+            stats = self._stats(job, index, indexed - job['indexed'], started_at)
+            logger.info(f"Reindexed {indexed} notes into {index} ({stats['notes_per_second']} notes/s)")
+            if progress:
+                progress({**stats, 'indexed': indexed})
+
+        # Edits saved during the run were queued for the old version
+        caught_up_at = datetime.utcnow()
+        self._load_updated_since(job['started_at'], index)
+        self.backend.activate_version(index)
+        self._load_updated_since(caught_up_at)
+
+        self.db.search_reindex.update_one({'_id': job['_id']}, {'$set': {
+            'state': DONE,
+            'indexed': indexed,
+            'finished_at': datetime.utcnow()
+        }})
+        stats = {**self._stats(job, index, indexed - job['indexed'], started_at), 'indexed': indexed}
+        logger.info(f"Reindex into {index} finished: {indexed} notes in {stats['seconds']}s")
+        return stats
+
+    def _start(self, resume: bool) -> Dict:
+        if resume:
+            job = self.db.search_reindex.find_one({'state': RUNNING}, sort=[('version', -1)])
+            if job:
+                logger.info(f"Resuming reindex version {job['version']} after {job['indexed']} notes")
+                return job
+
+        latest = self.db.search_reindex.find_one({}, sort=[('version', -1)])
+        job = {
+            'version': (latest['version'] + 1) if latest else 1,
+            'state': RUNNING,
+            'last_id': None,
+            'indexed': 0,
+            'started_at': datetime.utcnow()
+        }
+        job['_id'] = self.db.search_reindex.insert_one(job).inserted_id
+        return job
+
+    def _load(self, notes: List[Dict], index: Optional[str] = None):
+        if self.render_pool is not None and self.render_pool.should_use(len(notes)):
+            documents = self.render_pool.search_documents(notes)
+        else:
+            documents = [self.builder.build(note) for note in notes]
+        failed = self.backend.index_documents(
+            {str(note['_id']): document for note, document in zip(notes, documents)},
+            index=index
+        )
+        if failed:
+            # Progress is not saved, so a resumed run loads this batch again
+            raise RuntimeError(f"Search backend rejected {len(failed)} notes, e.g. {failed[0]}")
+
+    def _load_updated_since(self, since: datetime, index: Optional[str] = None):
+        notes = self.db.notes.find({'updated_at': {'$gte': since}}, NOTE_FIELDS).batch_size(self.batch_size)
+        for batch in _batches(notes, self.batch_size):
+            self._load(batch, index)
+
+    def _stats(self, job: Dict, index: str, loaded: int, started_at: float) -> Dict:
+        seconds = time.monotonic() - started_at
+        return {
+            'version': job['version'],
+            'index': index,
+            'seconds': round(seconds, 1),
+            'notes_per_second': round(loaded / seconds) if seconds else 0
+        }
@@ -0,0 +1,193 @@
+from typing import Dict, Optional
+import json
+import logging
+import os
+import re
+import select
+import subprocess
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Reads one JSON request per line and compiles the snippet without running it
+NODE_VALIDATOR_SCRIPT = r"""
+const vm = require('vm');
+const readline = require('readline');
+const rl = readline.createInterface({input: process.stdin});
+rl.on('line', (line) => {
+  const request = JSON.parse(line);
+  const response = {id: request.id, valid: true};
+  try {
+    new vm.Script(request.code, {filename: 'snippet.js'});
+  } catch (e) {
+    const location = /snippet\.js:(\d+)/.exec(e.stack || '');
+    response.valid = false;
+    response.message = `${e.name}: ${e.message}`;
+    response.line = location ? Number(location[1]) : null;
+  }
+  process.stdout.write(JSON.stringify(response) + '\n');
+});
+"""
+
+# tree-sitter grammar names for the languages validated by parsing
+TREE_SITTER_LANGUAGES = {
+    'java': 'java',
+    'cpp': 'cpp',
+    'ruby': 'ruby'
+}
+
+
+class ValidatorUnavailable(Exception):
+    """Raised when a validator backend cannot be used."""
+    pass
+
+
+class NodeSyntaxValidator:
+    """JavaScript syntax checks in a long-lived node process.
+
+    Snippets are sent over stdin instead of forking ``node --check`` for
+    each one. The process is restarted if it dies or stops responding.
+    """
+
+    def __init__(self, node_path: str = 'node', timeout: Optional[float] = None):
+        self.node_path = node_path
+        self.timeout = timeout or float(os.getenv('CODE_VALIDATOR_TIMEOUT', 2))
+        self._process = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def validate(self, code: str) -> Dict:
+        """Check a snippet, restarting the worker once if it failed."""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    return self._request(code)
+                except (OSError, ValueError, ValidatorUnavailable) as e:
+                    self._stop()
+                    if attempt:
+                        raise ValidatorUnavailable(f"Node validator failed: {str(e)}")
+
+    def close(self):
+        """Stop the node process."""
+        with self._lock:
+            self._stop()
+
+    def _request(self, code: str) -> Dict:
+        process = self._ensure_process()
+        self._next_id += 1
+        process.stdin.write(json.dumps({'id': self._next_id, 'code': code}) + '\n')
+        process.stdin.flush()
+
+        ready, _, _ = select.select([process.stdout], [], [], self.timeout)
+        if not ready:
+            raise ValidatorUnavailable('timed out')
+        line = process.stdout.readline()
+        if not line:
+            raise ValidatorUnavailable('process exited')
+
+        response = json.loads(line)
+        if response['valid']:
+            return {'valid': True, 'errors': None}
+        return {
+            'valid': False,
+            'errors': {
+                'line': response.get('line'),
+                'message': response.get('message')
+            }
+        }
+
+    def _ensure_process(self) -> subprocess.Popen:
+        if self._process is None or self._process.poll() is not None:
+            self._process = subprocess.Popen(
+                [self.node_path, '-e', NODE_VALIDATOR_SCRIPT],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1
+            )
+        return self._process
+
+    def _stop(self):
+        if self._process is not None:
+            try:
+                self._process.kill()
+                self._process.wait(timeout=1)
+            except Exception:
+                pass
+            self._process = None
+
+
+class TreeSitterValidator:
+    """In-process syntax checks for java, cpp and ruby using tree-sitter.
+
+    Parsers are created once per language. When the optional
+    ``tree_sitter_languages`` package is not installed every snippet is
+    reported as valid, as before.
+    """
+
+    def __init__(self):
+        self._parsers = {}
+        self._lock = threading.Lock()
+
+    def supports(self, language: str) -> bool:
+        return language in TREE_SITTER_LANGUAGES
+
+    def validate(self, code: str, language: str) -> Dict:
+        """Parse a snippet and report the first syntax error."""
+        parser = self._parser(language)
+        if parser is None:
+            return {'valid': True, 'errors': None}
+
+        tree = parser.parse(code.encode('utf-8'))
+        if not tree.root_node.has_error:
+            return {'valid': True, 'errors': None}
+
+        node = self._first_error(tree.root_node)
+        if node is None:
+            return {'valid': False, 'errors': {'message': 'Syntax error'}}
+
+        line, column = node.start_point
+        if node.is_missing:
+            message = f"Missing {node.type}"
+        else:
+            message = f"Unexpected {self._snippet(code, node)!r}"
+        return {
+            'valid': False,
+            'errors': {
+                'line': line + 1,
+                'offset': column + 1,
+                'message': message
+            }
+        }
+
+    def _parser(self, language: str):
+        with self._lock:
+            if language not in self._parsers:
+                try:
+                    from tree_sitter_languages import get_parser
+                    self._parsers[language] = get_parser(TREE_SITTER_LANGUAGES[language])
+                except ImportError:
+                    logger.info("tree_sitter_languages is not installed; skipping syntax validation")
+                    self._parsers[language] = None
+                except Exception:
+                    # e.g. a tree-sitter release the bundled grammars don't support
+                    logger.exception(f"Could not load the {language} parser; skipping syntax validation")
+                    self._parsers[language] = None
+            return self._parsers[language]
+
+    def _first_error(self, root):
+        """Find the first ERROR or MISSING node in document order."""
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node.type == 'ERROR' or node.is_missing:
+                return node
+            if node.has_error:
+                stack.extend(reversed(node.children))
+        return None
+
+    def _snippet(self, code: str, node) -> str:
+        text = code.encode('utf-8')[node.start_byte:node.end_byte].decode('utf-8', errors='replace')
+        text = re.sub(r'\s+', ' ', text).strip()
+        return text[:40]
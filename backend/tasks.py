@@ -2,7 +2,6 @@ from celery import Celery
 from celery.schedules import crontab
 import os
 from services.export import ExportService
-from services.ai_service import AIService
 from services.version_control import VersionControlService
 
 celery = Celery(
@@ -21,6 +20,10 @@ celery.conf.update(
     task_track_started=True,
     task_time_limit=3600,  # 1 hour
     task_soft_time_limit=3300,  # 55 minutes
+    task_routes={
+        # Run on workers that can reach the Docker daemon
+        'tasks.execute_code': {'queue': 'code_execution'}
+    }
 )
 
 # Export tasks
@@ -38,22 +41,138 @@ def export_notes(self, note_ids, format, user_id):
         self.retry(exc=e, countdown=60, max_retries=3)
 
 # AI tasks
+_ai_service = None
+
+def get_ai_service():
+    """Get the worker's AI service, built once per worker process."""
+    global _ai_service
+    if _ai_service is None:
+        from services.ai_service import AIService
+        _ai_service = AIService()
+    return _ai_service
+
 @celery.task(bind=True, name='tasks.process_ai_requests')
-def process_ai_requests(self, operation, content, **kwargs):
-    """Process AI requests asynchronously."""
+def process_ai_requests(self, operation, content, note_id=None, **kwargs):
+    """Process AI requests asynchronously.
+    
+    Results go through the AI result cache, so a job for content that was
+    already processed finishes immediately and later synchronous requests
+    are served from the cache.
+    """
+    from services.ai_cache import ai_cache
+    from services.ai_service import OPERATION_MODELS
+    
+    if operation not in OPERATION_MODELS:
+        raise ValueError(f"Unsupported AI operation: {operation}")
+    
     try:
-        ai_service = AIService()
-        if operation == 'summarize':
-            return ai_service.summarize_note(content, kwargs.get('max_length', 150))
-        elif operation == 'explain_code':
-            return ai_service.explain_code(content, kwargs.get('language'))
-        elif operation == 'suggest_improvements':
-            return ai_service.suggest_improvements(content, kwargs.get('language'))
-        elif operation == 'study_questions':
-            return ai_service.generate_study_questions(content)
+        self.update_state(state='PROGRESS', meta={'stage': 'loading', 'progress': 0.1})
+        ai_service = get_ai_service()
+        
+        def compute():
+            self.update_state(state='PROGRESS', meta={'stage': 'running', 'progress': 0.3})
+            if operation == 'summarize':
+                return ai_service.summarize_note(content, kwargs.get('max_length', 150))
+            elif operation == 'explain_code':
+                return ai_service.explain_code(content, kwargs.get('language'))
+            elif operation == 'suggest_improvements':
+                return ai_service.suggest_improvements(content, kwargs.get('language'))
+            elif operation == 'study_questions':
+                return ai_service.generate_study_questions(content)
+        
+        result, _ = ai_cache.get_or_compute(
+            operation,
+            OPERATION_MODELS[operation],
+            kwargs,
+            content,
+            compute,
+            note_id=note_id
+        )
+        return result
     except Exception as e:
         self.retry(exc=e, countdown=30, max_retries=2)
 
+# Code execution tasks
+_code_executor = None
+
+def get_code_executor():
+    """Get the worker's code executor and its warm container pool."""
+    global _code_executor
+    if _code_executor is None:
+        from services.code_executor import CodeExecutor
+        _code_executor = CodeExecutor()
+    return _code_executor
+
+_socketio_emitter = None
+
+def get_socketio_emitter():
+    """Get the worker's Socket.IO emitter, or None without a message queue."""
+    global _socketio_emitter
+    message_queue = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    if _socketio_emitter is None and message_queue:
+        from flask_socketio import SocketIO
+        _socketio_emitter = SocketIO(message_queue=message_queue)
+    return _socketio_emitter
+
+def _push_execution_result(job_id, result):
+    """Send a finished execution to clients watching the job."""
+    emitter = get_socketio_emitter()
+    if emitter is None:
+        return
+    
+    from services.execution_jobs import execution_room
+    
+    emitter.emit(
+        'execution_result',
+        {'job_id': job_id, 'result': result},
+        room=execution_room(job_id)
+    )
+
+@celery.task(bind=True, name='tasks.execute_code', soft_time_limit=300, time_limit=330)
+def execute_code(self, code, language, timeout=30, stdin=None, use_cache=True):
+    """Execute a code snippet off the web tier."""
+    result = get_code_executor().execute_code(
+        code=code,
+        language=language,
+        timeout=timeout,
+        stdin=stdin,
+        use_cache=use_cache
+    )
+    try:
+        _push_execution_result(self.request.id, result)
+    except Exception:
+        # Clients can still poll for the result
+        pass
+    return result
+
+# Content processing tasks
+_note_processing = None
+
+def get_note_processing_service():
+    """Get the worker's note processing service, built once per worker process."""
+    global _note_processing
+    if _note_processing is None:
+        from pymongo import MongoClient
+        from services.advanced_search import AdvancedSearch
+        from services.content_processor import ContentProcessor
+        from services.note_processing import NoteProcessingService
+        
+        client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/skriptd'))
+        _note_processing = NoteProcessingService(
+            client.get_default_database(),
+            content_processor=ContentProcessor(),
+            search=AdvancedSearch(elasticsearch_url=os.getenv('ELASTICSEARCH_URL'))
+        )
+    return _note_processing
+
+@celery.task(bind=True, name='tasks.process_note')
+def process_note(self, note_id):
+    """Render, extract and index a saved note."""
+    try:
+        return get_note_processing_service().process(note_id)
+    except Exception as e:
+        self.retry(exc=e, countdown=10, max_retries=3)
+
 # Version control tasks
 @celery.task(name='tasks.backup_repositories')
 def backup_repositories():
@@ -70,10 +189,39 @@ def cleanup_exports():
 
 @celery.task(name='tasks.optimize_search_index')
 def optimize_search_index():
-    """Optimize Elasticsearch index."""
+    """Compact the live search index."""
     from services.advanced_search import AdvancedSearch
-    search_service = AdvancedSearch()
-    return search_service.optimize_index()
+    search_service = AdvancedSearch(elasticsearch_url=os.getenv('ELASTICSEARCH_URL'))
+    search_service.optimize_index()
+    return {'status': 'success'}
+
+@celery.task(bind=True, name='tasks.reindex_search', soft_time_limit=6 * 3600, time_limit=6 * 3600 + 300)
+def reindex_search(self, resume=True):
+    """Rebuild the search index from MongoDB."""
+    from celery.exceptions import SoftTimeLimitExceeded
+    from pymongo import MongoClient
+    from services.search_backends import create_search_backend
+    from services.search_reindex import ReindexService
+    
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/skriptd'))
+    # Celery workers are daemonic and cannot start a process pool;
+    # the reindex.py command uses one
+    service = ReindexService(
+        client.get_default_database(),
+        create_search_backend(os.getenv('ELASTICSEARCH_URL')),
+        render_pool=None
+    )
+    try:
+        return service.run(
+            resume=resume,
+            progress=lambda stats: self.update_state(state='PROGRESS', meta=stats)
+        )
+    except SoftTimeLimitExceeded:
+        # Progress is saved after every batch; carry on in a fresh task
+        reindex_search.delay(resume=True)
+        return {'status': 'continued'}
+    finally:
+        client.close()
 
 # Schedule periodic tasks
 @celery.on_after_configure.connect
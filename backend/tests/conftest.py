@@ -64,3 +64,39 @@ def test_note(app, test_notes_with_versions):
 def test_tag(app, test_notes_with_tags):
     """Create a test tag."""
     return test_notes_with_tags['tags'][0]
+
+class FakeCacheService:
+    """In-memory stand-in for CacheService."""
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+        return True
+
+    def add(self, key, value, timeout=None):
+        if key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    def add_to_set(self, key, member, timeout=None):
+        members = self.data.setdefault(key, set())
+        if member in members:
+            return False
+        members.add(member)
+        return True
+
+    def is_member(self, key, member):
+        return member in self.data.get(key, set())
+
+    def delete(self, key):
+        return self.data.pop(key, None) is not None
+
+@pytest.fixture
+def fake_cache():
+    """Create an in-memory CacheService."""
+    return FakeCacheService()
@@ -75,3 +75,372 @@ def test_generate_study_questions(ai_service, mock_openai):
     assert isinstance(questions, list)
     assert len(questions) > 0
     mock_openai.Completion.create.assert_called_once()
+
+@pytest.fixture
+def inference_server(tmp_path):
+    from services.inference_server import InferenceServer, SUMMARIZATION
+    import threading
+    import time
+
+    address = str(tmp_path / 'inference.sock')
+    fake_summarizer = Mock(
+        side_effect=lambda inputs, **kwargs: [{'summary_text': 'Shared summary'} for _ in inputs]
+    )
+    server = InferenceServer(
+        address,
+        authkey=b'test',
+        pipelines={SUMMARIZATION: fake_summarizer}
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Wait for the listener socket to appear
+    for _ in range(50):
+        if (tmp_path / 'inference.sock').exists():
+            break
+        time.sleep(0.01)
+
+    yield address, fake_summarizer
+    server.stop()
+
+def test_inference_client_uses_shared_server(inference_server):
+    from services.inference_server import InferenceClient, SUMMARIZATION
+    address, fake_summarizer = inference_server
+
+    client = InferenceClient(address, authkey=b'test')
+    result = client.pipeline(SUMMARIZATION)('Some text', max_length=50)
+
+    assert result == [{'summary_text': 'Shared summary'}]
+    fake_summarizer.assert_called_once_with(['Some text'], batch_size=1, max_length=50)
+
+def test_inference_client_reports_server_errors(inference_server):
+    from services.inference_server import InferenceClient, InferenceError
+    address, _ = inference_server
+
+    client = InferenceClient(address, authkey=b'test')
+    with pytest.raises(InferenceError):
+        client.request('unknown-task', 'Some text')
+
+def test_inference_socket_is_private(inference_server):
+    from services.inference_server import InferenceClient, SUMMARIZATION
+    import os
+    import stat
+    address, _ = inference_server
+
+    InferenceClient(address, authkey=b'test').request(SUMMARIZATION, 'Some text')
+
+    assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+
+def test_inference_client_requires_authkey(monkeypatch):
+    from services.inference_server import InferenceClient, InferenceError
+    monkeypatch.delenv('AI_INFERENCE_AUTHKEY', raising=False)
+
+    with pytest.raises(InferenceError):
+        InferenceClient('/tmp/inference.sock')
+
+def test_micro_batcher_combines_concurrent_inputs():
+    from services.batching import MicroBatcher, BatchedPipeline
+    from concurrent.futures import ThreadPoolExecutor
+
+    fake_pipeline = Mock(
+        side_effect=lambda inputs, **kwargs: [{'summary_text': text.upper()} for text in inputs]
+    )
+    summarizer = BatchedPipeline(
+        MicroBatcher(fake_pipeline, name='test', max_batch_size=8, max_wait_ms=50)
+    )
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda text: summarizer(text, max_length=20), 'abcdefgh'))
+
+    assert [result[0]['summary_text'] for result in results] == list('ABCDEFGH')
+    assert fake_pipeline.call_count < 8
+
+def test_micro_batcher_separates_parameters():
+    from services.batching import MicroBatcher
+
+    fake_pipeline = Mock(side_effect=lambda inputs, **kwargs: [kwargs['max_length']] * len(inputs))
+    batcher = MicroBatcher(fake_pipeline, name='test', max_batch_size=4, max_wait_ms=50)
+
+    short = batcher.submit('a', max_length=10)
+    long = batcher.submit('b', max_length=100)
+
+    assert short.result(timeout=1) == 10
+    assert long.result(timeout=1) == 100
+
+def test_micro_batcher_propagates_errors():
+    from services.batching import MicroBatcher
+
+    batcher = MicroBatcher(Mock(side_effect=RuntimeError('OOM')), name='test', max_wait_ms=1)
+
+    with pytest.raises(RuntimeError):
+        batcher.submit('a').result(timeout=1)
+
+def test_micro_batcher_fails_batch_with_missing_outputs():
+    from services.batching import MicroBatcher
+
+    batcher = MicroBatcher(Mock(return_value=['only one']), name='test', max_batch_size=2, max_wait_ms=50)
+
+    first = batcher.submit('a')
+    second = batcher.submit('b')
+
+    for future in (first, second):
+        with pytest.raises(RuntimeError):
+            future.result(timeout=1)
+
+def test_batched_pipeline_times_out():
+    from services.batching import MicroBatcher, BatchedPipeline
+    from concurrent.futures import TimeoutError
+    import threading
+
+    release = threading.Event()
+    batcher = MicroBatcher(Mock(side_effect=lambda inputs, **kwargs: release.wait()), name='test', max_wait_ms=1)
+
+    with pytest.raises(TimeoutError):
+        BatchedPipeline(batcher, timeout=0.05)('a')
+    release.set()
+
+def test_ai_cache_returns_hit_for_unchanged_content(tmp_path, fake_cache):
+    from services.ai_cache import AIResultCache
+
+    cache = AIResultCache(cache_service=fake_cache, cache_dir=str(tmp_path))
+    compute = Mock(return_value='Summary')
+
+    first = cache.get_or_compute('summarize', 'bart', {'max_length': 150}, 'content', compute)
+    second = cache.get_or_compute('summarize', 'bart', {'max_length': 150}, 'content', compute)
+    changed = cache.get_or_compute('summarize', 'bart', {'max_length': 100}, 'content', compute)
+
+    assert first == ('Summary', False)
+    assert second == ('Summary', True)
+    assert changed == ('Summary', False)
+    assert compute.call_count == 2
+
+def test_ai_cache_skips_errors(tmp_path, fake_cache):
+    from services.ai_cache import AIResultCache
+
+    cache = AIResultCache(cache_service=fake_cache, cache_dir=str(tmp_path))
+    compute = Mock(return_value={'error': 'rate limited', 'language': 'python'})
+
+    cache.get_or_compute('explain_code', 'gpt-4', {}, 'code', compute)
+    cache.get_or_compute('explain_code', 'gpt-4', {}, 'code', compute)
+
+    assert compute.call_count == 2
+
+def test_ai_cache_invalidates_note(tmp_path, fake_cache):
+    from services.ai_cache import AIResultCache
+
+    cache = AIResultCache(cache_service=fake_cache, cache_dir=str(tmp_path))
+    compute = Mock(return_value='Summary')
+
+    cache.get_or_compute('summarize', 'bart', {}, 'content', compute, note_id='n1')
+    cache.get_or_compute('summarize', 'bart', {}, 'edited', compute, note_id='n1')
+    cache.invalidate_note('n1', 'content')
+
+    _, old_hit = cache.get_or_compute('summarize', 'bart', {}, 'content', compute, note_id='n1')
+    _, new_hit = cache.get_or_compute('summarize', 'bart', {}, 'edited', compute, note_id='n1')
+    assert old_hit is False
+    assert new_hit is True
+
+def test_ai_cache_falls_back_to_disk(tmp_path):
+    from services.ai_cache import AIResultCache
+
+    redis_down = Mock()
+    redis_down.get.side_effect = ConnectionError('redis down')
+    redis_down.set.return_value = False
+    cache = AIResultCache(cache_service=redis_down, cache_dir=str(tmp_path))
+    compute = Mock(return_value=[{'question': 'Q', 'answer': 'A', 'explanation': 'E'}])
+
+    cache.get_or_compute('study_questions', 'gpt-4', {}, 'content', compute)
+    result, hit = cache.get_or_compute('study_questions', 'gpt-4', {}, 'content', compute)
+
+    assert hit is True
+    assert result == compute.return_value
+    compute.assert_called_once()
+
+def _stream_chunk(text):
+    chunk = Mock()
+    chunk.choices = [Mock(delta=Mock(content=text))]
+    return chunk
+
+def test_stream_explain_code(mock_openai):
+    inference_client = Mock()
+    inference_client.pipeline.return_value = Mock(return_value=[{'generated_text': 'Prints hello'}])
+    service = AIService(inference_client=inference_client)
+    service.openai_client.chat.completions.create.return_value = iter(
+        [_stream_chunk('This '), _stream_chunk('prints'), _stream_chunk(None)]
+    )
+
+    events = list(service.stream_explain_code("print('hello')", 'python'))
+
+    assert events[:2] == [{'token': 'This '}, {'token': 'prints'}]
+    assert events[-1]['result']['detailed_explanation'] == 'This prints'
+    assert events[-1]['result']['simple_explanation'] == 'Prints hello'
+    _, kwargs = service.openai_client.chat.completions.create.call_args
+    assert kwargs['stream'] is True
+
+def test_stream_study_questions_parses_result(mock_openai):
+    service = AIService(inference_client=Mock())
+    service.openai_client.chat.completions.create.return_value = iter(
+        [_stream_chunk('Q: What is Python?\nA: A language\n'), _stream_chunk('Explanation: It is.')]
+    )
+
+    events = list(service.stream_study_questions('Python is a programming language.'))
+
+    assert events[-1]['result'] == [{
+        'question': 'What is Python?',
+        'answer': 'A language',
+        'explanation': 'It is.'
+    }]
+
+def test_explain_code_degrades_when_local_model_is_slow(mock_openai):
+    import threading
+    release = threading.Event()
+    inference_client = Mock()
+    inference_client.pipeline.return_value = Mock(
+        side_effect=lambda *args, **kwargs: release.wait(5) and [{'generated_text': 'late'}]
+    )
+    service = AIService(inference_client=inference_client)
+    service.local_model_timeout = 0.1
+    service.openai_client.chat.completions.create.return_value = Mock(
+        choices=[Mock(message=Mock(content='Detailed'))]
+    )
+
+    explanation = service.explain_code("print('hello')", 'python')
+    release.set()
+
+    assert explanation['detailed_explanation'] == 'Detailed'
+    assert explanation['simple_explanation'] is None
+    assert explanation['degraded'] is True
+    assert 'simple_explanation' in explanation['errors']
+
+def test_explain_code_fails_when_both_sides_fail(mock_openai):
+    inference_client = Mock()
+    inference_client.pipeline.return_value = Mock(side_effect=RuntimeError('model down'))
+    service = AIService(inference_client=inference_client)
+    service.openai_client.chat.completions.create.side_effect = RuntimeError('api down')
+
+    explanation = service.explain_code("print('hello')", 'python')
+
+    assert 'error' in explanation
+
+def test_summarize_note_only_resummarizes_changed_chunks(mock_openai, tmp_path, fake_cache):
+    from services.ai_cache import AIResultCache
+
+    summarized = []
+    final_passes = []
+    def fake_summarizer(inputs, **kwargs):
+        if isinstance(inputs, str):
+            final_passes.append((inputs, kwargs['max_length']))
+            return [{'summary_text': 'final summary'}]
+        summarized.extend(inputs)
+        return [{'summary_text': f'summary {len(summarized)}'} for _ in inputs]
+
+    inference_client = Mock()
+    inference_client.pipeline.return_value = fake_summarizer
+    service = AIService(
+        inference_client=inference_client,
+        chunk_cache=AIResultCache(cache_service=fake_cache, cache_dir=str(tmp_path))
+    )
+    paragraphs = [f'Paragraph {i}. ' + 'Lecture notes about algorithms. ' * 20 for i in range(6)]
+
+    service.summarize_note('\n\n'.join(paragraphs), max_length=600)
+    first_run = len(summarized)
+    paragraphs[3] = paragraphs[3].replace('algorithms', 'data structures', 1)
+    service.summarize_note('\n\n'.join(paragraphs), max_length=600)
+
+    assert first_run == 6
+    assert len(summarized) - first_run == 1
+
+    # A new chunk leaves the summaries of the others valid
+    paragraphs.append('Paragraph 6. ' + 'Lecture notes about graphs. ' * 20)
+    service.summarize_note('\n\n'.join(paragraphs), max_length=600)
+    assert len(summarized) - first_run == 2
+
+def test_summarize_note_bounds_long_notes_by_max_length(mock_openai, tmp_path, fake_cache):
+    from services.ai_cache import AIResultCache
+
+    summarizer = Mock(side_effect=lambda inputs, **kwargs: (
+        [{'summary_text': 'short'}] if isinstance(inputs, str)
+        else [{'summary_text': 'chunk summary'} for _ in inputs]
+    ))
+    inference_client = Mock()
+    inference_client.pipeline.return_value = summarizer
+    service = AIService(
+        inference_client=inference_client,
+        chunk_cache=AIResultCache(cache_service=fake_cache, cache_dir=str(tmp_path))
+    )
+    content = '\n\n'.join('Lecture notes about algorithms. ' * 20 for _ in range(4))
+
+    first = service.summarize_note(content, max_length=40)
+    second = service.summarize_note(content, max_length=40)
+
+    assert first == second == 'short'
+    final_calls = [c for c in summarizer.call_args_list if isinstance(c.args[0], str)]
+    assert len(final_calls) == 1
+    assert final_calls[0].kwargs['max_length'] == 40
+    assert final_calls[0].args[0] == ' '.join(['chunk summary'] * 4)
+
+def test_ai_jobs_deduplicate_in_flight_requests(fake_cache):
+    from services.ai_jobs import AIJobService
+
+    jobs = AIJobService(cache_service=fake_cache)
+    with patch('tasks.process_ai_requests') as mock_task, \
+            patch.object(AIJobService, '_state', return_value='PROGRESS'):
+        first = jobs.submit('summarize', {'max_length': 150}, 'content', user_id='u1', note_id='n1')
+        second = jobs.submit('summarize', {'max_length': 150}, 'content', user_id='u2', note_id='n1')
+
+    assert first == {'job_id': first['job_id'], 'state': 'PENDING', 'deduplicated': False}
+    assert second['job_id'] == first['job_id']
+    assert second['deduplicated'] is True
+    mock_task.apply_async.assert_called_once_with(
+        args=['summarize', 'content'],
+        kwargs={'note_id': 'n1', 'max_length': 150},
+        task_id=first['job_id']
+    )
+
+def test_ai_jobs_replace_a_finished_job_once(fake_cache):
+    from services.ai_jobs import AIJobService
+
+    jobs = AIJobService(cache_service=fake_cache)
+    states = {}
+    with patch('tasks.process_ai_requests') as mock_task, \
+            patch.object(AIJobService, '_state', side_effect=lambda job_id: states.get(job_id, 'PENDING')):
+        first = jobs.submit('summarize', {}, 'content', user_id='u1')
+        states[first['job_id']] = 'SUCCESS'
+
+        second = jobs.submit('summarize', {}, 'content', user_id='u1')
+        third = jobs.submit('summarize', {}, 'content', user_id='u2')
+
+    assert second['deduplicated'] is False
+    assert second['job_id'] != first['job_id']
+    assert third == {'job_id': second['job_id'], 'state': 'PENDING', 'deduplicated': True}
+    assert mock_task.apply_async.call_count == 2
+
+def test_ai_job_status_reports_result_to_owner_only(fake_cache):
+    from services.ai_jobs import AIJobService
+
+    jobs = AIJobService(cache_service=fake_cache)
+    with patch('tasks.process_ai_requests'):
+        job_id = jobs.submit('summarize', {'max_length': 150}, 'content', user_id='u1')['job_id']
+
+    finished = Mock(state='SUCCESS', result='Summary')
+    with patch.object(AIJobService, '_async_result', return_value=finished):
+        status = jobs.get_status(job_id, 'u1')
+        other_user = jobs.get_status(job_id, 'u2')
+
+    assert status['result'] == {'summary': 'Summary'}
+    assert status['progress'] == 1.0
+    assert other_user is None
+
+def test_ai_job_status_is_shared_with_deduplicated_users(fake_cache):
+    from services.ai_jobs import AIJobService
+
+    jobs = AIJobService(cache_service=fake_cache)
+    with patch('tasks.process_ai_requests'), \
+            patch.object(AIJobService, '_state', return_value='PROGRESS'):
+        job_id = jobs.submit('summarize', {}, 'content', user_id='u1')['job_id']
+        jobs.submit('summarize', {}, 'content', user_id='u2')
+
+    running = Mock(state='PROGRESS', info={'stage': 'running', 'progress': 0.3})
+    with patch.object(AIJobService, '_async_result', return_value=running):
+        assert jobs.get_status(job_id, 'u1')['stage'] == 'running'
+        assert jobs.get_status(job_id, 'u2')['stage'] == 'running'
+        assert jobs.get_status(job_id, 'u3') is None
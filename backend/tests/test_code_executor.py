@@ -0,0 +1,296 @@
+import pytest
+import os
+import shutil
+import time
+from unittest.mock import Mock, patch
+from services.artifact_cache import ArtifactCache
+from services.batch_executor import BatchExecutor
+from services.container_pool import ContainerPool
+from services.code_executor import CodeExecutor
+from services.execution_cache import ExecutionResultCache
+from services.syntax_validators import NodeSyntaxValidator, TreeSitterValidator
+
+@pytest.fixture
+def docker_client():
+    client = Mock()
+    client.containers.run.side_effect = lambda **kwargs: Mock()
+    client.images.pull.side_effect = lambda image: Mock(id=f'sha256:{image}')
+    return client
+
+@pytest.fixture
+def code_executor(docker_client, tmp_path, monkeypatch):
+    monkeypatch.setenv('CODE_ARTIFACT_CACHE_DIR', str(tmp_path / 'artifacts'))
+    with patch('services.code_executor.docker') as mock_docker, \
+            patch.object(ContainerPool, 'start'):
+        mock_docker.from_env.return_value = docker_client
+        yield CodeExecutor()
+
+@pytest.fixture
+def pooled(tmp_path):
+    work_dir = tmp_path / 'work'
+    work_dir.mkdir()
+    return Mock(work_dir=str(work_dir))
+
+def _wait_for_pool(pool, language, size):
+    for _ in range(100):
+        if pool._idle[language].qsize() >= size:
+            return
+        time.sleep(0.01)
+
+def test_pool_fills_in_background(docker_client):
+    pool = ContainerPool(docker_client, {'python': 'python:3.9-slim'}, size=2)
+
+    assert pool.acquire('python') is None
+    pool.start()
+    _wait_for_pool(pool, 'python', 2)
+
+    assert pool.acquire('python') is not None
+    _, kwargs = docker_client.containers.run.call_args
+    assert kwargs['network_mode'] == 'none'
+    assert kwargs['read_only'] is True
+    pool.shutdown()
+
+def test_pool_discards_used_containers(docker_client):
+    pool = ContainerPool(docker_client, {'python': 'python:3.9-slim'}, size=1, max_runs=1)
+    pool.start()
+    _wait_for_pool(pool, 'python', 1)
+
+    pooled = pool.acquire('python')
+    pool.release('python', pooled)
+
+    for _ in range(100):
+        if not os.path.exists(pooled.work_dir):
+            break
+        time.sleep(0.01)
+    pooled.container.remove.assert_called_once_with(force=True)
+    assert not os.path.exists(pooled.work_dir)
+    pool.shutdown()
+
+def test_execute_code_uses_warm_container(code_executor, pooled):
+    pooled.container.exec_run.return_value = (0, b'Hello\n')
+    code_executor.pool = Mock()
+    code_executor.pool.acquire.return_value = pooled
+
+    result = code_executor.execute_code("print('Hello')", 'python')
+
+    assert result == {'success': True, 'output': 'Hello\n', 'error': None}
+    with open(os.path.join(pooled.work_dir, 'code.py')) as f:
+        assert f.read() == "print('Hello')"
+    args, _ = pooled.container.exec_run.call_args
+    assert 'python /code/code.py' in args[0][-1]
+    code_executor.pool.release.assert_called_once_with('python', pooled, reusable=True)
+
+def test_execute_code_starts_container_when_pool_is_empty(code_executor, pooled):
+    pooled.container.exec_run.return_value = (0, b'Hello\n')
+    code_executor.pool = Mock()
+    code_executor.pool.acquire.return_value = None
+    code_executor.pool.create.return_value = pooled
+
+    result = code_executor.execute_code("print('Hello')", 'python')
+
+    assert result['success'] is True
+    code_executor.pool.create.assert_called_once_with('python')
+
+def test_compiled_artifacts_are_reused(code_executor, pooled):
+    def exec_run(cmd, **kwargs):
+        if kwargs.get('demux'):
+            return 0, (b'compiled-archive', None)
+        return 0, b'Hello\n'
+
+    pooled.container.exec_run.side_effect = exec_run
+    code_executor.pool = Mock()
+    code_executor.pool.acquire.return_value = pooled
+    code = '#include <iostream>\nint main() { std::cout << "Hello"; }'
+
+    code_executor.execute_code(code, 'cpp')
+    first_scripts = [call.args[0][-1] for call in pooled.container.exec_run.call_args_list]
+    pooled.container.exec_run.reset_mock()
+    result = code_executor.execute_code(code, 'cpp')
+    second_scripts = [call.args[0][-1] for call in pooled.container.exec_run.call_args_list]
+
+    assert result['success'] is True
+    assert any('g++' in script for script in first_scripts)
+    assert any('/sandbox/build/program' in script for script in first_scripts)
+    assert not any('g++' in script for script in second_scripts)
+    assert any('tar -xf /code/artifact.tar' in script for script in second_scripts)
+
+def test_java_file_named_after_public_class(code_executor, pooled):
+    info = code_executor._prepare_code_file(
+        'public class Greeter { public static void main(String[] a) {} }',
+        'java',
+        pooled.work_dir
+    )
+
+    assert info['file'] == 'Greeter.java'
+    assert info['command'] == 'java -cp /sandbox/build Greeter'
+
+def test_artifact_cache_evicts_least_recently_used(tmp_path):
+    cache = ArtifactCache(cache_dir=str(tmp_path), max_bytes=10)
+
+    cache.put('old', b'12345')
+    time.sleep(0.01)
+    cache.put('recent', b'12345')
+    os.utime(os.path.join(str(tmp_path), 'old.tar'), (0, 0))
+    assert cache.get('recent') == b'12345'
+    cache.put('new', b'12345')
+
+    assert cache.get('old') is None
+    assert cache.get('recent') == b'12345'
+    assert cache.get('new') == b'12345'
+
+def test_batch_streams_results_as_blocks_finish():
+    executor = Mock(SUPPORTED_LANGUAGES=CodeExecutor.SUPPORTED_LANGUAGES)
+    delays = {'slow': 0.2, 'fast': 0}
+
+    def execute_code(code, language, timeout, use_cache):
+        time.sleep(delays[code])
+        return {'success': True, 'output': code, 'error': None}
+
+    executor.execute_code.side_effect = execute_code
+    batch = BatchExecutor(executor, max_workers=2, per_user_limit=2)
+    blocks = [
+        {'code': 'slow', 'language': 'python'},
+        {'code': 'fast', 'language': 'js'},
+        {'code': 'fast', 'language': 'text'}
+    ]
+
+    results = list(batch.run('user1', blocks))
+
+    assert [r['index'] for r in results][-1] == 0
+    assert {r['index'] for r in results} == {0, 1, 2}
+    by_index = {r['index']: r for r in results}
+    assert by_index[1]['language'] == 'javascript'
+    assert by_index[2]['success'] is False
+    batch.shutdown()
+
+def test_batch_caps_concurrency_per_user():
+    executor = Mock(SUPPORTED_LANGUAGES=CodeExecutor.SUPPORTED_LANGUAGES)
+    running = []
+    peak = []
+
+    def execute_code(code, language, timeout, use_cache):
+        running.append(code)
+        peak.append(len(running))
+        time.sleep(0.02)
+        running.remove(code)
+        return {'success': True, 'output': '', 'error': None}
+
+    executor.execute_code.side_effect = execute_code
+    batch = BatchExecutor(executor, max_workers=4, per_user_limit=2)
+    blocks = [{'code': str(i), 'language': 'python'} for i in range(6)]
+
+    results = list(batch.run('user1', blocks))
+
+    assert len(results) == 6
+    assert max(peak) <= 2
+    # Users without running blocks are not tracked
+    assert batch._running == {}
+    batch.shutdown()
+
+def test_batch_rejects_too_many_blocks():
+    batch = BatchExecutor(Mock(), max_blocks=1)
+    blocks = [{'code': '1', 'language': 'python'}] * 2
+
+    with pytest.raises(ValueError):
+        list(batch.run('user1', blocks))
+    batch.shutdown()
+
+def test_result_cache_serves_repeated_snippets(code_executor, pooled, fake_cache):
+    pooled.container.exec_run.return_value = (0, b'Hello\n')
+    code_executor.pool = Mock()
+    code_executor.pool.acquire.return_value = pooled
+    code_executor.result_cache = ExecutionResultCache(fake_cache, enabled=True)
+
+    first = code_executor.execute_code("print('Hello')", 'python')
+    second = code_executor.execute_code("print('Hello')", 'python')
+    bypassed = code_executor.execute_code("print('Hello')", 'python', use_cache=False)
+    other_stdin = code_executor.execute_code("print('Hello')", 'python', stdin='input')
+
+    assert 'cached' not in first
+    assert second == {**first, 'cached': True}
+    assert 'cached' not in bypassed
+    assert 'cached' not in other_stdin
+    assert code_executor.pool.acquire.call_count == 3
+
+def test_result_cache_skips_failures_and_large_output(fake_cache):
+    cache = ExecutionResultCache(fake_cache, enabled=True, max_output_bytes=4)
+
+    cache.set('python', 'sha256:a', 'x', {'success': False, 'output': None, 'error': 'boom'})
+    cache.set('python', 'sha256:a', 'y', {'success': True, 'output': 'too long', 'error': None})
+
+    assert cache.get('python', 'sha256:a', 'x') is None
+    assert cache.get('python', 'sha256:a', 'y') is None
+
+def test_execution_jobs_report_results_to_owner(fake_cache):
+    from services.execution_jobs import ExecutionJobService
+
+    jobs = ExecutionJobService(cache_service=fake_cache)
+    with patch('tasks.execute_code') as mock_task:
+        mock_task.delay.return_value = Mock(id='job-1')
+        job = jobs.submit("print('Hello')", 'python', user_id='u1')
+
+    assert job == {'job_id': 'job-1', 'state': 'PENDING'}
+    mock_task.delay.assert_called_once_with(
+        "print('Hello')", 'python', timeout=30, stdin=None, use_cache=True
+    )
+
+    result = {'success': True, 'output': 'Hello\n', 'error': None}
+    finished = Mock(state='SUCCESS', result=result)
+    with patch.object(ExecutionJobService, '_async_result', return_value=finished):
+        status = jobs.get_status('job-1', 'u1')
+        other_user = jobs.get_status('job-1', 'u2')
+
+    assert status['result'] == result
+    assert other_user is None
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_node_validator_reuses_one_process():
+    validator = NodeSyntaxValidator()
+    try:
+        assert validator.validate('const x = 1;') == {'valid': True, 'errors': None}
+        process = validator._process
+
+        result = validator.validate('const x = ;\nlet y = 2;')
+        assert result['valid'] is False
+        assert result['errors']['line'] == 1
+        assert 'SyntaxError' in result['errors']['message']
+        assert validator._process is process
+    finally:
+        validator.close()
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_node_validator_restarts_dead_process():
+    validator = NodeSyntaxValidator()
+    try:
+        validator.validate('1 + 1')
+        validator._process.kill()
+        validator._process.wait()
+
+        assert validator.validate('1 + 1')['valid'] is True
+    finally:
+        validator.close()
+
+def test_tree_sitter_validator_reports_first_error():
+    missing = Mock(type=';', is_missing=True, has_error=True, children=[], start_point=(1, 9))
+    statement = Mock(type='expression_statement', is_missing=False, has_error=True, children=[missing])
+    root = Mock(type='program', is_missing=False, has_error=True, children=[statement])
+    parser = Mock()
+    parser.parse.return_value = Mock(root_node=root)
+    validator = TreeSitterValidator()
+    validator._parsers['java'] = parser
+
+    result = validator.validate('class A {\n  int x = 1\n}', 'java')
+
+    assert result == {
+        'valid': False,
+        'errors': {'line': 2, 'offset': 10, 'message': 'Missing ;'}
+    }
+
+def test_validate_code_uses_tree_sitter_for_compiled_languages(code_executor):
+    code_executor.tree_sitter_validator = Mock()
+    code_executor.tree_sitter_validator.supports.return_value = True
+    code_executor.tree_sitter_validator.validate.return_value = {'valid': True, 'errors': None}
+
+    code_executor.validate_code('int main() {}', 'cpp')
+
+    code_executor.tree_sitter_validator.validate.assert_called_once_with('int main() {}', 'cpp')
@@ -0,0 +1,204 @@
+import pytest
+from unittest.mock import Mock, patch
+from services.content_processor import ContentProcessor
+from services.render_cache import RenderCache
+
+@pytest.fixture
+def processor():
+    return ContentProcessor(render_cache=RenderCache(max_entries=16, use_redis=False))
+
+def test_render_cache_evicts_least_recently_used():
+    cache = RenderCache(max_entries=2, use_redis=False)
+    render = Mock(side_effect=lambda: 'html')
+
+    cache.get_or_render('code', ('a',), render)
+    cache.get_or_render('code', ('b',), render)
+    cache.get_or_render('code', ('a',), render)
+    cache.get_or_render('code', ('c',), render)
+    assert render.call_count == 3
+
+    cache.get_or_render('code', ('a',), render)
+    assert render.call_count == 3
+    cache.get_or_render('code', ('b',), render)
+    assert render.call_count == 4
+
+def test_render_cache_shares_blocks_through_redis(fake_cache):
+    first = RenderCache(cache_service=fake_cache, use_redis=True)
+    second = RenderCache(cache_service=fake_cache, use_redis=True)
+    render = Mock(return_value='<math></math>')
+
+    first.get_or_render('latex', ('x^2',), render)
+    html = second.get_or_render('latex', ('x^2',), render)
+
+    assert html == '<math></math>'
+    render.assert_called_once()
+
+def test_unchanged_blocks_are_not_rendered_again(processor):
+    content = "Intro\n\n```python\nprint('a')\n```\n\n```python\nprint('b')\n```\n"
+    processor.process_content(content)
+
+    with patch.object(processor, '_render_code', wraps=processor._render_code) as render_code:
+        edited = content.replace("print('b')", "print('c')")
+        result = processor.process_content(edited)
+
+    render_code.assert_called_once_with("print('c')", 'python')
+    assert 'highlight' in result['html']
+
+def test_highlight_cache_key_includes_language(processor):
+    with patch.object(processor, '_render_code', return_value='<pre></pre>') as render_code:
+        processor._highlight_code('x = 1', 'python')
+        processor._highlight_code('x = 1', 'ruby')
+
+    assert render_code.call_count == 2
+
+def test_placeholders_do_not_clash(processor):
+    blocks = ''.join(f"```python\nvalue_{i} = {i}\n```\n\n" for i in range(12))
+    content = f"Text mentioning CODE_BLOCK_1 and LATEX_BLOCK_0\n\n{blocks}"
+
+    with patch.object(processor, '_highlight_code', side_effect=lambda code, language: f'[{code}]'):
+        result = processor.process_content(content)
+
+    assert 'CODE_BLOCK_1 and LATEX_BLOCK_0' in result['html']
+    assert '[value_1 = 1]' in result['html']
+    assert '[value_10 = 10]' in result['html']
+    assert result['html'].index('[value_1 = 1]') < result['html'].index('[value_10 = 10]')
+    assert len(result['code_blocks']) == 12
+
+def test_dollar_signs_in_code_are_not_latex(processor):
+    content = "Price $x^2$\n\n```bash\necho $HOME $PATH\n```\n"
+
+    result = processor.process_content(content)
+
+    assert [block['latex'] for block in result['latex_blocks']] == ['x^2']
+    assert result['code_blocks'][0]['code'] == 'echo $HOME $PATH'
+
+def test_dollar_in_prose_does_not_swallow_fence(processor):
+    result = processor._render("Costs $5, install with:\n```bash\necho $HOME\n```")
+
+    assert [(block['language'], block['code']) for block in result['code_blocks']] == [('bash', 'echo $HOME')]
+    assert result['latex_blocks'] == []
+
+def test_only_changed_blocks_are_rerendered(processor):
+    content = "# Title\n\nFirst paragraph.\n\nSecond paragraph.\n\nThird paragraph."
+    previous = processor.process_content(content)
+
+    with patch.object(processor, '_render', wraps=processor._render) as render:
+        result = processor.process_content(
+            content.replace('Second', 'Edited'),
+            previous=previous
+        )
+
+    render.assert_called_once_with('Edited paragraph.')
+    assert len(result['blocks']) == 4
+    assert 'Edited paragraph.' in result['html']
+    assert 'First paragraph.' in result['html']
+
+def test_split_blocks_keeps_fences_math_and_lists_together(processor):
+    content = (
+        "Intro\n\n"
+        "```python\na = 1\n\nb = 2\n```\n\n"
+        "$$\nx\n\ny\n$$\n\n"
+        "- one\n\n- two\n\n"
+        "    indented continuation\n\n"
+        "Outro"
+    )
+
+    blocks = processor._split_blocks(content)
+
+    assert blocks == [
+        'Intro',
+        '```python\na = 1\n\nb = 2\n```',
+        '$$\nx\n\ny\n$$',
+        '- one\n\n- two\n\n    indented continuation',
+        'Outro'
+    ]
+
+def test_split_blocks_handles_tilde_fences(processor):
+    content = "~~~\n```\n\nstill code\n~~~\n\nAfter"
+
+    assert processor._split_blocks(content) == ['~~~\n```\n\nstill code\n~~~', 'After']
+
+def test_stored_blocks_hold_only_html(processor):
+    content = "Intro $x$\n\n```python\nprint('a')\n```\n\nOutro"
+    previous = processor.process_content(content)
+
+    with patch.object(processor, '_render', wraps=processor._render) as render:
+        result = processor.process_content(content.replace('Outro', 'End'), previous=previous)
+
+    render.assert_called_once_with('End')
+    assert all(set(block) == {'hash', 'html'} for block in result['blocks'])
+    assert [block['code'] for block in result['code_blocks']] == ["print('a')"]
+    assert [block['latex'] for block in result['latex_blocks']] == ['x']
+
+def test_reference_definitions_render_whole_document(processor):
+    content = "See [the docs][docs].\n\n[docs]: https://example.com"
+
+    with patch.object(processor, '_render', wraps=processor._render) as render:
+        result = processor.process_content(content)
+
+    render.assert_called_once_with(content)
+    assert result['blocks'] == []
+
+@pytest.mark.parametrize('code,language', [
+    ('#!/usr/bin/env python3\nprint(1)', 'python'),
+    ('#!/bin/bash\nls', 'bash'),
+    ('// Main.java\nclass Main {}', 'java'),
+    ('#include <iostream>\nint main() {}', 'cpp'),
+    ('def add(a, b):\n    return a + b', 'python'),
+    ('const add = (a, b) => { return a + b; };', 'javascript'),
+    ("def greet\n  puts 'hi'\nend", 'ruby'),
+    ('SELECT name FROM users WHERE id = 1', 'sql')
+])
+def test_language_heuristics(code, language):
+    from services.language_detection import LanguageDetector
+
+    assert LanguageDetector().classify(code) == language
+
+def test_language_detection_is_memoized():
+    from services.language_detection import LanguageDetector
+
+    detector = LanguageDetector()
+    with patch('services.language_detection.guess_lexer') as guess:
+        guess.return_value = Mock(aliases=['haskell'])
+        first = detector.detect('main = putStrLn "hi"')
+        second = detector.detect('main = putStrLn "hi"')
+
+    assert first == second == 'haskell'
+    guess.assert_called_once()
+
+def test_language_hint_skips_detection():
+    from services.language_detection import LanguageDetector
+
+    detector = LanguageDetector()
+    with patch.object(detector, 'classify') as classify:
+        assert detector.detect('x = 1', hint='Python') == 'python'
+
+    classify.assert_not_called()
+
+def test_many_changed_blocks_are_rendered_in_pool():
+    render_pool = Mock()
+    render_pool.should_use.side_effect = lambda batch_size: batch_size >= 3
+    render_pool.render_blocks.side_effect = lambda texts: [
+        {'html': f'<p>{text}</p>', 'code_blocks': [], 'latex_blocks': []}
+        for text in texts
+    ]
+    processor = ContentProcessor(
+        render_cache=RenderCache(use_redis=False),
+        render_pool=render_pool
+    )
+
+    result = processor.process_content('One\n\nTwo\n\nThree\n\nOne')
+
+    render_pool.render_blocks.assert_called_once_with(['One', 'Two', 'Three'])
+    assert result['html'] == '<p>One</p>\n<p>Two</p>\n<p>Three</p>\n<p>One</p>'
+
+    edited = processor.process_content('One\n\nTwo\n\nFour\n\nOne', previous=result)
+    assert render_pool.render_blocks.call_count == 1
+    assert 'Four' in edited['html']
+
+def test_render_pool_skips_small_batches():
+    from services.render_pool import RenderPool
+
+    assert RenderPool(max_workers=1).should_use(100) is False
+    assert RenderPool(max_workers=4, min_batch=8).should_use(7) is False
+    assert RenderPool(max_workers=4, min_batch=8).should_use(8) is True
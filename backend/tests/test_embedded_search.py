@@ -0,0 +1,134 @@
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+from services.advanced_search import AdvancedSearch
+from services.embedded_search import EmbeddedSearchBackend
+from services.search_backends import create_search_backend
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = EmbeddedSearchBackend(path=str(tmp_path), merge_factor=3)
+    yield backend
+    backend.close()
+
+def document(title, content='', user_id='user1', **fields):
+    return {
+        'title': title,
+        'content': content,
+        'code_blocks': [],
+        'latex_blocks': [],
+        'tags': [],
+        'folder_id': 'None',
+        'user_id': user_id,
+        'created_at': datetime(2024, 1, 1),
+        'updated_at': datetime(2024, 1, 1),
+        **fields
+    }
+
+def test_title_matches_rank_above_content_matches(backend):
+    backend.index_documents({
+        'a': document('Shopping list', 'buy a binary tree book'),
+        'b': document('Binary trees', 'notes on balancing')
+    })
+
+    results = backend.search('binary', 'user1')
+
+    assert [r['title'] for r in results] == ['Binary trees', 'Shopping list']
+    assert results[0]['score'] > results[1]['score']
+    assert results[0]['highlights']['title'] == ['<em>Binary</em> trees']
+
+def test_search_is_scoped_and_filtered(backend):
+    backend.index_documents({
+        'a': document('Sorting', tags=['algorithms'], folder_id='f1', code_blocks=[
+            {'code': 'def sort(items): pass', 'language': 'python', 'tokens': 'def sort items pass'}
+        ]),
+        'b': document('Sorting', tags=['misc']),
+        'c': document('Sorting', user_id='user2')
+    })
+
+    assert len(backend.search('sorting', 'user1')) == 2
+    assert len(backend.search('sorting', 'user2')) == 1
+    assert len(backend.search('sorting', 'user1', language='python')) == 1
+    assert len(backend.search('sorting', 'user1', tags=['algorithms', 'other'])) == 1
+    assert len(backend.search('sorting', 'user1', folder_id='f1')) == 1
+
+def test_reindexing_replaces_document(backend):
+    backend.index_documents({'a': document('Old title')})
+    backend.index_documents({'a': document('New title')})
+
+    assert backend.search('old', 'user1') == []
+    assert [r['title'] for r in backend.search('title', 'user1')] == ['New title']
+
+def test_deleted_documents_are_not_found(backend):
+    backend.index_documents({'a': document('Graphs'), 'b': document('Graphs too')})
+    backend.delete_documents(['a'])
+
+    assert [r['title'] for r in backend.search('graphs', 'user1')] == ['Graphs too']
+
+def test_segments_are_merged(backend, tmp_path):
+    for i in range(10):
+        backend.index_documents({str(i): document(f'Note {i}', 'common words')})
+
+    assert len(backend.search('common', 'user1', size=20)) == 10
+    assert len(list(tmp_path.glob('*.postings'))) < 10
+
+def test_index_is_shared_through_disk(backend, tmp_path):
+    backend.index_documents({'a': document('Persisted note')})
+    other = EmbeddedSearchBackend(path=str(tmp_path))
+
+    assert [r['title'] for r in other.search('persisted', 'user1')] == ['Persisted note']
+
+    backend.index_documents({'b': document('Another persisted note')})
+    assert len(other.search('persisted', 'user1')) == 2
+    other.close()
+
+def test_advanced_search_indexes_code_and_latex(backend):
+    search = AdvancedSearch(backend=backend)
+    search.index_note({
+        '_id': 'n1',
+        'title': 'Snippets',
+        'content': '```python\ndef parseHeader(line):\n    return line\n```\n\n$$E = mc^2$$',
+        'user_id': 'user1'
+    })
+    assert search.flush(timeout=5)
+
+    results = search.search('header', 'user1')
+    assert [r['title'] for r in results] == ['Snippets']
+    assert results[0]['code_blocks'][0]['language'] == 'python'
+    assert search.search('mc', 'user1', language='python')[0]['latex_blocks'][0]['latex'] == 'E = mc^2'
+
+def test_activating_a_version_replaces_live_index(backend):
+    backend.index_documents({'a': document('Stale note')})
+
+    index = backend.create_version(2)
+    backend.index_documents({'b': document('Rebuilt note')}, index=index)
+    assert [r['title'] for r in backend.search('note', 'user1')] == ['Stale note']
+
+    backend.activate_version(index)
+    assert [r['title'] for r in backend.search('note', 'user1')] == ['Rebuilt note']
+
+    backend.index_documents({'c': document('Live note')})
+    assert len(backend.search('note', 'user1')) == 2
+
+def test_optimize_merges_into_one_segment(backend, tmp_path):
+    backend.index_documents({'a': document('First')})
+    backend.index_documents({'b': document('Second')})
+    backend.delete_documents(['a'])
+
+    backend.optimize()
+
+    assert len(list(tmp_path.glob('*.postings'))) == 1
+    assert [r['title'] for r in backend.search('second', 'user1')] == ['Second']
+
+def test_auto_backend_uses_embedded_only_without_url(monkeypatch, tmp_path):
+    monkeypatch.setenv('SEARCH_BACKEND', 'auto')
+    monkeypatch.setenv('SEARCH_INDEX_DIR', str(tmp_path))
+    monkeypatch.delenv('ELASTICSEARCH_URL', raising=False)
+
+    backend = create_search_backend()
+    assert isinstance(backend, EmbeddedSearchBackend)
+    backend.close()
+
+    with patch('services.search_backends.ElasticsearchBackend', side_effect=ConnectionError('down')):
+        with pytest.raises(ConnectionError):
+            create_search_backend('http://localhost:9200')
@@ -0,0 +1,78 @@
+import pytest
+from unittest.mock import Mock
+from services.index_queue import IndexQueue
+
+@pytest.fixture
+def backend():
+    return Mock(**{'index_documents.return_value': []})
+
+def test_repeated_updates_are_coalesced(backend):
+    queue = IndexQueue(backend, max_batch_size=100, max_wait_ms=50)
+
+    for version in range(5):
+        queue.enqueue('note1', {'title': f'Version {version}'})
+    queue.enqueue('note2', {'title': 'Other'})
+
+    assert queue.flush(timeout=5)
+    backend.index_documents.assert_called_once_with({
+        'note1': {'title': 'Version 4'},
+        'note2': {'title': 'Other'}
+    })
+
+def test_batches_are_bounded_by_size(backend):
+    queue = IndexQueue(backend, max_batch_size=2, max_wait_ms=10000)
+
+    for i in range(5):
+        queue.enqueue(f'note{i}', {'title': str(i)})
+
+    assert queue.flush(timeout=5)
+    sizes = [len(call.args[0]) for call in backend.index_documents.call_args_list]
+    assert sizes == [2, 2, 1]
+
+def test_failed_writes_are_retried(backend):
+    backend.index_documents.side_effect = [ConnectionError('down'), []]
+    queue = IndexQueue(backend, max_wait_ms=0, max_retries=3, retry_backoff=0.01)
+
+    queue.enqueue('note1', {'title': 'Note'})
+
+    assert queue.flush(timeout=5)
+    assert backend.index_documents.call_count == 2
+    backend.index_documents.assert_called_with({'note1': {'title': 'Note'}})
+
+def test_writes_are_dropped_after_max_retries(backend):
+    backend.index_documents.side_effect = ConnectionError('down')
+    queue = IndexQueue(backend, max_wait_ms=0, max_retries=2, retry_backoff=0.01)
+
+    queue.enqueue('note1', {'title': 'Note'})
+
+    assert queue.flush(timeout=5)
+    assert backend.index_documents.call_count == 3
+
+def test_callback_runs_only_after_write(backend):
+    backend.index_documents.side_effect = ConnectionError('down')
+    queue = IndexQueue(backend, max_wait_ms=0, max_retries=0)
+    dropped = Mock()
+    queue.enqueue('note1', {'title': 'Note'}, on_indexed=dropped)
+    assert queue.flush(timeout=5)
+
+    backend.index_documents.side_effect = None
+    written = Mock()
+    queue.enqueue('note1', {'title': 'Note'}, on_indexed=written)
+    assert queue.flush(timeout=5)
+
+    dropped.assert_not_called()
+    written.assert_called_once_with()
+
+def test_only_rejected_documents_are_retried(backend):
+    backend.index_documents.side_effect = [['note2'], []]
+    queue = IndexQueue(backend, max_wait_ms=0, max_retries=3, retry_backoff=0.01)
+    callbacks = {doc_id: Mock() for doc_id in ('note1', 'note2')}
+
+    queue.enqueue('note1', {'title': 'One'}, on_indexed=callbacks['note1'])
+    queue.enqueue('note2', {'title': 'Two'}, on_indexed=callbacks['note2'])
+
+    assert queue.flush(timeout=5)
+    assert backend.index_documents.call_count == 2
+    backend.index_documents.assert_called_with({'note2': {'title': 'Two'}})
+    callbacks['note1'].assert_called_once_with()
+    callbacks['note2'].assert_called_once_with()
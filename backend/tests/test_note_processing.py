@@ -0,0 +1,109 @@
+import mongomock
+import pytest
+from unittest.mock import Mock
+from bson import ObjectId
+from models.note import Note
+from models.processing_state import PENDING, READY
+from services.note_processing import NoteProcessingService
+
+@pytest.fixture
+def note():
+    return {
+        '_id': ObjectId(),
+        'title': 'Note',
+        'content': '# Title',
+        'current_version': 3,
+        'processing_state': PENDING,
+        'processed_version': 2,
+        'processed_content': {'html': '<h1>Old</h1>', 'blocks': []}
+    }
+
+@pytest.fixture
+def db(note):
+    db = Mock()
+    db.notes.find_one.return_value = note
+    db.notes.update_one.return_value = Mock(matched_count=1)
+    return db
+
+@pytest.fixture
+def content_processor():
+    processor = Mock()
+    processor.process_content.return_value = {'html': '<h1>Title</h1>', 'blocks': []}
+    return processor
+
+def test_process_renders_and_indexes_current_version(db, note, content_processor):
+    search = Mock()
+    service = NoteProcessingService(db, content_processor=content_processor, search=search)
+
+    assert service.process(str(note['_id'])) == READY
+
+    content_processor.process_content.assert_called_once_with(
+        '# Title',
+        previous={'html': '<h1>Old</h1>', 'blocks': []}
+    )
+    query, update = db.notes.update_one.call_args[0]
+    assert query == {'_id': note['_id'], 'current_version': 3}
+    assert update['$set']['processed_version'] == 3
+    assert update['$set']['processing_state'] == READY
+    indexed = search.index_note.call_args[0][0]
+    assert indexed['_id'] == str(note['_id'])
+    assert indexed['processed_content']['html'] == '<h1>Title</h1>'
+
+    # Recorded as indexed only once the queue has written the note
+    search.index_note.call_args[1]['on_indexed']()
+    query, update = db.notes.update_one.call_args[0]
+    assert query == {'_id': note['_id'], 'current_version': 3}
+    assert update == {'$set': {'indexed_version': 3}}
+
+def test_process_skips_output_of_superseded_version(db, note, content_processor):
+    search = Mock()
+    db.notes.update_one.side_effect = [Mock(matched_count=1), Mock(matched_count=0)]
+    service = NoteProcessingService(db, content_processor=content_processor, search=search)
+
+    assert service.process(str(note['_id'])) == 'superseded'
+    search.index_note.assert_not_called()
+
+def test_process_ignores_already_processed_note(db, note, content_processor):
+    note.update({'processing_state': READY, 'processed_version': 3, 'indexed_version': 3})
+    search = Mock()
+    service = NoteProcessingService(db, content_processor=content_processor, search=search)
+
+    assert service.process(str(note['_id'])) == READY
+    content_processor.process_content.assert_not_called()
+    search.index_note.assert_not_called()
+
+def test_process_reindexes_processed_note_missing_from_index(db, note, content_processor):
+    note.update({'processing_state': READY, 'processed_version': 3, 'indexed_version': None})
+    search = Mock()
+    service = NoteProcessingService(db, content_processor=content_processor, search=search)
+
+    assert service.process(str(note['_id'])) == READY
+    content_processor.process_content.assert_not_called()
+    indexed = search.index_note.call_args[0][0]
+    assert indexed['processed_content'] == {'html': '<h1>Old</h1>', 'blocks': []}
+
+def test_failed_render_marks_note_failed(db, note, content_processor):
+    content_processor.process_content.side_effect = RuntimeError('boom')
+    service = NoteProcessingService(db, content_processor=content_processor)
+
+    with pytest.raises(RuntimeError):
+        service.process(str(note['_id']))
+
+    _, update = db.notes.update_one.call_args[0]
+    assert update == {'$set': {'processing_state': 'failed'}}
+
+def test_created_note_is_processed_and_indexed(content_processor):
+    mongo = Mock(db=mongomock.MongoClient().db)
+    note = Note.create(mongo, user_id=str(ObjectId()), title='Note', content='# Title', folder_id=str(ObjectId()))
+    search = Mock()
+    service = NoteProcessingService(mongo.db, content_processor=content_processor, search=search)
+
+    assert service.process(str(note._id)) == READY
+    search.index_note.call_args[1]['on_indexed']()
+
+    stored = mongo.db.notes.find_one({'_id': note._id})
+    assert stored['user_id'] == note.user_id
+    assert stored['folder_id'] == note.folder_id
+    assert stored['processing_state'] == READY
+    assert stored['processed_content']['html'] == '<h1>Title</h1>'
+    assert stored['indexed_version'] == 1
@@ -110,3 +110,37 @@ def test_get_notes_by_folder(app, auth_headers, test_note, test_folder):
     assert isinstance(response.json, list)
     assert len(response.json) > 0
     assert response.json[0]['folder_id'] == str(test_folder['_id'])
+
+def test_get_notes_paginated(app, auth_headers):
+    """Test walking the notes list with keyset cursors."""
+    for i in range(5):
+        response = app.post(
+            '/api/notes',
+            data=json.dumps({'title': f'Paged Note {i}', 'content': 'Paged content'}),
+            headers=auth_headers
+        )
+        assert response.status_code == 201
+    
+    titles = []
+    url = '/api/notes?limit=2&fields=title'
+    while url:
+        response = app.get(url, headers=auth_headers)
+        assert response.status_code == 200
+        assert len(response.json) <= 2
+        assert all('content' not in note for note in response.json)
+        titles.extend(note['title'] for note in response.json)
+        
+        cursor = response.headers.get('X-Next-Cursor')
+        url = f'/api/notes?limit=2&fields=title&cursor={cursor}' if cursor else None
+    
+    assert titles == [f'Paged Note {i}' for i in reversed(range(5))]
+
+def test_get_notes_invalid_cursor(app, auth_headers):
+    """Test that a malformed cursor is rejected."""
+    response = app.get(
+        '/api/notes?limit=2&cursor=not-a-cursor',
+        headers=auth_headers
+    )
+    
+    assert response.status_code == 400
+    assert 'error' in response.json
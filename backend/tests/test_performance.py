@@ -1,9 +1,11 @@
 import pytest
+import os
 import time
 import concurrent.futures
 from bson import ObjectId
 import json
 from datetime import datetime, timedelta
+from extensions import mongo
 
 def test_note_creation_performance(app, auth_headers):
     """Test performance of note creation."""
@@ -60,6 +62,38 @@ def test_search_performance(app, auth_headers):
     # Search should complete within 500ms
     assert duration < 0.5, f"Search too slow: {duration}s"
 
+def test_indexed_search_performance_large_dataset(app, auth_headers):
+    """Test text-indexed search stays fast with 100k notes for one user."""
+    num_notes = 100000
+    search_term = "quasarflux"
+    user_id = ObjectId(auth_headers.get('user_id'))
+    
+    with app.app_context():
+        for start in range(0, num_notes, 10000):
+            mongo.db.notes.insert_many([
+                {
+                    'title': f'Performance Note {i}',
+                    'content': f'Content {i} about topic {i % 500} {search_term if i % 1000 == 0 else ""}',
+                    'user_id': user_id,
+                    'created_at': datetime.utcnow(),
+                    'updated_at': datetime.utcnow()
+                }
+                for i in range(start, start + 10000)
+            ])
+    
+    # First request builds the text index
+    app.get(f'/api/search?q={search_term}&limit=100', headers=auth_headers)
+    
+    durations = []
+    for _ in range(5):
+        start_time = time.time()
+        response = app.get(f'/api/search?q={search_term}&limit=100', headers=auth_headers)
+        durations.append(time.time() - start_time)
+        assert response.status_code == 200
+        assert len(response.json) == num_notes // 1000
+    
+    assert min(durations) < 0.05, f"Indexed search too slow: {min(durations)}s"
+
 def test_concurrent_note_access(app, auth_headers, test_note):
     """Test concurrent access to the same note."""
     num_concurrent = 50
@@ -154,3 +188,91 @@ def test_rate_limiting(app, auth_headers):
     assert 429 in responses
     # Rate limiting should not add significant overhead
     assert duration/num_requests < 0.01, f"Rate limiting overhead too high: {duration/num_requests}s per request"
+
+def test_content_processing_scales_linearly():
+    """Test note processing time grows linearly with the number of blocks."""
+    from services.content_processor import ContentProcessor
+    from services.render_cache import RenderCache
+    
+    def note_with_blocks(count):
+        return ''.join(
+            f"Paragraph {i} with $x_{{{i}}}$\n\n```python\nvalue_{i} = {i}\n```\n\n"
+            for i in range(count)
+        )
+    
+    def process_time(count):
+        processor = ContentProcessor(render_cache=RenderCache(use_redis=False))
+        content = note_with_blocks(count)
+        processor.process_content(content)  # Warm the render cache
+        start_time = time.perf_counter()
+        processor.process_content(content)
+        return time.perf_counter() - start_time
+    
+    small = min(process_time(100) for _ in range(3))
+    large = min(process_time(800) for _ in range(3))
+    
+    # 8x the blocks should cost roughly 8x the time, far from the 64x of a
+    # quadratic substitution
+    assert large < small * 24, f"Processing scaled superlinearly: {small:.4f}s -> {large:.4f}s"
+
+
+def test_incremental_processing_performance():
+    """Test re-processing a large note after a one-paragraph edit."""
+    from services.content_processor import ContentProcessor
+    from services.render_cache import RenderCache
+    
+    content = ''.join(
+        f"## Section {i}\n\nParagraph {i} with **bold** text and a [link](https://example.com/{i}).\n\n"
+        f"```python\ndef f_{i}(x):\n    return x * {i}\n```\n\n"
+        for i in range(800)
+    )
+    assert len(content) > 100 * 1024
+    
+    processor = ContentProcessor(render_cache=RenderCache(max_entries=1, use_redis=False))
+    start_time = time.perf_counter()
+    previous = processor.process_content(content)
+    full_duration = time.perf_counter() - start_time
+    
+    edited = content.replace('Paragraph 400 ', 'Edited paragraph 400 ')
+    start_time = time.perf_counter()
+    result = processor.process_content(edited, previous=previous)
+    incremental_duration = time.perf_counter() - start_time
+    
+    assert 'Edited paragraph 400' in result['html']
+    assert incremental_duration < full_duration / 5, (
+        f"Incremental save too slow: {incremental_duration:.4f}s vs {full_duration:.4f}s"
+    )
+
+@pytest.mark.skipif((os.cpu_count() or 1) < 4, reason='needs at least 4 cores')
+def test_render_pool_scaling():
+    """Test bulk rendering scales with the number of worker processes."""
+    from services.render_pool import RenderPool
+    
+    contents = [
+        ''.join(
+            f"## Part {i}\n\nSome *markdown* for note {n}.\n\n```python\ndef f_{i}():\n    return {n}\n```\n\n"
+            for i in range(60)
+        )
+        for n in range(64)
+    ]
+    
+    def render_time(workers):
+        pool = RenderPool(max_workers=workers, min_batch=1)
+        try:
+            pool.process_notes(contents[:workers])  # Start the workers
+            start_time = time.perf_counter()
+            results = pool.process_notes(contents)
+            duration = time.perf_counter() - start_time
+        finally:
+            pool.shutdown()
+        assert [r['code_blocks'][0]['code'] for r in results[:2]] == [
+            'def f_0():\n    return 0',
+            'def f_0():\n    return 1'
+        ]
+        return duration
+    
+    serial = render_time(2)
+    parallel = render_time(4)
+    
+    # Doubling the workers should come close to halving the time
+    assert parallel < serial * 0.7, f"Render pool did not scale: {serial:.2f}s -> {parallel:.2f}s"
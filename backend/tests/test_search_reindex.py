@@ -0,0 +1,69 @@
+import pytest
+from datetime import datetime
+from unittest.mock import Mock
+from services.embedded_search import EmbeddedSearchBackend
+from services.search_reindex import DONE, ReindexService
+
+def note(i, title):
+    return {
+        '_id': f'note{i}',
+        'title': title,
+        'content': f'Content of {title}',
+        'user_id': 'user1',
+        'updated_at': datetime(2024, 1, 1)
+    }
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = EmbeddedSearchBackend(path=str(tmp_path))
+    yield backend
+    backend.close()
+
+@pytest.fixture
+def db():
+    db = Mock()
+    db.search_reindex.find_one.return_value = None
+    db.search_reindex.insert_one.return_value = Mock(inserted_id='job1')
+    return db
+
+def stream(db, notes, edited=()):
+    """Serve the full scan, then the catch-up queries."""
+    scan = Mock()
+    scan.sort.return_value.batch_size.return_value = iter(notes)
+    catch_up = Mock()
+    catch_up.batch_size.return_value = iter(edited)
+    after_swap = Mock()
+    after_swap.batch_size.return_value = iter([])
+    db.notes.find.side_effect = [scan, catch_up, after_swap]
+
+def test_reindex_loads_notes_and_swaps_index(backend, db):
+    backend.index_documents({'deleted': note(0, 'Deleted searchable')})
+    stream(db, [note(i, f'Searchable {i}') for i in range(1, 6)], edited=[note(1, 'Edited searchable')])
+
+    stats = ReindexService(db, backend, batch_size=2).run()
+
+    assert stats['indexed'] == 5
+    assert stats['index'] == 'v1'
+    titles = sorted(r['title'] for r in backend.search('searchable', 'user1'))
+    assert titles == ['Edited searchable', 'Searchable 2', 'Searchable 3', 'Searchable 4', 'Searchable 5']
+
+    checkpoints = [call.args[1]['$set'] for call in db.search_reindex.update_one.call_args_list]
+    assert [c.get('last_id') for c in checkpoints[:3]] == ['note2', 'note4', 'note5']
+    assert checkpoints[-1]['state'] == DONE
+
+def test_reindex_resumes_unfinished_run(backend, db):
+    db.search_reindex.find_one.return_value = {
+        '_id': 'job1',
+        'version': 3,
+        'state': 'running',
+        'last_id': 'note2',
+        'indexed': 2,
+        'started_at': datetime(2024, 1, 1)
+    }
+    stream(db, [note(3, 'Resumed')])
+
+    stats = ReindexService(db, backend).run()
+
+    assert db.notes.find.call_args_list[0].args[0] == {'_id': {'$gt': 'note2'}}
+    assert stats['index'] == 'v3'
+    assert stats['indexed'] == 3
@@ -0,0 +1,71 @@
+import pytest
+import threading
+from unittest.mock import Mock
+from services.registry import ServiceRegistry
+
+@pytest.fixture
+def registry():
+    return ServiceRegistry()
+
+def test_service_not_built_on_register(registry):
+    factory = Mock(return_value=object())
+    registry.register('heavy', factory)
+
+    factory.assert_not_called()
+    assert registry.status()['heavy']['state'] == ServiceRegistry.PENDING
+
+def test_service_built_once(registry):
+    factory = Mock(return_value=object())
+    registry.register('heavy', factory)
+
+    first = registry.get('heavy')
+    second = registry.get('heavy')
+
+    assert first is second
+    factory.assert_called_once()
+    assert registry.status()['heavy']['state'] == ServiceRegistry.READY
+
+def test_concurrent_first_use(registry):
+    factory = Mock(side_effect=lambda: object())
+    registry.register('heavy', factory)
+    results = []
+
+    threads = [
+        threading.Thread(target=lambda: results.append(registry.get('heavy')))
+        for _ in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    factory.assert_called_once()
+    assert all(result is results[0] for result in results)
+
+def test_failed_service_reported_and_retried(registry):
+    factory = Mock(side_effect=[RuntimeError('no docker'), object()])
+    registry.register('heavy', factory)
+
+    with pytest.raises(RuntimeError):
+        registry.get('heavy')
+    status = registry.status()['heavy']
+    assert status['state'] == ServiceRegistry.FAILED
+    assert 'no docker' in status['error']
+
+    assert registry.get('heavy') is not None
+    assert registry.status()['heavy']['state'] == ServiceRegistry.READY
+
+def test_background_warm_up(registry):
+    registry.register('heavy', Mock(return_value=object()))
+
+    thread = registry.warm_up(background=True)
+    thread.join(timeout=5)
+
+    assert registry.is_ready('heavy')
+
+def test_health_reports_services(app):
+    response = app.get('/health')
+
+    assert response.status_code == 200
+    assert 'services' in response.json
+    assert 'ai_service' in response.json['services']
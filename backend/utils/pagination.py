@@ -0,0 +1,131 @@
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import json
+import base64
+import threading
+
+from errors import ValidationError
+
+# Newest first; _id breaks ties between notes saved in the same millisecond
+KEYSET_SORT = [('updated_at', -1), ('_id', -1)]
+KEYSET_INDEX = [('user_id', 1), ('updated_at', -1), ('_id', -1)]
+
+_keyset_index_ready = False
+_keyset_index_lock = threading.Lock()
+
+def ensure_keyset_index(collection):
+    """Create the index that serves keyset pages, once per process."""
+    global _keyset_index_ready
+    if _keyset_index_ready:
+        return
+
+    with _keyset_index_lock:
+        if not _keyset_index_ready:
+            collection.create_index(KEYSET_INDEX, name='notes_keyset')
+            _keyset_index_ready = True
+
+def parse_limit(args, default, maximum):
+    """Read the page size from query parameters."""
+    try:
+        limit = int(args.get('limit', default))
+    except (TypeError, ValueError):
+        raise ValidationError('limit must be an integer')
+    if limit < 1:
+        raise ValidationError('limit must be positive')
+    return min(limit, maximum)
+
+def parse_fields(args, allowed):
+    """Build a projection from the comma separated ``fields`` parameter.
+
+    Returns None when all fields are requested. The keys needed to
+    build the next cursor are always included.
+    """
+    fields = [f.strip() for f in args.get('fields', '').split(',') if f.strip()]
+    if not fields:
+        return None
+
+    unknown = sorted(set(fields) - set(allowed))
+    if unknown:
+        raise ValidationError(f"Unknown fields: {', '.join(unknown)}")
+
+    projection = {field: 1 for field in fields}
+    projection['updated_at'] = 1
+    return projection
+
+def encode_cursor(doc):
+    """Encode the sort key of a document as an opaque cursor."""
+    updated_at = doc.get('updated_at')
+    key = [updated_at.isoformat() if updated_at else None, str(doc['_id'])]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decode a cursor into its (updated_at, _id) sort key."""
+    try:
+        updated_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (datetime.fromisoformat(updated_at) if updated_at else None), ObjectId(doc_id)
+    except (TypeError, ValueError, InvalidId, UnicodeError):
+        raise ValidationError('Invalid cursor')
+
+def after_key(updated_at, doc_id):
+    """Match documents that sort after a key in KEYSET_SORT order."""
+    if updated_at is None:
+        # Documents without a timestamp sort last
+        return {'updated_at': None, '_id': {'$lt': doc_id}}
+    return {'$or': [
+        {'updated_at': {'$lt': updated_at}},
+        {'updated_at': updated_at, '_id': {'$lt': doc_id}},
+        {'updated_at': None}
+    ]}
+
+def through_key(updated_at, doc_id):
+    """Match documents that sort before a key, or are the key itself."""
+    if updated_at is None:
+        return {'$or': [
+            {'updated_at': {'$ne': None}},
+            {'updated_at': None, '_id': {'$gte': doc_id}}
+        ]}
+    return {'$or': [
+        {'updated_at': {'$gt': updated_at}},
+        {'updated_at': updated_at, '_id': {'$gte': doc_id}}
+    ]}
+
+def keyset_page(collection, query, projection, limit, cursor=None):
+    """Find one page of documents in KEYSET_SORT order.
+
+    The last key of the page is read first from the index, so the page
+    can be streamed while its next cursor is already known. Returns the
+    Mongo cursor of the page and the next page's cursor, or None on the
+    last page.
+    """
+    if cursor:
+        query = {'$and': [query, after_key(*decode_cursor(cursor))]}
+
+    boundary = list(
+        collection.find(query, {'updated_at': 1})
+        .sort(KEYSET_SORT)
+        .skip(limit - 1)
+        .limit(2)
+    )
+    if not boundary:
+        # Fewer than limit documents are left
+        return collection.find(query, projection).sort(KEYSET_SORT), None
+
+    last = boundary[0]
+    next_cursor = encode_cursor(last) if len(boundary) > 1 else None
+    page_query = {'$and': [query, through_key(last.get('updated_at'), last['_id'])]}
+    return collection.find(page_query, projection).sort(KEYSET_SORT), next_cursor
+
+def serialize_document(doc):
+    """Convert the ObjectIds of a document to strings."""
+    return {
+        key: str(value) if isinstance(value, ObjectId) else value
+        for key, value in doc.items()
+    }
+
+def stream_json_array(docs, serialize=serialize_document):
+    """Encode documents as a JSON array one element at a time."""
+    yield '['
+    for i, doc in enumerate(docs):
+        yield (',' if i else '') + json.dumps(serialize(doc))
+    yield ']'